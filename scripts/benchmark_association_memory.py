@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measure the memory used per association of a parsed model.
+
+Generates a synthetic model (or uses the given model file), parses it while tracing memory
+allocations and reports bytes per association. The same model is measured again with every
+association given its own copy of its deptype string, which is how the parsers stored deptypes
+before they were interned:
+
+    PYTHONPATH=src python scripts/benchmark_association_memory.py
+    PYTHONPATH=src python scripts/benchmark_association_memory.py --elements 500000
+    PYTHONPATH=src python scripts/benchmark_association_memory.py path/to/modelfile.xml.zip
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from benchmark_xml_parsing import generate_model
+
+from sgraph import SGraph
+
+
+def traced_parse(model_path: str) -> tuple[SGraph, int]:
+    gc.collect()
+    tracemalloc.start()
+    graph = SGraph.parse_xml_or_zipped_xml(model_path)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return graph, allocated
+
+
+def deptype_copy_bytes(graph: SGraph) -> int:
+    """Return the memory that per-association copies of the deptype strings would take."""
+    total = 0
+    stack = [graph.rootNode]
+    while stack:
+        elem = stack.pop()
+        for association in elem.outgoing:
+            total += sys.getsizeof(association.deptype)
+        stack.extend(elem.children)
+    return total
+
+
+def benchmark(model_path: str):
+    graph, allocated = traced_parse(model_path)
+    element_count = graph.rootNode.getNodeCount() - 1
+    association_count = graph.rootNode.getEACount()
+    print(f'{model_path}: {element_count} elements, {association_count} associations')
+    if not association_count:
+        return
+
+    association = graph.rootNode
+    while not association.outgoing:
+        association = association.children[0]
+    association = association.outgoing[0]
+    print(f'  association object {sys.getsizeof(association)} bytes, '
+          f'has __dict__: {hasattr(association, "__dict__")}')
+
+    interned = allocated / association_count
+    copied = (allocated + deptype_copy_bytes(graph)) / association_count
+    print(f'  per-association deptype copies {copied:8.1f} bytes per association '
+          f'(whole model)')
+    print(f'  interned deptypes              {interned:8.1f} bytes per association '
+          f'(whole model)  x{copied / interned:.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', nargs='?', help='model file (.xml or .xml.zip) to measure')
+    parser.add_argument('--elements', type=int, default=200000,
+                        help='element count of the generated model')
+    args = parser.parse_args()
+
+    if args.model:
+        benchmark(args.model)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, 'modelfile.xml')
+        generate_model(args.elements).to_xml(model_path)
+        benchmark(model_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
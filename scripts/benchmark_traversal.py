@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the element traversals of SElement against recursive walks.
+
+Generates a synthetic model and times each traversal helper next to the recursive walk it
+replaced, and a full ElementIterator walk:
+
+    PYTHONPATH=src python scripts/benchmark_traversal.py
+    PYTHONPATH=src python scripts/benchmark_traversal.py --elements 200000 --fanout 2
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable
+
+from benchmark_xml_parsing import generate_model
+
+from sgraph import SElement
+from sgraph.selement import ElementIterator
+
+
+def recursive_traverse(elem: SElement, visit: Callable[[SElement], None]):
+    visit(elem)
+    for c in elem.children:
+        recursive_traverse(c, visit)
+
+
+def recursive_node_count(elem: SElement) -> int:
+    i = 1
+    for x in elem.children:
+        i += recursive_node_count(x)
+    return i
+
+
+def recursive_ea_count(elem: SElement) -> int:
+    i = len(elem.outgoing)
+    for x in elem.children:
+        i += recursive_ea_count(x)
+    return i
+
+
+def recursive_descendants(elem: SElement, descendants_list: list[SElement]):
+    for child in elem.children:
+        descendants_list.append(child)
+        recursive_descendants(child, descendants_list)
+
+
+def recursive_max_depth(elem: SElement, cur_depth: int) -> int:
+    if not elem.children:
+        return cur_depth
+    depth = 0
+    for e in elem.children:
+        depth = max(recursive_max_depth(e, cur_depth + 1), depth)
+    return depth or cur_depth
+
+
+def iterator_walk(root: SElement) -> int:
+    iterator = ElementIterator(root)
+    i = 0
+    while iterator.hasNext():
+        next(iterator)
+        i += 1
+    return i
+
+
+def timed(func: Callable[[], object], rounds: int = 3) -> float:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best  # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--elements', type=int, default=1000000,
+                        help='element count of the generated model')
+    parser.add_argument('--fanout', type=int, default=8, help='children per element')
+    args = parser.parse_args()
+
+    root = generate_model(args.elements, args.fanout).rootNode
+    print(f'{args.elements} elements, fanout {args.fanout}')
+    nop = lambda e: None  # noqa: E731
+    cases = [
+        ('traverseElements', lambda: recursive_traverse(root, nop),
+         lambda: root.traverseElements(nop)),
+        ('getNodeCount', lambda: recursive_node_count(root), root.getNodeCount),
+        ('getEACount', lambda: recursive_ea_count(root), root.getEACount),
+        ('getDescendants', lambda: recursive_descendants(root, []),
+         lambda: root.getDescendants([])),
+        ('getMaxDepth', lambda: recursive_max_depth(root, 0), lambda: root.getMaxDepth(0)),
+    ]
+    for name, recursive, iterative in cases:
+        before = timed(recursive)
+        after = timed(iterative)
+        print(f'  {name:18} recursive {before:7.3f} s  iterative {after:7.3f} s  '
+              f'x{before / after:.2f}')
+    # The old ElementIterator searched each element from its parent's children, which is
+    # quadratic in the fanout, so only the new one is timed.
+    print(f'  {"ElementIterator":18} {timed(lambda: iterator_walk(root), 1):7.3f} s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
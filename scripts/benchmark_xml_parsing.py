@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the XML parser backends of SGraph.parse_xml_or_zipped_xml.
+
+Generates a synthetic model (or uses the given model file), parses it with every backend and
+reports elements per second:
+
+    PYTHONPATH=src python scripts/benchmark_xml_parsing.py
+    PYTHONPATH=src python scripts/benchmark_xml_parsing.py --elements 500000 --rounds 5
+    PYTHONPATH=src python scripts/benchmark_xml_parsing.py path/to/modelfile.xml.zip
+    PYTHONPATH=src python scripts/benchmark_xml_parsing.py --workers 8 --fanout 64
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sgraph import SElement, SElementAssociation, SGraph
+from sgraph.sgraph import XML_PARSER_BACKENDS
+
+
+def generate_model(element_count: int, fanout: int = 8, deps_per_leaf: int = 3) -> SGraph:
+    """Create a model with a balanced tree of directories and files that depend on each other."""
+    rng = random.Random(42)
+    graph = SGraph()
+    created = 0
+    leaves: list[SElement] = []
+    queue: list[SElement] = [graph.rootNode]
+    while queue and created < element_count:
+        parent = queue.pop(0)
+        for i in range(fanout):
+            if created >= element_count:
+                break
+            child = SElement(parent, f'elem{i}')
+            child.setType('dir' if len(queue) < element_count // fanout else 'file')
+            child.addAttribute('loc', str(rng.randint(1, 5000)))
+            created += 1
+            queue.append(child)
+    leaves.extend(queue)
+    deptypes = ['inc', 'call', 'import', 'inherits']
+    for leaf in leaves:
+        for _ in range(deps_per_leaf):
+            target = rng.choice(leaves)
+            if target is not leaf:
+                SElementAssociation(leaf, target, rng.choice(deptypes)).initElems()
+    return graph
+
+
+def benchmark(model_path: str, rounds: int, workers: int = 1):
+    reference = SGraph.parse_xml_or_zipped_xml(model_path)
+    element_count = reference.rootNode.getNodeCount() - 1
+    association_count = reference.rootNode.getEACount()
+    print(f'{model_path}: {element_count} elements, {association_count} associations')
+
+    results: dict[str, float] = {}
+    for backend in XML_PARSER_BACKENDS:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            SGraph.parse_xml_or_zipped_xml(model_path, backend=backend)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[backend] = best  # type: ignore
+    if workers > 1:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            SGraph.parse_xml_or_zipped_xml(model_path, workers=workers)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[f'sax*{workers}'] = best  # type: ignore
+
+    baseline = results['sax']
+    for backend, elapsed in results.items():
+        print(f'  {backend:6} {elapsed:8.3f} s  {element_count / elapsed:12,.0f} elements/s  '
+              f'x{baseline / elapsed:.2f} vs sax')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', nargs='?', help='model file (.xml or .xml.zip) to parse')
+    parser.add_argument('--elements', type=int, default=200000,
+                        help='element count of the generated model')
+    parser.add_argument('--fanout', type=int, default=8,
+                        help='children per element, and top-level elements, of the generated model')
+    parser.add_argument('--rounds', type=int, default=3, help='parse rounds per backend')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='also measure parallel parsing with this many processes')
+    args = parser.parse_args()
+
+    if args.model:
+        benchmark(args.model, args.rounds, args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, 'modelfile.xml')
+        generate_model(args.elements, args.fanout).to_xml(model_path)
+        benchmark(model_path, args.rounds, args.workers)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
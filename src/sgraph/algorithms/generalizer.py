@@ -90,41 +90,60 @@ def generalize_model(model: SGraph, level_to_generalize: int = 3,
             new_model_stack.append(new_child_or_none)
 
     # Clean duplicate dependencies:
-    new_model_stack = [generalized_model.rootNode]
-    while new_model_stack:
-        elem = new_model_stack.pop(0)
-
-        if elem.outgoing:
-            if len(elem.outgoing) > 1:
-                eas_per_target = {}
-                for ea in elem.outgoing:
-                    eas_per_target.setdefault(ea.toElement, []).append(ea)
-                new_eas = []
-                for target, eas in eas_per_target.items():
-                    dep_types = sorted(set([ea.deptype for ea in eas]))
-                    if len(dep_types) > 1:
-                        new_ea = SElementAssociation(elem, target, 'mixed')
-                        new_ea.attrs['all_dep_types'] = dep_types
-                        new_ea.attrs['dep_count'] = len(eas)
-                    else:
-                        new_ea = SElementAssociation(elem, target, dep_types.pop())
-                        new_ea.attrs['all_dep_types'] = dep_types
-                        new_ea.attrs['dep_count'] = len(eas)
-                    new_eas.append(new_ea)
-                for ea in list(elem.outgoing):
-                    ea.remove()
-                for new_ea in new_eas:
-                    new_ea.initElems()
-            else:
-                elem.outgoing[0].attrs['all_dep_types'] = [elem.outgoing[0].deptype]
-                elem.outgoing[0].attrs['dep_count'] = 1
-
-        for child in elem.children:
-            new_model_stack.append(child)
+    elements = [generalized_model.rootNode]
+    i = 0
+    while i < len(elements):
+        elements.extend(elements[i].children)
+        i += 1
+    merge_parallel_associations(elements)
 
     return generalized_model
 
 
+def merge_parallel_associations(elements: list[SElement]):
+    """
+    Replace the outgoing associations of each element with one association per target element.
+    If there are several dependency types towards the same target, the type of the merged
+    association is 'mixed'. The merged associations get attributes all_dep_types and dep_count.
+
+    :param elements: The elements whose outgoing associations are merged
+    """
+    replaced = set()
+    new_eas = []
+    for elem in elements:
+        if len(elem.outgoing) > 1:
+            eas_per_target = {}
+            for ea in elem.outgoing:
+                eas_per_target.setdefault(ea.toElement, []).append(ea)
+            for target, eas in eas_per_target.items():
+                dep_types = sorted(set([ea.deptype for ea in eas]))
+                if len(dep_types) > 1:
+                    new_ea = SElementAssociation(elem, target, 'mixed')
+                    new_ea.attrs['all_dep_types'] = dep_types
+                    new_ea.attrs['dep_count'] = len(eas)
+                else:
+                    new_ea = SElementAssociation(elem, target, dep_types.pop())
+                    new_ea.attrs['all_dep_types'] = dep_types
+                    new_ea.attrs['dep_count'] = len(eas)
+                new_eas.append(new_ea)
+            for ea in elem.outgoing:
+                replaced.add(ea)
+                key = (id(elem), ea.deptype)
+                if ea.toElement._incoming_index.get(key) is ea:
+                    del ea.toElement._incoming_index[key]
+            elem.outgoing = []
+        elif elem.outgoing:
+            elem.outgoing[0].attrs['all_dep_types'] = [elem.outgoing[0].deptype]
+            elem.outgoing[0].attrs['dep_count'] = 1
+
+    # Removing the replaced associations one by one would be quadratic for targets with
+    # lots of incoming associations.
+    for target in set(ea.toElement for ea in replaced):
+        target.incoming = [ea for ea in target.incoming if ea not in replaced]
+    for new_ea in new_eas:
+        new_ea.initElems()
+
+
 def copy_model_and_build_map(max_level: int, generalized_model: SGraph, model: SGraph, have_element_attrs: bool):
     stack = [(model.rootNode, 1)]
     new_model_stack = [generalized_model.rootNode]
@@ -0,0 +1,145 @@
+"""
+Approximate memory accounting of a loaded model, see also python3 -m sgraph.cli.meminfo.
+
+ report = MemoryReport(model)
+ print(report.format())
+
+The sizes are shallow sys.getsizeof sizes of the objects the model refers to. Strings and
+other objects shared by several elements or associations (e.g. interned deptypes) are counted
+once, where they are first met in pre-order. Python allocator overhead is not included, so
+process memory is somewhat higher than the total.
+"""
+from __future__ import annotations
+
+import sys
+from collections import Counter
+from typing import Any
+
+from sgraph import SElement, SGraph
+
+CATEGORIES = ('elements', 'names', 'children', 'element attrs', 'attr keys', 'attr values',
+              'association lists', 'incoming index', 'associations', 'association attrs')
+
+
+class MemoryReport:
+    """Approximate bytes per category, attribute statistics, duplicate strings that could be
+    interned, and totals per top-level subtree of a model. The root node is included in the
+    bytes but not in element_count."""
+
+    def __init__(self, model: SGraph):
+        self.element_count = 0
+        self.association_count = 0
+        self.bytes: dict[str, int] = dict.fromkeys(CATEGORIES, 0)
+        # Attribute name -> number of elements that have it
+        self.attribute_keys: Counter[str] = Counter()
+        # Attribute name -> distinct values
+        self.attribute_values: dict[str, set[Any]] = {}
+        # Strings that are equal to an earlier, different string object
+        self.duplicate_strings = 0
+        self.duplicate_string_bytes = 0
+        self.subtree_bytes: dict[str, int] = {}
+
+        self.__seen: set[int] = set()
+        self.__first_strings: set[str] = set()
+        self.__count(model.rootNode)
+        for top in model.rootNode.children:
+            before = sum(self.bytes.values())
+            for elem in top.iter_preorder():
+                self.element_count += 1
+                self.__count(elem)
+            self.subtree_bytes[top.name] = sum(self.bytes.values()) - before
+        del self.__seen, self.__first_strings
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+    def __object(self, category: str, obj: object):
+        if id(obj) not in self.__seen:
+            self.__seen.add(id(obj))
+            self.bytes[category] += sys.getsizeof(obj)
+
+    def __string(self, category: str, s: str):
+        if id(s) in self.__seen:
+            return
+        self.__seen.add(id(s))
+        size = sys.getsizeof(s)
+        self.bytes[category] += size
+        if s in self.__first_strings:
+            self.duplicate_strings += 1
+            self.duplicate_string_bytes += size
+        else:
+            self.__first_strings.add(s)
+
+    def __value(self, category: str, value: object):
+        if isinstance(value, str):
+            self.__string(category, value)
+        elif isinstance(value, list):
+            self.__object(category, value)
+            for item in value:
+                self.__value(category, item)
+        else:
+            self.__object(category, value)
+
+    def __count(self, elem: SElement):
+        self.__object('elements', elem)
+        self.__string('names', elem.name)
+        self.__object('children', elem.children)
+        self.__object('children', elem.childrenDict)
+        self.__object('element attrs', elem.attrs)
+        for key, value in elem.attrs.items():
+            self.__string('attr keys', key)
+            self.__value('attr values', value)
+            self.attribute_keys[key] += 1
+            self.attribute_values.setdefault(key, set()).add(
+                tuple(value) if isinstance(value, list) else value)
+        self.__object('association lists', elem.outgoing)
+        self.__object('association lists', elem.incoming)
+        self.__object('incoming index', elem._incoming_index)
+        for key in elem._incoming_index:
+            self.__object('incoming index', key)
+            self.__object('incoming index', key[0])
+        for association in elem.outgoing:
+            self.association_count += 1
+            self.__object('associations', association)
+            self.__string('associations', association.deptype)
+            self.__object('association attrs', association.attrs)
+            for key, value in association.attrs.items():
+                self.__string('association attrs', key)
+                self.__value('association attrs', value)
+
+    def as_dict(self, top: int = 20) -> dict[str, Any]:
+        """Return the report as JSON-compatible data, with the top most common attributes."""
+        return {
+            'elements': self.element_count,
+            'associations': self.association_count,
+            'total_bytes': self.total_bytes,
+            'bytes': dict(self.bytes),
+            'attributes': [{
+                'name': key,
+                'elements': count,
+                'distinct_values': len(self.attribute_values[key])
+            } for key, count in self.attribute_keys.most_common(top)],
+            'duplicate_strings': self.duplicate_strings,
+            'duplicate_string_bytes': self.duplicate_string_bytes,
+            'subtrees': dict(sorted(self.subtree_bytes.items(), key=lambda x: -x[1])[:top]),
+        }
+
+    def format(self, top: int = 20) -> str:
+        """Return the report as text, with the top most common attributes and largest
+        subtrees."""
+        total = self.total_bytes or 1
+        x = f'\n MODEL MEMORY  {self.element_count} elements, {self.association_count} ' \
+            f'associations, about {self.total_bytes / 2**20:.1f} MiB'
+        x += '\n ============'
+        for category, size in self.bytes.items():
+            x += f'\n {category:18} {size:14,} bytes {100 * size / total:5.1f} %'
+        x += f'\n\n Duplicate strings: {self.duplicate_strings} ({self.duplicate_string_bytes:,}' \
+             ' bytes could be saved by interning)'
+        x += '\n\n Attribute            elements  distinct values'
+        for key, count in self.attribute_keys.most_common(top):
+            x += f'\n {key:18} {count:10} {len(self.attribute_values[key]):16}'
+        x += '\n\n          bytes            top-level subtree'
+        for name, size in sorted(self.subtree_bytes.items(), key=lambda x: -x[1])[:top]:
+            x += f'\n {size:14,} {100 * size / total:5.1f} %  {name}'
+        return x + '\n'
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from array import array
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -7,8 +8,14 @@ if TYPE_CHECKING:
 
 
 def lowest_common_ancestor(a: SElement, b: SElement):
-    # Note: This can be optimized with better algorithm
-    #  https://en.wikipedia.org/wiki/Lowest_common_ancestor
+    """Return the lowest element that is an ancestor of both a and b, not a or b itself."""
+    # The proper ancestors of a and b are the ancestors of their parents.
+    if a.parent is not None and b.parent is not None:
+        index = a.parent._hierarchy_index
+        if index is not None and index.valid and b.parent._hierarchy_index is index:
+            return index.elements[index.lowest_common_ancestor(a.parent._hierarchy_id,
+                                                               b.parent._hierarchy_id)]
+
     fromAncs = list(reversed(a.getAncestors()))
     toAncs = list(reversed(b.getAncestors()))
     lca = None
@@ -19,3 +26,91 @@ def lowest_common_ancestor(a: SElement, b: SElement):
             else:
                 break
     return lca
+
+
+class HierarchyIndex:
+    """Pre-order intervals and ancestor jump tables of a model hierarchy.
+
+    Elements get ids in pre-order, so the descendants of element i are the ids from i + 1 to
+    ends[i] - 1 and ancestry checks are two comparisons. Ancestors on a given level and lowest
+    common ancestors are found by jumping up in powers of two, in O(log depth).
+
+    The indexed elements refer to the index, and while it is valid, SElement.isDescendantOf,
+    SElement.getAncestorOfLevel and lowest_common_ancestor use it. Creating, adding, detaching
+    or removing elements under an indexed element invalidates the index, after which those go
+    back to walking parent pointers. See SGraph.build_hierarchy_index.
+    """
+
+    def __init__(self, root: SElement):
+        elements: list[SElement] = []
+        parents = array('i')
+        depths = array('i')
+        ends = array('i')
+        # Pre-order walk; negative entries close the subtree of element -entry - 1.
+        stack: list[tuple[SElement, int] | int] = [(root, 0)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, int):
+                ends[-item - 1] = len(elements)
+                continue
+            elem, parent_id = item
+            index = len(elements)
+            elem._hierarchy_index = self
+            elem._hierarchy_id = index
+            elements.append(elem)
+            parents.append(parent_id)
+            depths.append(depths[parent_id] + 1 if index else root.getLevel())
+            ends.append(0)
+            stack.append(-index - 1)
+            for child in reversed(elem.children):
+                stack.append((child, index))
+
+        # jumps[k][i] is the ancestor 2**k levels above element i, or the root.
+        jumps = [parents]
+        max_depth = max(depths) - depths[0]
+        while (1 << len(jumps)) <= max_depth:
+            previous = jumps[-1]
+            jumps.append(array('i', [previous[p] for p in previous]))
+
+        self.valid = True
+        self.root = root
+        self.elements = elements
+        self.depths = depths
+        self.ends = ends
+        self.jumps = jumps
+
+    def is_descendant(self, i: int, ancestor: int) -> bool:
+        return ancestor < i < self.ends[ancestor]
+
+    def ancestor_of_depth(self, i: int, depth: int) -> int:
+        """Return the id of the ancestor of i on the given depth, at most the depth of i."""
+        delta = self.depths[i] - depth
+        k = 0
+        while delta:
+            if delta & 1:
+                i = self.jumps[k][i]
+            delta >>= 1
+            k += 1
+        return i
+
+    def lowest_common_ancestor(self, i: int, j: int) -> int:
+        """Return the id of the lowest common ancestor of i and j, which may be i or j."""
+        if self.depths[i] > self.depths[j]:
+            i = self.ancestor_of_depth(i, self.depths[j])
+        elif self.depths[j] > self.depths[i]:
+            j = self.ancestor_of_depth(j, self.depths[i])
+        if i == j:
+            return i
+        for jump in reversed(self.jumps):
+            if jump[i] != jump[j]:
+                i = jump[i]
+                j = jump[j]
+        return self.jumps[0][i]
+
+    def invalidate(self):
+        """Stop the elements from using the index, and release its tables."""
+        self.valid = False
+        self.elements = []
+        self.depths = array('i')
+        self.ends = array('i')
+        self.jumps = []
@@ -64,8 +64,7 @@ class SGraphFiltering:
                 remove_eas(c)
 
         remove_eas(from_elem)
-        for r in remove_assocs_list:
-            r.remove()
+        SElementAssociation.remove_associations(remove_assocs_list)
 
     @staticmethod
     def remove_dependencies_by_from_path(model: SGraph, from_path: str):
@@ -92,8 +91,7 @@ class SGraphFiltering:
                 remove_eas(c)
 
         remove_eas(from_elem)
-        for r in remove_assocs_list:
-            r.remove()
+        SElementAssociation.remove_associations(remove_assocs_list)
 
     @staticmethod
     def remove_dependencies_by_to_path(model: SGraph, to_path: str):
@@ -119,5 +117,4 @@ class SGraphFiltering:
                 remove_eas(c)
 
         remove_eas(to_elem)
-        for r in remove_assocs_list:
-            r.remove()
+        SElementAssociation.remove_associations(remove_assocs_list)
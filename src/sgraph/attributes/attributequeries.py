@@ -1,12 +1,21 @@
+from __future__ import annotations
+
+import csv
+import io
+import itertools
 import os
 import sys
 import zipfile
 from collections import defaultdict
-from typing import Dict, Set
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Dict, Set
 import subprocess
 
-import pandas as pd
-from pandas.errors import EmptyDataError
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas is imported by the functions that use it, so that loading attribute files with
+# iter_attrs does not import it.
 
 
 def read_attrs_to_list_of_dicts(filepath, sep='\t'):
@@ -20,6 +29,7 @@ def read_attrs_to_list_of_dicts(filepath, sep='\t'):
 
 
 def read_attrs(filepath, sep='\t') -> pd.DataFrame:
+    import pandas as pd
     fname = filepath.split('/')[-1]
     df = None
     if fname.endswith('.zip'):
@@ -34,6 +44,7 @@ def read_attrs(filepath, sep='\t') -> pd.DataFrame:
 
 
 def read_csv_attrs(filepath, sep='\t', zip_format=True):
+    import pandas as pd
     if zip_format:
         fnamezip = filepath.split('/')[-1]
         fn = fnamezip[:fnamezip.rfind('.zip')]
@@ -330,6 +341,11 @@ def autodetect_csv_separator(attrfilepath):
         line1 = f.readline()
         line2 = f.readline()
     f.close()
+    return detect_csv_separator(line1, line2)
+
+
+def detect_csv_separator(line1: str, line2: str) -> str:
+    """Return the separator of a CSV file based on its first two lines."""
     if '\t' in line1 and '\t' in line2:
         return '\t'
     elif ',' in line1 and ',' in line2:
@@ -358,6 +374,8 @@ def read_attrs_generic(attrfilepath):
         return [], []
         # raise Exception('Cannot find attribute file')
 
+    from pandas.errors import EmptyDataError
+
     # TODO Autodetect csv separator based on first line characters.
     separator = autodetect_csv_separator(attrfilepath)
     try:
@@ -384,6 +402,65 @@ def read_attrs_generic(attrfilepath):
         return [], []
 
 
+def iter_attrs(attrfilepath: str, ignored_attributes: Iterable[str] = (),
+               whitelisted_attributes: Iterable[str] = ()) -> Iterator[tuple[str, dict[str, str]]]:
+    """
+    Yield (element path, attributes) of each row of an attribute file in file order, reading
+    the CSV file or the CSV file inside the .zip file as a stream. The separator is detected
+    like in read_attrs_generic. Values are strings as in the file; empty values are ''.
+
+    :param attrfilepath: attribute file path, .zip is tried too if the file does not exist
+    :param ignored_attributes: attributes that are left out
+    :param whitelisted_attributes: if given and no attributes are ignored, only these
+      attributes are read
+    :return: iterator of (element path, {attribute name: value}) with the attributes in name
+      order
+    """
+    if not os.path.exists(attrfilepath) and os.path.exists(attrfilepath + '.zip'):
+        attrfilepath += '.zip'
+    if not os.path.exists(attrfilepath):
+        return
+
+    with open_attrfile(attrfilepath) as f:
+        line1 = f.readline()
+        line2 = f.readline()
+        reader = csv.reader(itertools.chain([line1, line2], f),
+                            delimiter=detect_csv_separator(line1, line2))
+        header = next(reader, None)
+        if not header:
+            return
+        id_index = header.index('id') if 'id' in header else None
+        ignored = set(ignored_attributes)
+        whitelisted = set(whitelisted_attributes)
+        columns = sorted((c, i) for i, c in enumerate(header)
+                         if c != 'id' and (c not in ignored if ignored else
+                                           not whitelisted or c in whitelisted))
+        width = len(header)
+        for row in reader:
+            if not row:
+                continue
+            if id_index is None:
+                raise Exception(
+                    'Error: the attribute file does not have id column. Keys are {}\n'.format(
+                        header))
+            if len(row) < width:
+                row += [''] * (width - len(row))
+            yield row[id_index], {c: row[i] for c, i in columns}
+
+
+def open_attrfile(attrfilepath: str) -> io.TextIOBase:
+    """Open a CSV file, or the CSV file of the same name inside a .zip file, as text."""
+    if attrfilepath.endswith('.zip'):
+        zf = zipfile.ZipFile(attrfilepath)
+        filename = attrfilepath[attrfilepath.rfind('/') + 1:-len('.zip')]
+        try:
+            # The member stream keeps the zip file open until it is closed.
+            return io.TextIOWrapper(zf.open(filename), encoding='utf-8', newline='')
+        finally:
+            zf.close()
+    return open(attrfilepath, encoding='utf-8', newline='')
+
+
 def find_git_dir(output_dir, repo_id):
     project_id = output_dir.split('/')[4]
     path = '/softagram/input/projects/{}/{}'.format(project_id, repo_id)
@@ -0,0 +1,35 @@
+"""
+Build the sidecar offset index of a model file, used for loading subgraphs without parsing
+the whole model (see sgraph.loader.modelindex).
+
+Use like this:
+ python3 -m sgraph.cli.build_model_index path/to/model.xml.zip
+ python3 -m sgraph.cli.build_model_index --depth 6 path/to/modelfile.xml
+
+The index is written next to the model, e.g. path/to/model.xml.zip.idx
+"""
+import argparse
+import sys
+import time
+
+from sgraph.loader.modelindex import DEFAULT_INDEX_DEPTH, ModelIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='+', help='model files (.xml or .xml.zip)')
+    parser.add_argument('--depth', type=int, default=DEFAULT_INDEX_DEPTH,
+                        help='index element subtrees down to this level')
+    args = parser.parse_args()
+
+    for model_path in args.models:
+        start = time.perf_counter()
+        index = ModelIndex.build(model_path, args.depth)
+        index.save()
+        print(f'{ModelIndex.index_path_for(model_path)}: {len(index.names)} elements, '
+              f'{len(index.out_rows)} references, {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
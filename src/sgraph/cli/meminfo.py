@@ -0,0 +1,35 @@
+"""
+Report approximately how much memory a model takes and where it goes: per category, per
+attribute and per top-level subtree (see sgraph.algorithms.memoryreport).
+
+Use like this:
+ python3 -m sgraph.cli.meminfo path/to/model.xml.zip
+ python3 -m sgraph.cli.meminfo --top 50 --json path/to/modelfile.xml
+"""
+import argparse
+import json
+import sys
+
+from sgraph import SGraph
+from sgraph.algorithms.memoryreport import MemoryReport
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='+', help='model files (.xml or .xml.zip)')
+    parser.add_argument('--top', type=int, default=20,
+                        help='show this many attributes and top-level subtrees')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    for model_path in args.models:
+        report = MemoryReport(SGraph.parse_xml_or_zipped_xml(model_path))
+        if args.json:
+            print(json.dumps({'model': model_path, **report.as_dict(args.top)}, indent=2))
+        else:
+            print(model_path + report.format(args.top))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
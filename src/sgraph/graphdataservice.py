@@ -3,12 +3,99 @@ from __future__ import annotations
 import io
 import json
 import os
+import threading
+import time
 import zipfile
+from collections import OrderedDict
 
 from sgraph import ModelApi, SGraph
 from sgraph.converters import sbom_cyclonedx_generator
 from sgraph.converters.sgraph_to_cytoscape import graph_to_cyto
 from sgraph.exceptions import ModelNotFoundException
+from sgraph.loader.modelindex import ModelIndex
+
+# Approximate memory of a parsed model per element and per association, as measured with
+# sgraph.algorithms.memoryreport on generated models.
+ELEMENT_BYTES = 700
+ASSOCIATION_BYTES = 220
+
+
+class LoadedModelCache:
+    """
+    LRU of parsed models, keyed by (output_dir, analysis target, model path, model mtime).
+
+    Bounded both by model count and by the approximate memory of the models. Putting the model
+    of a target drops the other models of the same target, so models of older analysis runs
+    are released as soon as a newer timestamp directory has a model. Thread-safe.
+    """
+
+    def __init__(self, max_models: int = 4, max_bytes: int = 2 << 30):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.total_bytes = 0
+        self.models: OrderedDict[tuple[str, str, str, int], tuple[SGraph, int]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def estimate_bytes(graph: SGraph) -> int:
+        return (ELEMENT_BYTES * graph.rootNode.getNodeCount() +
+                ASSOCIATION_BYTES * graph.rootNode.getEACount())
+
+    def get(self, key: tuple[str, str, str, int]) -> SGraph | None:
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.models.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: tuple[str, str, str, int], graph: SGraph):
+        size = self.estimate_bytes(graph)
+        with self.lock:
+            for other in [k for k in self.models if k[:2] == key[:2] and k != key]:
+                self.total_bytes -= self.models.pop(other)[1]
+                self.invalidations += 1
+            if key in self.models:
+                self.total_bytes -= self.models.pop(key)[1]
+            self.models[key] = (graph, size)
+            self.total_bytes += size
+            # The latest model is kept even if it alone exceeds max_bytes.
+            while len(self.models) > 1 and (len(self.models) > self.max_models or
+                                            self.total_bytes > self.max_bytes):
+                _key, (_graph, evicted_size) = self.models.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                'models': len(self.models),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Models loaded by extract_and_load, see model_cache.stats() for its counters.
+model_cache = LoadedModelCache()
+
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+# Target dir -> (mtime of the dir, its timestamp subdirectory names, newest last)
+_timestamp_dirs: dict[str, tuple[int, list[str]]] = {}
 
 
 def extract_subgraph_as_json(analysis_target_name: str, output_dir: str, element_path: str,
@@ -27,8 +114,13 @@ def extract_subgraph_as_json(analysis_target_name: str, output_dir: str, element
 
 
 def extract_filtered_subgraph(analysis_target_name: str, output_dir: str, element_path: str):
-    graph = extract_and_load(analysis_target_name, output_dir)
-    elem = graph.createOrGetElementFromPath(element_path)
+    graph = load_for_subgraph(analysis_target_name, output_dir, element_path)
+    elem = graph.findElementFromPath(element_path)
+    if elem is None:
+        # The graph may be shared through model_cache, so the missing element is created
+        # in a graph of its own, which filters to the same subgraph.
+        graph = SGraph()
+        elem = graph.createOrGetElementFromPath(element_path)
     if elem:
         # TODO handle also recursion param
         return ModelApi.filter_model(elem, graph)
@@ -36,11 +128,39 @@ def extract_filtered_subgraph(analysis_target_name: str, output_dir: str, elemen
         raise Exception(f'Element path {element_path} not found')
 
 
-def extract_and_load(analysis_target_name: str, output_dir: str):
+def load_for_subgraph(analysis_target_name: str, output_dir: str, element_path: str):
+    """
+    Load the parts of the model needed for filtering the subgraph of element_path, if the model
+    has a sidecar index (see sgraph.cli.build_model_index), otherwise the whole model.
+    """
+    modelfile = get_latest_model(output_dir, analysis_target_name)
+    if modelfile is not None:
+        index = ModelIndex.for_model(modelfile, build=False)
+        if index is not None:
+            return index.load_subgraph(element_path)
+    return extract_and_load(analysis_target_name, output_dir)
+
+
+def extract_and_load(analysis_target_name: str, output_dir: str, use_cache: bool = True):
+    """
+    Load the latest model of the analysis target. The model is shared with later calls through
+    model_cache, so it must not be modified unless use_cache is False.
+    """
     modelfile = get_latest_model(output_dir, analysis_target_name)
     if modelfile is None:
         raise ModelNotFoundException(
             f'Cannot find model for {analysis_target_name} under {output_dir}')
+    if not use_cache:
+        return load_model_zip(modelfile)
+    key = (output_dir, analysis_target_name, modelfile, os.stat(modelfile).st_mtime_ns)
+    graph = model_cache.get(key)
+    if graph is None:
+        graph = load_model_zip(modelfile)
+        model_cache.put(key, graph)
+    return graph
+
+
+def load_model_zip(modelfile: str) -> SGraph:
     with zipfile.ZipFile(modelfile) as zfile:
         # We need to support old and new file names (if analysis is not run
         # for a long time, there can be modelfile in the old location but not
@@ -67,18 +187,24 @@ def produce_output(outputformat: str, subg: SGraph):
 
 def get_latest_model(output_dir: str, analysis_target_name: str):
     target_dir = output_dir + '/' + analysis_target_name
-    modelpaths = []
-    if os.path.isdir(target_dir):
-        for o in os.listdir(target_dir):
-            ts_dir = target_dir + '/' + o
-            if os.path.isdir(ts_dir):
-                # Try the new location first
-                modelpath = ts_dir + '/model.xml.zip'
-                if os.path.exists(modelpath):
-                    modelpaths.append(modelpath)
-    if modelpaths:
-        modelpaths.sort()
-        modelpath = modelpaths[-1]
-    else:
-        modelpath = None
-    return modelpath
+    try:
+        mtime = os.stat(target_dir).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    # The directory is listed again only when its entries change, i.e. its mtime changes.
+    # The model files are checked on every call, as they are written after their directory.
+    cached = _timestamp_dirs.get(target_dir)
+    if cached is None or cached[0] != mtime:
+        if not os.path.isdir(target_dir):
+            return None
+        names = sorted(os.listdir(target_dir), key=lambda o: o + '/model.xml.zip')
+        cached = (mtime, names)
+        # A listing made within the mtime granularity of the file system could miss an entry
+        # added right after it without changing the mtime, so it is not reused.
+        if time.time_ns() - mtime > MTIME_GRANULARITY_NS:
+            _timestamp_dirs[target_dir] = cached
+    for o in reversed(cached[1]):
+        modelpath = target_dir + '/' + o + '/model.xml.zip'
+        if os.path.isfile(modelpath):
+            return modelpath
+    return None
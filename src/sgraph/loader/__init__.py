@@ -1,2 +1,4 @@
 from sgraph.loader.modelloader import ModelLoader
 from sgraph.loader.attributeloader import AttributeLoader
+from sgraph.loader.modelindex import ModelIndex
+from sgraph.loader.modelcache import ModelCache
@@ -1,18 +1,52 @@
 from __future__ import annotations
 
-import math
 import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, Future
 
 from sgraph import SGraph
 from sgraph.attributes import attributequeries
+from sgraph.sgraph_utils import PathCursor, PathFilter
 
 
 class AttributeLoader:
+    # Attribute files of a model, relative to the model root directory, in loading order.
+    ATTRIBUTE_FILES = [
+        'attr_temporary.csv', 'git/attr_git_propagated.csv', 'git/attr_analysis_state.csv',
+        'content/loc/attr_loc_propagated.csv', 'content/loc/attr_testcode_loc_propagated.csv',
+        'content/loc/attr_languages.csv', 'content/attr_licenses.csv',
+        'attr_issue_propagated.csv', 'content/attr_risk_level.csv', 'content/attr_pmd.csv'
+    ]
+
     def __init__(self):
         pass
 
-    # noinspection PyMethodMayBeStatic
-    def load_attrfile(self, filepath: str, model: SGraph, elem_attribute_filters: list[str]):
+    @staticmethod
+    def attribute_file_paths(filepath_of_model_root: str) -> list[tuple[str, str | None]]:
+        """Return (attribute file, path of the file or None if it is missing) of each
+        attribute file of the model, preferring the zipped files."""
+        paths: list[tuple[str, str | None]] = []
+        for attrfile in AttributeLoader.ATTRIBUTE_FILES:
+            fullpath = filepath_of_model_root + '/' + attrfile + '.zip'
+            if os.path.exists(fullpath) and os.path.isfile(fullpath):
+                # Usual case, when this is done after zipper postprocessor
+                paths.append((attrfile, fullpath))
+                continue
+            # Without .zip extension
+            # Attributes can be loaded in data mining phase, when zipper has not been
+            # executed.
+            fullpath = filepath_of_model_root + '/' + attrfile
+            if os.path.exists(fullpath) and os.path.isfile(fullpath):
+                paths.append((attrfile, fullpath))
+            else:
+                paths.append((attrfile, None))
+        return paths
+
+    @staticmethod
+    def __attribute_filters(
+            elem_attribute_filters: list[str]) -> tuple[list[str], list[str]] | None:
+        """Return (ignored, whitelisted) attributes of the filters, or None if all attributes
+        are ignored."""
         ignored_attributes = []
         whitelisted_attributes = []
 
@@ -20,56 +54,116 @@ class AttributeLoader:
             if a.startswith('IGNORE '):
                 ignored = a[7:]
                 if ignored == '*':
-                    return model
+                    return None
                 ignored_attributes.append(ignored)
             else:
                 if a != '*':
                     whitelisted_attributes.append(a)
+        return ignored_attributes, whitelisted_attributes
 
-        columns, entries = attributequeries.read_attrs_generic(filepath)
-        for elem_path, attrs in entries:
-            if isinstance(elem_path, int):
+    @staticmethod
+    def __read_rows(filepath: str, attribute_filters: tuple[list[str], list[str]],
+                    path_filter: PathFilter | None) -> Iterator[tuple[str, dict[str, str]]]:
+        for elem_path, attrs in attributequeries.iter_attrs(filepath, *attribute_filters):
+            if elem_path.isdigit():
                 raise Exception(f'Invalid attribute file {filepath} as id {elem_path} is numeric..')
-            elem = model.createOrGetElementFromPath(elem_path)
-            for c in columns:
-                if ignored_attributes:
-                    if c in ignored_attributes:
-                        continue
-                elif whitelisted_attributes:
-                    if c not in whitelisted_attributes:
-                        continue
-                val = attrs[c]
-                if not isinstance(val, str):
-                    val = '' if math.isnan(val) else val
-
-                elem.addAttribute(c, val)
+            if path_filter is not None and not path_filter.accepts(elem_path):
+                # Do not recreate elements that were left out when parsing the model.
+                continue
+            yield elem_path, attrs
+
+    @staticmethod
+    def __apply_rows(model: SGraph, rows: Iterable[tuple[str, dict[str, str]]], intern: bool):
+        strings = model.get_string_table() if intern else None
+        # Attribute files are sorted by path, so consecutive rows are mostly siblings or
+        # children, which the cursor resolves from the previous row instead of the root.
+        cursor = PathCursor(model)
+        for elem_path, attrs in rows:
+            elem = cursor.get_or_create(elem_path)
+            if strings is not None:
+                attrs = strings.attrs(attrs)
+            elem.attrs.update(attrs)
+
+    # noinspection PyMethodMayBeStatic
+    def load_attrfile(self, filepath: str, model: SGraph, elem_attribute_filters: list[str],
+                      path_filter: PathFilter | None = None, intern: bool = False):
+        """
+        Load an attribute file to the model elements.
 
+        :param intern: share equal attribute names and low-cardinality values through the
+          string table of the model, see SGraph.get_string_table
+        """
+        attribute_filters = self.__attribute_filters(elem_attribute_filters)
+        if attribute_filters is not None:
+            self.__apply_rows(model, self.__read_rows(filepath, attribute_filters, path_filter),
+                              intern)
         return model
 
+    def read_all_files(
+        self,
+        filepath_of_model_root: str,
+        elem_attribute_filters: list[str],
+        executor: Executor,
+        path_filter: PathFilter | None = None,
+    ) -> list[tuple[str, Future[list[tuple[str, dict[str, str]]]] | None]]:
+        """
+        Start reading the attribute files of the model on the executor, e.g. while the model
+        is parsed. Pass the result to load_all_files as read_files to apply the rows.
+
+        The rows of each file are kept in memory until they are applied, unlike when
+        load_all_files reads the files itself.
+
+        :return: (attribute file, future of its rows or None if the file is missing) of each
+          attribute file
+        """
+        attribute_filters = self.__attribute_filters(elem_attribute_filters)
+        read_files: list[tuple[str, Future[list[tuple[str, dict[str, str]]]] | None]] = []
+        for attrfile, fullpath in self.attribute_file_paths(filepath_of_model_root):
+            if fullpath is None:
+                read_files.append((attrfile, None))
+            else:
+                read_files.append((attrfile, executor.submit(
+                    self.__read_rows_to_list, fullpath, attribute_filters, path_filter)))
+        return read_files
+
+    @staticmethod
+    def __read_rows_to_list(
+            filepath: str, attribute_filters: tuple[list[str], list[str]] | None,
+            path_filter: PathFilter | None) -> list[tuple[str, dict[str, str]]]:
+        if attribute_filters is None:
+            return []
+        return list(AttributeLoader.__read_rows(filepath, attribute_filters, path_filter))
+
     def load_all_files(
         self,
         model: SGraph,
         filepath_of_model_root: str,
         elem_attribute_filters: list[str],
+        path_filter: PathFilter | None = None,
+        intern: bool = False,
+        read_files: list[tuple[str, Future[list[tuple[str, dict[str, str]]]] | None]]
+        | None = None,
     ):
-        attrfiles = [
-            'attr_temporary.csv', 'git/attr_git_propagated.csv', 'git/attr_analysis_state.csv',
-            'content/loc/attr_loc_propagated.csv', 'content/loc/attr_testcode_loc_propagated.csv',
-            'content/loc/attr_languages.csv', 'content/attr_licenses.csv',
-            'attr_issue_propagated.csv', 'content/attr_risk_level.csv', 'content/attr_pmd.csv'
-        ]
+        """
+        Load the attribute files of the model in ATTRIBUTE_FILES order, so that the last file
+        wins when several files have the same attribute.
+
+        :param read_files: the files as started by read_all_files with the same model root
+          and filters, otherwise the files are read here one after another
+        :return: the model and the missing attribute files
+        """
         attribute_files_missing: list[str] = []
-        for attrfile in attrfiles:
-            fullpath = filepath_of_model_root + '/' + attrfile + '.zip'
-            if os.path.exists(fullpath) and os.path.isfile(fullpath):
-                # Usual case, when this is done after zipper postprocessor
-                self.load_attrfile(fullpath, model, elem_attribute_filters)
-            else:
-                # Without .zip extension
-                # Attributes can be loaded in data mining phase, when zipper has not been executed.
-                fullpath = filepath_of_model_root + '/' + attrfile
-                if os.path.exists(fullpath) and os.path.isfile(fullpath):
-                    self.load_attrfile(fullpath, model, elem_attribute_filters)
+        if read_files is None:
+            for attrfile, fullpath in self.attribute_file_paths(filepath_of_model_root):
+                if fullpath is not None:
+                    self.load_attrfile(fullpath, model, elem_attribute_filters, path_filter,
+                                       intern)
+                else:
+                    attribute_files_missing.append(attrfile)
+        else:
+            for attrfile, rows in read_files:
+                if rows is not None:
+                    self.__apply_rows(model, rows.result(), intern)
                 else:
                     attribute_files_missing.append(attrfile)
         return model, attribute_files_missing
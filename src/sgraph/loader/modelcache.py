@@ -0,0 +1,124 @@
+"""
+On-disk cache of loaded models, see ModelLoader.load_model(cache_dir=...).
+
+Entries are models in the binary format (sgraph_binary), named by a hash of the key given by
+the loader: the fingerprints (size, mtime and content hash) of the model file and its
+attribute files, and the loading options. Loading an entry takes a small fraction of parsing
+the model and reading its attribute files.
+
+Entries are written to a temporary file that is renamed in place, so concurrent loaders never
+see partial entries; the last writer of the same entry wins. When the entries take more than
+max_bytes, the least recently used ones are removed.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sgraph import SGraph
+from sgraph.sgraph_binary import FORMAT_VERSION, dumps, loads
+
+ENTRY_SUFFIX = '.sgb'
+TMP_SUFFIX = '.tmp'
+# Temporary files older than this are left over from interrupted writes.
+TMP_MAX_AGE_SECONDS = 3600
+
+
+def file_fingerprint(filepath: str) -> list | None:
+    """Return [size, mtime_ns, sha256 of content] of the file, or None if it does not
+    exist."""
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+
+
+class ModelCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 4 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Return the entry key of JSON-serializable parts, e.g. file fingerprints and
+        loading options."""
+        data = json.dumps([FORMAT_VERSION, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> SGraph | None:
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            model = loads(data)
+        except Exception as e:
+            # A truncated or corrupt entry can fail anywhere in decoding, e.g. struct.error.
+            sys.stderr.write(f'Removing unreadable model cache entry {path}: {e}\n')
+            self.__remove(path)
+            return None
+        try:
+            # The modification time orders the entries for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return model
+
+    def put(self, key: str, model: SGraph):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dumps(model))
+            os.replace(tmp_path, self.entry_path(key))
+        except BaseException:
+            self.__remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove temporary files left over from interrupted writes, and the least recently used
+        entries until the entries and the temporary files being written fit in max_bytes."""
+        entries = []
+        total = 0
+        tmp_deadline = time.time_ns() - TMP_MAX_AGE_SECONDS * 1_000_000_000
+        for entry in os.scandir(self.cache_dir):
+            is_entry = entry.name.endswith(ENTRY_SUFFIX)
+            if not is_entry and not entry.name.endswith(TMP_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # removed by another process
+            if is_entry:
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            elif stat.st_mtime_ns < tmp_deadline:
+                self.__remove(entry.path)
+                continue
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.__remove(path)
+            total -= size
+
+    @staticmethod
+    def __remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,381 @@
+"""
+Sidecar offset index for random access into model XML files.
+
+The index records the byte range of every element subtree down to a configurable depth, and
+the references between those subtrees. Elements deeper than the depth are represented by their
+indexed ancestor. With the index, the subgraph of one element can be loaded by parsing only its
+own subtree and the subtrees of the elements it is associated with, instead of the whole model.
+
+For .xml.zip models the offsets refer to the uncompressed model file. Reaching an offset
+still decompresses the data before it, but that is far cheaper than parsing it.
+
+ index = ModelIndex.build('model.xml.zip')
+ index.save()  # model.xml.zip.idx
+ ...
+ index = ModelIndex.for_model('model.xml.zip')
+ graph = index.load_subgraph('/org/repo/src')
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import xml.parsers.expat
+import zipfile
+from array import array
+from typing import BinaryIO
+
+from sgraph import SGraph
+from sgraph.sgraph_binary import (_HEADER, SGraphBinaryFormatError, _put_array, _put_bytes,
+                                  _Reader)
+
+INDEX_SUFFIX = '.idx'
+DEFAULT_INDEX_DEPTH = 5
+
+MAGIC = b'SGRAPHI\x00'
+FORMAT_VERSION = 1
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+class StaleModelIndexError(Exception):
+    pass
+
+
+class ModelIndex:
+    """Byte offsets of element subtrees of a model file and the references between them.
+
+    Rows are the indexed elements in document order. For each row the index has its name,
+    parent row, the byte range of its subtree, where its first child element starts and, in
+    CSR form, the rows it refers to and the rows referring to it. References from and to
+    elements deeper than max_depth are attributed to their ancestor row on level max_depth.
+    """
+    names: list[str]
+    parents: array
+    starts: array
+    ends: array
+    head_ends: array
+    out_offsets: array
+    out_rows: array
+    in_offsets: array
+    in_rows: array
+
+    def __init__(self, model_path: str, max_depth: int, model_size: int, model_mtime: float):
+        self.model_path = model_path
+        self.max_depth = max_depth
+        self.model_size = model_size
+        self.model_mtime = model_mtime
+
+    @staticmethod
+    def index_path_for(model_path: str) -> str:
+        return model_path + INDEX_SUFFIX
+
+    @staticmethod
+    def build(model_path: str, max_depth: int = DEFAULT_INDEX_DEPTH) -> ModelIndex:
+        """Scan the model file and build the index for it."""
+        if max_depth < 1:
+            raise ValueError(f'Invalid max_depth {max_depth}, expected 1 or more')
+        stat = os.stat(model_path)
+        index = ModelIndex(model_path, max_depth, stat.st_size, stat.st_mtime)
+        builder = _IndexBuilder(max_depth)
+        with _open_model(model_path) as f:
+            builder.run(f)
+        builder.fill(index)
+        return index
+
+    @staticmethod
+    def for_model(model_path: str, build: bool = True,
+                  max_depth: int = DEFAULT_INDEX_DEPTH) -> ModelIndex | None:
+        """Load the sidecar index of the model, or if it is missing or outdated, build it and
+        save it when build is True. Returns None when there is no usable index."""
+        index_path = ModelIndex.index_path_for(model_path)
+        if os.path.exists(index_path):
+            try:
+                return ModelIndex.load(index_path, model_path)
+            except (StaleModelIndexError, SGraphBinaryFormatError):
+                pass
+        if not build:
+            return None
+        index = ModelIndex.build(model_path, max_depth)
+        index.save(index_path)
+        return index
+
+    def save(self, index_path: str | None = None):
+        index_path = index_path or ModelIndex.index_path_for(self.model_path)
+        meta = json.dumps({
+            'max_depth': self.max_depth,
+            'model_size': self.model_size,
+            'model_mtime': self.model_mtime,
+        }).encode('utf-8')
+        encoded_names = [name.encode('utf-8', 'surrogatepass') for name in self.names]
+        chunks: list[bytes] = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0)]
+        _put_bytes(chunks, meta)
+        _put_array(chunks, array('q', [len(name) for name in encoded_names]))
+        _put_bytes(chunks, b''.join(encoded_names))
+        for arr in (self.parents, self.starts, self.ends, self.head_ends, self.out_offsets,
+                    self.out_rows,
+                    self.in_offsets, self.in_rows):
+            _put_array(chunks, arr)
+        # Write and rename, so that readers never see a partially written index.
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(chunks))
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def load(index_path: str, model_path: str | None = None) -> ModelIndex:
+        """Load an index. Raises StaleModelIndexError if the model file has changed after
+        indexing. model_path defaults to the index path without its suffix."""
+        if model_path is None:
+            model_path = index_path[:-len(INDEX_SUFFIX)]
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        reader = _Reader(data)
+        magic, version, _flags = reader.header()
+        if magic != MAGIC:
+            raise SGraphBinaryFormatError('Not an sgraph model index file')
+        if version != FORMAT_VERSION:
+            raise SGraphBinaryFormatError(f'Unsupported sgraph model index version {version}')
+        meta = json.loads(reader.bytes().decode('utf-8'))
+        stat = os.stat(model_path)
+        if stat.st_size != meta['model_size'] or stat.st_mtime != meta['model_mtime']:
+            raise StaleModelIndexError(f'Index {index_path} is outdated for {model_path}')
+
+        index = ModelIndex(model_path, meta['max_depth'], meta['model_size'],
+                           meta['model_mtime'])
+        name_lengths = reader.array('q')
+        blob = reader.bytes()
+        names: list[str] = []
+        pos = 0
+        for length in name_lengths:
+            names.append(blob[pos:pos + length].decode('utf-8', 'surrogatepass'))
+            pos += length
+        index.names = names
+        index.parents = reader.array('i')
+        index.starts = reader.array('q')
+        index.ends = reader.array('q')
+        index.head_ends = reader.array('q')
+        index.out_offsets = reader.array('q')
+        index.out_rows = reader.array('i')
+        index.in_offsets = reader.array('q')
+        index.in_rows = reader.array('i')
+        return index
+
+    def _subtree_end_row(self, row: int) -> int:
+        """Rows are in document order, so the subtree of a row is a continuous row range."""
+        return bisect.bisect_left(self.starts, self.ends[row], row + 1)
+
+    def _child_row(self, row: int, name: str) -> int | None:
+        if row < 0:
+            child, end = 0, len(self.names)
+        else:
+            child, end = row + 1, self._subtree_end_row(row)
+        while child < end:
+            if self.names[child] == name:
+                return child
+            child = self._subtree_end_row(child)
+        return None
+
+    def find_row(self, element_path: str) -> tuple[int, bool]:
+        """Find the row of an element path. Returns the row, or the row of the closest indexed
+        ancestor (-1 for the root), and whether the row is the element itself."""
+        row = -1
+        for name in element_path.strip('/').split('/'):
+            if not name:
+                continue
+            child = self._child_row(row, name)
+            if child is None:
+                return row, False
+            row = child
+        return row, True
+
+    def related_rows(self, row: int) -> list[int]:
+        """The rows of the subtree of row, followed by the rows associated with them."""
+        rows = range(row, self._subtree_end_row(row))
+        related: set[int] = set()
+        for r in rows:
+            related.update(self.out_rows[self.out_offsets[r]:self.out_offsets[r + 1]])
+            related.update(self.in_rows[self.in_offsets[r]:self.in_offsets[r + 1]])
+        return [row] + sorted(related.difference(rows))
+
+    def load_subgraph(self, element_path: str, **parse_options) -> SGraph:
+        """
+        Load the part of the model needed for filtering the subgraph of element_path: the
+        element with its descendants, and every element associated with them, with their
+        descendants. Ancestors of these subtrees are loaded without their other children.
+        References out of the loaded part are dropped.
+
+        :param element_path: path of the element, e.g. /org/repo/src
+        :param parse_options: options for SGraph.parse_xml_string, e.g. type_rules
+        :return: the partial model
+        """
+        row, _found = self.find_row(element_path)
+        if row < 0:
+            # Not in the model (or the model root), nothing can be skipped.
+            return SGraph.parse_xml_or_zipped_xml(self.model_path, **parse_options)
+        spans = self._merged_spans(self.related_rows(row))
+        return SGraph.parse_xml_string(self._read_partial_model(spans),
+                                       drop_unknown_references=True, **parse_options)
+
+    def _merged_spans(self, rows: list[int]) -> list[int]:
+        """Sort rows by offset and drop the rows that are inside another row's subtree."""
+        merged: list[int] = []
+        for row in sorted(rows, key=lambda r: self.starts[r]):
+            if merged and self.starts[row] < self.ends[merged[-1]]:
+                continue
+            merged.append(row)
+        return merged
+
+    def _ancestor_rows(self, row: int) -> list[int]:
+        ancestors = []
+        row = self.parents[row]
+        while row >= 0:
+            ancestors.append(row)
+            row = self.parents[row]
+        ancestors.reverse()
+        return ancestors
+
+    def _read_partial_model(self, rows: list[int]) -> str:
+        """Read the subtrees of rows and nest them under their ancestors into an XML model.
+        Ancestors are copied up to their first child, to get their attributes.
+
+        The byte ranges are read in one forward pass over the model file, as seeking back in
+        a .xml.zip model decompresses it again from the start."""
+        rows = sorted(rows, key=lambda r: self.starts[r])
+        # Output parts: XML text, or (start, end) byte ranges of the model file.
+        parts: list[str | tuple[int, int]] = ['<model version="2.1"><elements>']
+        open_rows: list[int] = []
+        for row in rows:
+            ancestors = self._ancestor_rows(row)
+            common = 0
+            while (common < len(open_rows) and common < len(ancestors)
+                   and open_rows[common] == ancestors[common]):
+                common += 1
+            parts.append('</e>' * (len(open_rows) - common))
+            del open_rows[common:]
+            for ancestor in ancestors[common:]:
+                parts.append((self.starts[ancestor], self.head_ends[ancestor]))
+                open_rows.append(ancestor)
+            parts.append((self.starts[row], self.ends[row]))
+        parts.append('</e>' * len(open_rows))
+        parts.append('</elements></model>')
+
+        texts: dict[tuple[int, int], str] = {}
+        with _open_model(self.model_path) as f:
+            for span in sorted(part for part in parts if isinstance(part, tuple)):
+                f.seek(span[0])
+                texts[span] = f.read(span[1] - span[0]).decode('utf-8')
+        return ''.join(part if isinstance(part, str) else texts[part] for part in parts)
+
+
+def _open_model(model_path: str) -> BinaryIO:
+    if model_path.endswith('.zip'):
+        with zipfile.ZipFile(model_path) as zfile:
+            return zfile.open(zfile.namelist()[0], 'r')  # type: ignore
+    return open(model_path, 'rb')
+
+
+class _IndexBuilder:
+    """Collects the rows of a ModelIndex from pyexpat callbacks."""
+
+    def __init__(self, max_depth: int):
+        self.max_depth = max_depth
+        self.names: list[str] = []
+        self.parents = array('i')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.head_ends = array('q')
+        # Rows of the open elements; folded elements repeat the row of their ancestor.
+        self.stack: list[int] = []
+        # Rows whose end offset is the offset of the next tag.
+        self.unfinished: list[int] = []
+        self.id_to_row: dict[str, int] = {}
+        self.ref_rows = array('i')
+        self.ref_ids: list[str] = []
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+
+    def run(self, f: BinaryIO):
+        total = 0
+        while True:
+            chunk = f.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            self.parser.Parse(chunk, False)
+        self.parser.Parse(b'', True)
+        self.finish_rows(total)
+
+    def finish_rows(self, offset: int):
+        for row in self.unfinished:
+            self.ends[row] = offset
+            if self.head_ends[row] < 0:
+                self.head_ends[row] = offset
+        self.unfinished = []
+
+    def start_element(self, tag: str, attrs: dict[str, str]):
+        offset = self.parser.CurrentByteIndex
+        if self.unfinished:
+            self.finish_rows(offset)
+        if tag == 'e':
+            if self.stack and len(self.stack) <= self.max_depth:
+                parent = self.stack[-1]
+                if self.head_ends[parent] < 0:
+                    self.head_ends[parent] = offset
+            if len(self.stack) >= self.max_depth:
+                row = self.stack[-1]
+            else:
+                row = len(self.names)
+                self.names.append(attrs.get('n', '').replace('/', '__slash__'))
+                self.parents.append(self.stack[-1] if self.stack else -1)
+                self.starts.append(offset)
+                self.ends.append(-1)
+                self.head_ends.append(-1)
+            self.stack.append(row)
+            element_id = attrs.get('i')
+            if element_id is not None:
+                self.id_to_row[element_id] = row
+        elif tag == 'r' and self.stack:
+            row = self.stack[-1]
+            for element_id in attrs.get('r', '').split(','):
+                if element_id:
+                    self.ref_rows.append(row)
+                    self.ref_ids.append(element_id)
+
+    def end_element(self, tag: str):
+        offset = self.parser.CurrentByteIndex
+        if self.unfinished:
+            self.finish_rows(offset)
+        if tag == 'e':
+            depth = len(self.stack)
+            row = self.stack.pop()
+            if depth <= self.max_depth:
+                self.unfinished.append(row)
+
+    def fill(self, index: ModelIndex):
+        index.names = self.names
+        index.parents = self.parents
+        index.starts = self.starts
+        index.ends = self.ends
+        index.head_ends = self.head_ends
+        pairs = set()
+        id_to_row = self.id_to_row
+        for row, element_id in zip(self.ref_rows, self.ref_ids):
+            target = id_to_row.get(element_id)
+            if target is not None and target != row:
+                pairs.add((row, target))
+        index.out_offsets, index.out_rows = _csr(len(self.names), sorted(pairs))
+        index.in_offsets, index.in_rows = _csr(len(self.names),
+                                               sorted((t, r) for r, t in pairs))
+
+
+def _csr(row_count: int, sorted_pairs: list[tuple[int, int]]) -> tuple[array, array]:
+    offsets = array('q', [0] * (row_count + 1))
+    values = array('i')
+    for row, value in sorted_pairs:
+        offsets[row + 1] += 1
+        values.append(value)
+    for i in range(row_count):
+        offsets[i + 1] += offsets[i]
+    return offsets, values
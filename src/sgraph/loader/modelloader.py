@@ -2,9 +2,15 @@ from __future__ import annotations
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from sgraph import SGraph
 from sgraph.loader.attributeloader import AttributeLoader
+from sgraph.loader.modelcache import ModelCache, file_fingerprint
+from sgraph.sgraph_utils import PathFilter
+
+# Threads that read attribute files in load_model(concurrent=True)
+ATTRIBUTE_READ_WORKERS = 4
 
 
 class ModelLoader:
@@ -17,7 +23,14 @@ class ModelLoader:
         filepath: str,
         dep_types: list[str] | None = None,
         elem_attribute_filters: list[str] | None = None,
-        assoc_attribute_filters: list[str] | None = None
+        assoc_attribute_filters: list[str] | None = None,
+        include_paths: list[str] | None = None,
+        exclude_paths: list[str] | None = None,
+        stub_skipped_targets: bool = False,
+        intern: bool = False,
+        cache_dir: str | None = None,
+        cache_max_bytes: int = 4 << 30,
+        concurrent: bool = False,
     ) -> SGraph:
         """
         Loads model and its attribute files.
@@ -33,6 +46,20 @@ class ModelLoader:
           related to element attributes
         :param assoc_attribute_filters: list of attribute handling rules ("IGNORE <attr-nam>",..)
           related to association attributes
+        :param include_paths: if given, only these subtrees are loaded (e.g. ['/org/repo/src'])
+        :param exclude_paths: subtrees that are not loaded (e.g. ['/org/repo/External'])
+        :param stub_skipped_targets: keep associations to elements that were not loaded by
+          creating their targets as plain elements, instead of dropping the associations
+        :param intern: share equal names and attribute strings of the model and its attribute
+          files through the string table of the model, see SGraph.get_string_table
+        :param cache_dir: if given, the loaded model is cached in this directory and loaded from
+          there as long as the model file, its attribute files and the other arguments are the
+          same, see sgraph.loader.modelcache
+        :param cache_max_bytes: size limit of the cache directory, least recently used models
+          are removed beyond it
+        :param concurrent: read the attribute files on worker threads while the model is
+          parsed, which hides most of the attribute file I/O on slow storage. The rows are
+          applied in the same order, so the model is the same.
         :return: the model SGraph object
         """
         elem_attribute_filters = elem_attribute_filters or []
@@ -42,26 +69,81 @@ class ModelLoader:
 
         # TODO What else would good to hide by default, maybe everything dynamic_*?
 
-        if not filepath.endswith('/dependency/modelfile.xml') and not filepath.endswith(
-                '/dependency/modelfile.xml.zip'):
+        with_attributes = filepath.endswith('/dependency/modelfile.xml') or filepath.endswith(
+            '/dependency/modelfile.xml.zip')
+
+        cache = None
+        key = ''
+        if cache_dir is not None:
+            attribute_files = []
+            if with_attributes:
+                attribute_files = [
+                    (attrfile, path, path and file_fingerprint(path))
+                    for attrfile, path in AttributeLoader.attribute_file_paths(
+                        self.__model_root(filepath))
+                ]
+            cache = ModelCache(cache_dir, cache_max_bytes)
+            key = ModelCache.key(os.path.abspath(filepath), file_fingerprint(filepath),
+                                 attribute_files, dep_types, elem_attribute_filters,
+                                 assoc_attribute_filters, include_paths, exclude_paths,
+                                 stub_skipped_targets, intern)
+            model = cache.get(key)
+            if model is not None:
+                if intern:
+                    # The binary format stores each distinct string once, so the strings of
+                    # the model are shared already; the table is for strings added later.
+                    model.get_string_table()
+                return model
+
+        if not with_attributes:
             # Attribute loading not supported in this case.
             model = SGraph.parse_xml_or_zipped_xml(filepath,  dep_types,
                                                    elem_attribute_filters, False,
-                                                   assoc_attribute_filters)
+                                                   assoc_attribute_filters,
+                                                   include_paths=include_paths,
+                                                   exclude_paths=exclude_paths,
+                                                   stub_skipped_targets=stub_skipped_targets,
+                                                   intern=intern)
         else:
             # Using attributes from sibling dirs
-            model = SGraph.parse_xml_or_zipped_xml(
-                os.path.abspath(filepath), type_rules=dep_types,
-                elem_attribute_filters=elem_attribute_filters,
-                assoc_attribute_filters=assoc_attribute_filters)
-            filepath_of_model_root = filepath.replace('/dependency/modelfile.xml.zip', '').replace(
-                '/dependency/modelfile.xml', '')
+            filepath_of_model_root = self.__model_root(filepath)
+            path_filter = None
+            if include_paths or exclude_paths:
+                path_filter = PathFilter(include_paths, exclude_paths)
             a = AttributeLoader()
-            model, _missing_attr_files = a.load_all_files(model, filepath_of_model_root,
-                                                         elem_attribute_filters)
-
+            executor = ThreadPoolExecutor(ATTRIBUTE_READ_WORKERS) if concurrent else None
+            read_files = None
+            try:
+                if executor is not None:
+                    # The attribute files are read while the model is parsed.
+                    read_files = a.read_all_files(filepath_of_model_root,
+                                                  elem_attribute_filters, executor, path_filter)
+                model = SGraph.parse_xml_or_zipped_xml(
+                    os.path.abspath(filepath), type_rules=dep_types,
+                    elem_attribute_filters=elem_attribute_filters,
+                    assoc_attribute_filters=assoc_attribute_filters,
+                    include_paths=include_paths, exclude_paths=exclude_paths,
+                    stub_skipped_targets=stub_skipped_targets, intern=intern)
+                model, _missing_attr_files = a.load_all_files(model, filepath_of_model_root,
+                                                             elem_attribute_filters, path_filter,
+                                                             intern, read_files)
+            finally:
+                if executor is not None:
+                    # Files not read yet are not needed if the model failed to load.
+                    for _attrfile, rows in read_files or []:
+                        if rows is not None:
+                            rows.cancel()
+                    executor.shutdown()
+
+        if cache is not None:
+            cache.put(key, model)
         return model
 
+    @staticmethod
+    def __model_root(filepath: str) -> str:
+        return filepath.replace('/dependency/modelfile.xml.zip', '').replace(
+            '/dependency/modelfile.xml', '')
+
     # noinspection PyMethodMayBeStatic
     def load_attributes(
         self,
@@ -85,8 +167,7 @@ class ModelLoader:
         ignored_attributes = ignored_attributes or []
 
         # TODO What else would good to hide by default, maybe everything dynamic_*?
-        filepath_of_model_root = filepath.replace('/dependency/modelfile.xml.zip', '').replace(
-            '/dependency/modelfile.xml', '')
+        filepath_of_model_root = self.__model_root(filepath)
         a = AttributeLoader()
         model, missing_attr_files = a.load_all_files(model, filepath_of_model_root,
                                                      ignored_attributes)
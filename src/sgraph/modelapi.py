@@ -228,12 +228,14 @@ class ModelApi:
         def create_assoc(x: SElement, other: SElement, is_outgoing: bool, ea: SElementAssociation):
             new_or_existing_referred_elem, this_is_new = sub_graph.create_or_get_element(x)
 
+            # The new association keeps the attrs dict and updates it when associations are
+            # merged, so it gets a copy to keep source_graph unchanged.
             if is_outgoing:
                 SElementAssociation.create_unique_element_association(
-                    other, new_or_existing_referred_elem, ea.deptype, ea.attrs)
+                    other, new_or_existing_referred_elem, ea.deptype, ea.attrs.copy())
             else:
                 SElementAssociation.create_unique_element_association(
-                    new_or_existing_referred_elem, other, ea.deptype, ea.attrs)
+                    new_or_existing_referred_elem, other, ea.deptype, ea.attrs.copy())
 
             return new_or_existing_referred_elem, this_is_new
 
@@ -1,17 +1,22 @@
 from __future__ import annotations
 
 import sys
-from typing import Callable, Optional
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional
 
 from sgraph.exceptions import SElementMergedException
 from sgraph.selementassociation import SElementAssociation
 
+if TYPE_CHECKING:
+    from sgraph.algorithms.selementutils import HierarchyIndex
+    from sgraph.sgraph_utils import PathIndex
+
 DEBUG = False
 
 
 class SElement:
     __slots__ = 'name', 'parent', 'children', 'childrenDict', 'outgoing', 'incoming', 'attrs', \
-        'human_readable_name', '_incoming_index'
+        'human_readable_name', '_incoming_index', '_path_index', '_hierarchy_index', \
+        '_hierarchy_id'
 
     name: str
     parent: Optional["SElement"]
@@ -23,6 +28,12 @@ class SElement:
     human_readable_name: str
     # Index for O(1) duplicate association lookup: (id(fromElement), deptype) -> assoc
     _incoming_index: dict[tuple[int, str], "SElementAssociation"]
+    # sgraph_utils.PathIndex of the model when it is enabled, see SGraph.enable_path_index
+    _path_index: Optional["PathIndex"]
+    # algorithms.selementutils.HierarchyIndex and the id of the element in it, see
+    # SGraph.build_hierarchy_index
+    _hierarchy_index: Optional["HierarchyIndex"]
+    _hierarchy_id: int
 
     def __init__(self, parent: Optional['SElement'], name: str):
         """Create an element and **immediately** attach it under *parent*.
@@ -81,6 +92,13 @@ class SElement:
         self.incoming = []
         self._incoming_index = {}
         self.attrs = {}
+        self._path_index = None
+        self._hierarchy_index = None
+        if parent is not None:
+            if parent._path_index is not None:
+                parent._path_index.add_subtree(self)
+            if parent._hierarchy_index is not None:
+                parent._hierarchy_index.invalidate()
         # self.num = '0'
 
     def __str__(self):
@@ -118,6 +136,8 @@ class SElement:
         if child == self:
             sys.stderr.write('Error with data model loop\n')
             raise Exception('Aborting due to addChild self != child violation')
+        if self._hierarchy_index is not None:
+            self._hierarchy_index.invalidate()
         if child.name not in self.childrenDict:
             self.children.append(child)
             self.childrenDict[child.name] = child
@@ -131,6 +151,8 @@ class SElement:
                 return self.childrenDict[child.name]
 
         child.parent = self
+        if self._path_index is not None:
+            self._path_index.add_subtree(child)
         return None
 
     def addChildIgnoreWithSameName(self, child: "SElement", elemWithSameName: "SElement"):
@@ -145,14 +167,20 @@ class SElement:
         if child == self:
             sys.stderr.write('Error with data model loop\n')
             raise Exception('Aborting due to addChild self != child violation')
+        if self._hierarchy_index is not None:
+            self._hierarchy_index.invalidate()
         if child.name not in self.childrenDict:
             self.children.append(child)
             self.childrenDict[child.name] = child
         else:
             if self.childrenDict[child.name] == elemWithSameName:
+                if elemWithSameName._path_index is not None:
+                    elemWithSameName._path_index.discard_subtree(elemWithSameName)
                 self.children.append(child)
                 self.childrenDict[child.name] = child
                 child.parent = self
+                if self._path_index is not None:
+                    self._path_index.add_subtree(child)
                 return child
             else:
                 if DEBUG:
@@ -164,6 +192,8 @@ class SElement:
                     self.childrenDict[child.name].merge(child)
                     return self.childrenDict[child.name]
         child.parent = self
+        if self._path_index is not None:
+            self._path_index.add_subtree(child)
 
     def addAttribute(self, a: str, v: str | list[str]):
         self.attrs[a] = v
@@ -209,9 +239,74 @@ class SElement:
             self.attrs[a] = attr
 
     def traverseElements(self, visit: Callable[["SElement"], None]):
-        visit(self)
-        for c in self.children:
-            c.traverseElements(visit)
+        for elem in self.iter_preorder():
+            visit(elem)
+
+    def iter_preorder(self, max_depth: int | None = None) -> Iterator["SElement"]:
+        """
+        Yield this element and its descendants in pre-order, without recursion.
+
+        The children of an element are read after the element has been yielded, so the caller
+        may add or remove them during the iteration.
+
+        Args:
+            max_depth: When given, descendants deeper than this many levels below this element
+                are skipped; 0 yields only this element.
+        """
+        if max_depth is None:
+            stack = [self]
+            while stack:
+                elem = stack.pop()
+                yield elem
+                if elem.children:
+                    stack += elem.children[::-1]
+            return
+        depth_stack = [(self, 0)]
+        while depth_stack:
+            elem, depth = depth_stack.pop()
+            yield elem
+            if depth < max_depth and elem.children:
+                depth_stack.extend((c, depth + 1) for c in reversed(elem.children))
+
+    def iter_postorder(self, max_depth: int | None = None) -> Iterator["SElement"]:
+        """Yield this element and its descendants in post-order, each element after its
+        descendants, without recursion. See iter_preorder for max_depth."""
+        stack: list[tuple["SElement", int, bool]] = [(self, 0, False)]
+        while stack:
+            elem, depth, expanded = stack.pop()
+            if expanded or not elem.children or depth == max_depth:
+                yield elem
+            else:
+                stack.append((elem, depth, True))
+                stack.extend((c, depth + 1, False) for c in reversed(elem.children))
+
+    def iter_levels(self, max_depth: int | None = None) -> Iterator[list["SElement"]]:
+        """Yield lists of the elements on each level of this subtree, starting with [self].
+        See iter_preorder for max_depth."""
+        level = [self]
+        depth = 0
+        while level:
+            yield level
+            if depth == max_depth:
+                return
+            next_level: list["SElement"] = []
+            for elem in level:
+                if elem.children:
+                    next_level += elem.children
+            level = next_level
+            depth += 1
+
+    def iter_bfs(self, max_depth: int | None = None) -> Iterator["SElement"]:
+        """Yield this element and its descendants level by level. See iter_preorder for
+        max_depth."""
+        for level in self.iter_levels(max_depth):
+            yield from level
+
+    def iter_of_type(self, t: str, max_depth: int | None = None) -> Iterator["SElement"]:
+        """Yield the elements of type t in this subtree, in pre-order."""
+        for elem in self.iter_preorder(max_depth):
+            if elem.attrs.get('type') == t:
+                yield elem
 
     def traverseIncoming(self, visited: set["SElement"]):
         #? Was this fixed correctly?
@@ -236,6 +331,10 @@ class SElement:
 
     def detachChild(self, elem: "SElement"):
         """Always do this first before addChild"""
+        if self._hierarchy_index is not None:
+            self._hierarchy_index.invalidate()
+        if elem._path_index is not None:
+            elem._path_index.discard_subtree(elem)
         elem.parent = None
         self.children.remove(elem)
         if elem.name in self.childrenDict:
@@ -244,6 +343,25 @@ class SElement:
             sys.stderr.write('Error: Probably duplicated element {} under {}'.format(
                 elem.name, self.getPath()))
 
+    def detach_children(self, elems: Iterable["SElement"]):
+        """Detach many children at once, see detachChild. The children list is rewritten once
+        instead of being searched for each child."""
+        detached = set(elems)
+        if not detached:
+            return
+        if self._hierarchy_index is not None:
+            self._hierarchy_index.invalidate()
+        for elem in detached:
+            if elem._path_index is not None:
+                elem._path_index.discard_subtree(elem)
+            elem.parent = None
+            if elem.name in self.childrenDict:
+                self.childrenDict.pop(elem.name)
+            else:
+                sys.stderr.write('Error: Probably duplicated element {} under {}'.format(
+                    elem.name, self.getPath()))
+        self.children[:] = [c for c in self.children if c not in detached]
+
     def remove(self, leaveParentUntouched: bool = False):
         """
         Remove this element from the tree and detach all associations.
@@ -258,20 +376,27 @@ class SElement:
             if self.parent is not None:
                 self.parent.detachChild(self)
 
-        for association in list(self.outgoing):
-            association.remove()
-
-        self.outgoing.clear()
-
-        for association in list(self.incoming):
-            association.remove()
-
-        self.incoming.clear()
-
-        for c in self.children:
-            c.remove(True)
+        if self._hierarchy_index is not None:
+            self._hierarchy_index.invalidate()
+        if self._path_index is not None:
+            for c in self.children:
+                self._path_index.discard_subtree(c)
+        # Same as c.remove(True) for each child, without recursion, and with the associations
+        # of the whole subtree removed at once.
+        associations = self.outgoing + self.incoming
+        stack = list(self.children)
         self.children.clear()
         self.childrenDict.clear()
+        while stack:
+            elem = stack.pop()
+            associations += elem.outgoing
+            associations += elem.incoming
+            stack.extend(elem.children)
+            elem.children.clear()
+            elem.childrenDict.clear()
+        SElementAssociation.remove_associations(associations)
+        self.outgoing.clear()
+        self.incoming.clear()
 
     def update_children_dict(self):
         self.childrenDict.clear()
@@ -279,36 +404,32 @@ class SElement:
             self.childrenDict[c.name] = c
 
     def getNodeCount(self) -> int:
-        i = 1
-        for x in self.children:
-            i += x.getNodeCount()
-
+        i = 0
+        for level in self.iter_levels():
+            i += len(level)
         return i
 
     def getEACount(self) -> int:
-        i = len(self.outgoing)
-        for x in self.children:
-            i += x.getEACount()
-
+        i = 0
+        for level in self.iter_levels():
+            for x in level:
+                i += len(x.outgoing)
         return i
 
     def getEATypes(self, theSet: set[str]):
-
-        for association in self.outgoing:
-            theSet.add(association.deptype)
-
-        for x in self.children:
-            x.getEATypes(theSet)
+        for level in self.iter_levels():
+            for x in level:
+                for association in x.outgoing:
+                    theSet.add(association.deptype)
 
     def getEATypeCounts(self, d: dict[str, int]):
-        for association in self.outgoing:
-            if association.deptype not in d:
-                d[association.deptype] = 1
-            else:
-                d[association.deptype] += 1
-
-        for x in self.children:
-            x.getEATypeCounts(d)
+        for level in self.iter_levels():
+            for x in level:
+                for association in x.outgoing:
+                    if association.deptype not in d:
+                        d[association.deptype] = 1
+                    else:
+                        d[association.deptype] += 1
 
     def getPath(self) -> str:
         p = self.parent
@@ -360,6 +481,13 @@ class SElement:
         return set(elems)
 
     def getAncestorOfLevel(self, level: int) -> "SElement | None":
+        index = self._hierarchy_index
+        if index is not None and index.valid:
+            i = self._hierarchy_id
+            if level >= index.depths[i]:
+                return self
+            if level >= index.depths[0]:
+                return index.elements[index.ancestor_of_depth(i, level)]
         x = self.getLevel()
         delta = x - level
         ancestor = self
@@ -409,6 +537,10 @@ class SElement:
         return ancestors
 
     def isDescendantOf(self, anc: "SElement"):
+        index = self._hierarchy_index
+        if index is not None and index.valid and anc._hierarchy_index is index:
+            ancestor = anc._hierarchy_id
+            return ancestor < self._hierarchy_id < index.ends[ancestor]
         if self == anc:
             return False
         p = self.parent
@@ -606,8 +738,9 @@ class SElement:
         :return:
         """
         # print('Merge', other.getPath())
-        for c in list(other.children):
-            other.detachChild(c)
+        moved = list(other.children)
+        other.detach_children(moved)
+        for c in moved:
             # TODO Have some logic here to do merge correctly if overlapping children exists?
             self.addChild(c)
 
@@ -627,8 +760,7 @@ class SElement:
                                             association.attrs)
                 newEa.initElems()
 
-        for association in list(other.outgoing):
-            association.remove()
+        SElementAssociation.remove_associations(other.outgoing)
 
         current_deps = {}
         for association in self.incoming:
@@ -644,8 +776,7 @@ class SElement:
                                             association.attrs)
                 newEa.initElems()
 
-        for association in list(other.incoming):
-            association.remove()
+        SElementAssociation.remove_associations(other.incoming)
 
         for k, v in other.attrs.items():
             if not ignore_attrs and k != 'type':
@@ -734,34 +865,38 @@ class SElement:
         return False
 
     def removeDescendantsIf(self, checker: Callable[["SElement"], bool]):
-        for child in list(self.children):
-            if checker(child):
-                child.remove()
-        for child in self.children:
-            child.removeDescendantsIf(checker)
+        # The children of an element are checked before the kept ones are descended into.
+        for elem in self.iter_preorder():
+            removed = [child for child in elem.children if checker(child)]
+            if removed:
+                elem.detach_children(removed)
+                for child in removed:
+                    child.remove(True)
 
     def getDescendants(self, descendants_list: list["SElement"]):
-        for child in self.children:
-            descendants_list.append(child)
-            child.getDescendants(descendants_list)
+        descendants = self.iter_preorder()
+        next(descendants)
+        descendants_list.extend(descendants)
 
     def getMaxDepth(self, cur_depth: int) -> int:
-        if not self.children:
-            return cur_depth
-        depth = 0
-        for e in self.children:
-            depth = max(e.getMaxDepth(cur_depth + 1), depth)
-        if depth == 0:
-            return cur_depth
-        return depth
+        height = -1
+        for _ in self.iter_levels():
+            height += 1
+        if cur_depth + height > 0:
+            return cur_depth + height
+        return cur_depth
 
     def clean_duplicate_associations(self):
         """
         Detect duplicate outgoing associations in this subtree.
 
-        Computes a hash per association to identify duplicates and recurses into children.
+        Computes a hash per association to identify duplicates, element by element.
         Removal is disabled by default; see the commented block for debugging-oriented cleanup.
         """
+        for elem in self.iter_preorder():
+            elem.__clean_duplicate_outgoing()
+
+    def __clean_duplicate_outgoing(self):
         if self.outgoing:
             ea_hashes: set[int] = set()
             dupes: list[SElementAssociation] = []
@@ -783,9 +918,6 @@ class SElement:
                 print('\n\n')
             """
 
-        for child in self.children:
-            child.clean_duplicate_associations()
-
     def elem_location_matches(self, elem: "SElement") -> bool:
         if self.parent and elem.parent:
             if self.parent.name == elem.parent.name:
@@ -836,36 +968,48 @@ class SElement:
         if self.parent is None:
             self.name = new_name
             return
+        path_index = self._path_index
+        if path_index is not None:
+            path_index.discard_subtree(self)
         self.parent.childrenDict.pop(self.name, None)
         self.name = new_name
         self.parent.childrenDict[new_name] = self
+        if path_index is not None:
+            path_index.add_subtree(self)
 
 
 class ElementIterator:
+    """Pre-order iterator that starts after elem and continues past its subtree to the rest of
+    the model. __next__ returns None at the end."""
     current: SElement
 
     def __init__(self, elem: SElement):
         self.current = elem
+        # Children lists of the ancestors of current and the index of the next sibling in each.
+        self.__pending: list[list] = []
+        e = elem
+        while e.parent is not None:
+            siblings = e.parent.children
+            self.__pending.append([siblings, siblings.index(e) + 1])
+            e = e.parent
+        self.__pending.reverse()
 
     def hasNext(self):
         if len(self.current.children) > 0:
             return True
-        else:
-            if self.current.hasSiblingsRecursive():
-                return True
-        return False
+        return any(i < len(siblings) for siblings, i in self.__pending)
 
     def __next__(self):
+        pending = self.__pending
         if len(self.current.children) > 0:
+            pending.append([self.current.children, 1])
             self.current = self.current.children[0]
             return self.current
-        else:
-            if self.current.parent is not None:
-                e = self.current.getNextSiblingRecursive()
-                if e is not None:
-                    self.current = e
-                    return e
-                else:
-                    return None
-            else:
-                return None
+        while pending:
+            siblings, i = pending[-1]
+            if i < len(siblings):
+                pending[-1][1] = i + 1
+                self.current = siblings[i]
+                return self.current
+            pending.pop()
+        return None
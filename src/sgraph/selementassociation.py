@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import sys
+from collections.abc import Iterable
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -89,10 +91,11 @@ class SElementAssociation:
         Args:
             fr: Source / from-element.
             to: Target / to-element.
-            deptype: Dependency kind (e.g. ``'call'``, ``'import'``).
+            deptype: Dependency kind (e.g. ``'call'``, ``'import'``).  Interned, so
+                that associations share one string object per deptype.
             depattrs: Optional metadata dict.  ``None`` becomes ``{}``.
         """
-        self.deptype = deptype
+        self.deptype = sys.intern(deptype) if type(deptype) is str else deptype
 
         # Good to have this decommented when testing new analyzers:
         # if fr is not None and fr == to:
@@ -160,6 +163,31 @@ class SElementAssociation:
         key = (id(self.fromElement), self.deptype)
         self.toElement._incoming_index.pop(key, None)
 
+    @staticmethod
+    def remove_associations(associations: Iterable["SElementAssociation"]):
+        """Remove many associations at once.
+
+        Calling :meth:`remove` for each association searches the ``outgoing`` and ``incoming``
+        lists one association at a time, which is quadratic when many associations of one
+        element are removed. This rewrites each affected list once, keeping the order of the
+        remaining associations. Associations that are not registered are ignored.
+        """
+        removed = set(associations)
+        if not removed:
+            return
+        sources: dict[int, SElement] = {}
+        targets: dict[int, SElement] = {}
+        for association in removed:
+            sources[id(association.fromElement)] = association.fromElement
+            targets[id(association.toElement)] = association.toElement
+            # Maintain index for O(1) duplicate lookup
+            key = (id(association.fromElement), association.deptype)
+            association.toElement._incoming_index.pop(key, None)
+        for elem in sources.values():
+            elem.outgoing[:] = [x for x in elem.outgoing if x not in removed]
+        for elem in targets.values():
+            elem.incoming[:] = [x for x in elem.incoming if x not in removed]
+
     def addAttribute(self, attr_name: str, attr_val: str | int | list[str]):
         self.attrs[attr_name] = attr_val
 
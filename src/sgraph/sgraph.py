@@ -12,22 +12,88 @@ Example how to use this to parse and handle model files with this tool.
 from __future__ import annotations
 
 import codecs
-from collections.abc import Sequence
+from collections.abc import Iterable
 import io
+import multiprocessing
 import os
 import re
 import sys
 import uuid
+import xml.parsers.expat
 import xml.sax.handler
 import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy, deepcopy
-from typing import Callable, Optional, TextIO
+from itertools import repeat
+from operator import attrgetter
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterator, Optional, TextIO
 from xml.sax import parseString
 from xml.sax.xmlreader import AttributesImpl
 
+from .algorithms.selementutils import HierarchyIndex
 from .selement import SElement
 from .selementassociation import SElementAssociation
-from .sgraph_utils import ParsingIntentionallyAborted, add_ea, find_assocs_between
+from .sgraph_utils import (ElementPathCache, ParsingIntentionallyAborted, PathFilter, PathIndex,
+                           StringTable, add_ea, find_assocs_between, gc_paused)
+
+if TYPE_CHECKING:
+    from .sgraph_snapshot import SGraphSnapshot
+
+# Selectable XML parser backends for SGraph.parse_xml_* functions. All of them drive the same
+# content handler, so they produce identical models; expat and lxml skip the xml.sax layer.
+XML_PARSER_BACKENDS = ('sax', 'expat', 'lxml')
+
+_XML_READ_CHUNK_SIZE = 1024 * 1024
+# to_xml writes its output in blocks of this many strings.
+_XML_WRITE_BUFFER_PARTS = 16384
+
+_name_of = attrgetter('name')
+
+# Parallel parsing splits the model at top-level element boundaries found with these, without
+# parsing the XML. Attribute values may contain '>' but not '"' or '<'.
+_XML_ELEMENTS_START_RE = re.compile(rb'<elements\b[^>]*>')
+_XML_E_TAG_RE = re.compile(rb'<e(?=[\s/>])[^>"]*(?:"[^"]*"[^>"]*)*>|</e\s*>')
+# Top-level subtrees are grouped to this many batches per worker for load balancing.
+_PARALLEL_BATCHES_PER_WORKER = 4
+
+# Parallel writers fork their worker processes, so that the workers inherit the model instead of
+# receiving it pickled. The shared state is kept here while the workers are running.
+_FORK_AVAILABLE = 'fork' in multiprocessing.get_all_start_methods()
+_forked_state: tuple | None = None
+
+
+def _preorder(elements: Iterable[SElement]) -> Iterator[SElement]:
+    """Yield the elements and their descendants in pre-order."""
+    stack = list(elements)
+    stack.reverse()
+    while stack:
+        elem = stack.pop()
+        yield elem
+        stack.extend(reversed(elem.children))
+
+
+def _map_forked(func: Callable, items: list, workers: int, state: tuple) -> Iterator:
+    """Yield func(item) for the items in order, computed in forked worker processes that see
+    state in _forked_state."""
+    global _forked_state
+    _forked_state = state
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(items)),
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            yield from executor.map(func, items)
+    finally:
+        _forked_state = None
+
+
+class _Utf8Reader:
+    """Binary file-like view of a text stream, for parsers that only accept bytes."""
+
+    def __init__(self, text_stream: TextIO | io.TextIOWrapper):
+        self.text_stream = text_stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self.text_stream.read(size).encode('utf-8')
 
 
 def _bounded_descendant_count(root: SElement, limit: int) -> tuple[int, bool]:
@@ -55,6 +121,8 @@ class SGraph:
     metaAttrs: dict[str, dict[str, str]]
     propagateActions: list[tuple[str, str]]
     totalModel: "SGraph | None"
+    # Strings of the model interned with intern=True, see get_string_table
+    stringTable: StringTable | None
 
     def __init__(self, root_node: SElement | None = None):
         self.rootNode = root_node if root_node is not None else SElement(None, '')
@@ -62,6 +130,8 @@ class SGraph:
         self.metaAttrs = {}
         self.propagateActions = []
         self.totalModel = None
+        self.usePathIndex = False
+        self.stringTable = None
 
     # repr() can be triggered by debuggers, exception formatters and any
     # logger.debug('%r', graph) call. A full O(N) tree walk on multi-million
@@ -96,10 +166,47 @@ class SGraph:
     def addPropagateAction(self, a: str, v: str):
         self.propagateActions.append((a, v))
 
+    def get_string_table(self) -> StringTable:
+        """Return the string table of the model, which is created on first use. Parsing and
+        attribute loading with intern=True share names and attribute strings through it."""
+        if self.stringTable is None:
+            self.stringTable = StringTable()
+        return self.stringTable
+
+    def enable_path_index(self, enabled: bool = True):
+        """
+        Enable or disable the path to element index, which makes findElementFromPath and
+        createOrGetElementFromPath a single dict lookup for existing elements. The index is
+        built on the next lookup and kept current by the SElement methods that create, add,
+        detach, remove and rename elements. Disabling it detaches it from the elements.
+        """
+        self.usePathIndex = enabled
+        if not enabled and self.rootNode._path_index is not None:
+            self.rootNode._path_index.close()
+
+    def __get_path_index(self) -> PathIndex | None:
+        index = self.rootNode._path_index
+        if index is None:
+            if not self.usePathIndex or self.rootNode.parent is not None:
+                return None
+            index = PathIndex(self.rootNode)
+        elif index.root is not self.rootNode:
+            # The root of this model is inside a larger indexed model.
+            return None
+        return index
+
     def createOrGetElementFromPath(self, path: str):
         """
         Create or get existing element based on element path.
         """
+        if self.usePathIndex:
+            index = self.__get_path_index()
+            if index is not None:
+                key = PathIndex.key(path)
+                if key is not None:
+                    elem = index.elements.get(key)
+                    if elem is not None:
+                        return elem
         if path.startswith('/'):
             path = path[1:]
         if '/' not in path:
@@ -113,10 +220,73 @@ class SGraph:
             return e
         return self.rootNode
 
+    def bulk_load(
+        self,
+        elements: Iterable[str | tuple],
+        associations: Iterable[tuple] = ()
+    ) -> list[SElement]:
+        """
+        Add many elements and associations to the model at once.
+
+        Each element row is one of
+            'path' or ('path', attrs): created or got like createOrGetElementFromPath,
+            (parent, 'name') or (parent, 'name', attrs): created or got under the element of
+                row number parent, or under the root node when parent is -1.
+        The attrs are added to the element attributes. Each association row is (from, to,
+        deptype) or (from, to, deptype, attrs), where from and to are element row numbers. The
+        associations are deduplicated like create_unique_element_association: a repeated
+        (from, to, deptype) adds its attrs to the existing association.
+
+        Resolved paths are cached and garbage collection is paused during the load, which makes
+        this considerably faster than adding the same elements and associations one by one.
+
+        :return: the elements of the element rows, in the same order.
+        """
+        loaded: list[SElement] = []
+        root = self.rootNode
+        path_cache = ElementPathCache(self)
+        with gc_paused():
+            for row in elements:
+                if type(row) is str:
+                    elem = path_cache.get_or_create(row)
+                    attrs = None
+                elif type(row[0]) is str:
+                    elem = path_cache.get_or_create(row[0])
+                    attrs = row[1] if len(row) > 1 else None
+                else:
+                    parent = loaded[row[0]] if row[0] >= 0 else root
+                    name = row[1]
+                    if '/' in name:
+                        name = name.replace('/', '__slash__')
+                    elem = parent.childrenDict.get(name)  # type: ignore
+                    if elem is None:
+                        elem = SElement(parent, name)
+                    attrs = row[2] if len(row) > 2 else None
+                if attrs:
+                    elem.attrs.update(attrs)
+                loaded.append(elem)
+
+            for row in associations:
+                from_elem = loaded[row[0]]
+                to_elem = loaded[row[1]]
+                depattrs = row[3] if len(row) > 3 and row[3] is not None else {}
+                existing = to_elem._incoming_index.get((id(from_elem), row[2]))
+                if existing is not None:
+                    existing.attrs.update(depattrs)
+                else:
+                    SElementAssociation(from_elem, to_elem, row[2], depattrs).initElems()
+        return loaded
+
     def findElementFromPath(self, path: str):
         """
         Get an element from the model by path (str)
         """
+        if self.usePathIndex:
+            index = self.__get_path_index()
+            if index is not None:
+                key = PathIndex.key(path)
+                if key is not None:
+                    return index.elements.get(key)
         if path.startswith('/'):
             path = path[1:]
         if '/' not in path:
@@ -132,13 +302,48 @@ class SGraph:
         self.modelAttrs = m
 
     def save(self, fn: str):
-        if fn.endswith('.xml'):
+        if fn.endswith('.xml') or fn.endswith('.xml.zip'):
             self.to_xml(fn)
+        elif fn.endswith('.sgb'):
+            from .sgraph_binary import save_binary
+            save_binary(self, fn)
         elif fn.endswith('.plantuml') or fn.endswith('.pu'):
             self.to_plantuml(fn)
         else:
             self.to_deps(fn)
 
+    @staticmethod
+    def load(fn: str) -> "SGraph":
+        """
+        Load a model saved with save(), selecting the format by file extension: .sgb for the
+        binary format, .xml or .xml.zip for XML and deps format otherwise.
+        """
+        if fn.endswith('.sgb'):
+            from .sgraph_binary import load_binary
+            return load_binary(fn)
+        elif fn.endswith('.xml') or fn.endswith('.xml.zip'):
+            return SGraph.parse_xml_or_zipped_xml(fn)
+        return SGraph.parse_deps(fn)
+
+    def build_hierarchy_index(self) -> HierarchyIndex:
+        """
+        Index the hierarchy of the model for constant-time isDescendantOf and faster
+        getAncestorOfLevel and lowest_common_ancestor, see HierarchyIndex. The index is used
+        until elements are created, added, detached or removed in the model, or until it is
+        invalidated with its invalidate().
+        """
+        if self.rootNode._hierarchy_index is not None:
+            self.rootNode._hierarchy_index.invalidate()
+        return HierarchyIndex(self.rootNode)
+
+    def freeze(self) -> SGraphSnapshot:
+        """
+        Return a read-only, array-backed snapshot of the model for analyses, see
+        sgraph_snapshot. The snapshot does not follow later changes to the model.
+        """
+        from .sgraph_snapshot import SGraphSnapshot
+        return SGraphSnapshot(self)
+
     def verify(self, i: int):
         elems: set[SElement] = set()
         for e in self.rootNode.children:
@@ -156,58 +361,174 @@ class SGraph:
         for e in self.rootNode.children:
             traverser(e)
 
+    def iter_elements(self, order: str = 'preorder', max_depth: int | None = None,
+                      element_type: str | None = None) -> Iterator[SElement]:
+        """
+        Yield the elements of the model, without the root node, without recursion.
+
+        Args:
+            order: 'preorder', 'postorder' or 'bfs', see SElement.iter_preorder etc.
+            max_depth: When given, only elements up to this level are yielded, 1 being the
+                top-level elements.
+            element_type: When given, only elements of this type are yielded.
+        """
+        walks = {
+            'preorder': SElement.iter_preorder,
+            'postorder': SElement.iter_postorder,
+            'bfs': SElement.iter_bfs
+        }
+        if order not in walks:
+            raise ValueError(f'Unknown order {order}, expected one of {", ".join(walks)}')
+        root = self.rootNode
+        for elem in walks[order](root, max_depth):
+            if elem is not root and (element_type is None
+                                     or elem.attrs.get('type') == element_type):
+                yield elem
+
     # C0 control characters that XML 1.0 forbids in any content (see
     # https://www.w3.org/TR/xml/#charsets). TAB (0x09), LF (0x0A) and CR (0x0D)
     # are allowed and handled explicitly during escaping.
     _XML_INVALID_CONTROL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    # Characters that are removed or escaped in attribute values.
+    _XML_ESCAPED_CHARS_RE = re.compile('[\x00-\x1f&<>"]')
+
+    def to_xml(self, fname: str | None, stdout: bool = True,
+               workers: int | None = None) -> str | None:
+        """
+        Write the model in XML format to fname, zipped if fname ends with .zip, e.g.
+        modelfile.xml.zip. If fname is None, the model is written to stdout, or returned as
+        a string when stdout is False.
 
-    def to_xml(self, fname: str | None, stdout: bool = True) -> str | None:
+        If workers is greater than 1, the top-level subtrees are rendered in this many forked
+        worker processes. The output is identical to the serial one.
+        """
         rootNode = self.rootNode
         counter = Counter()
         elem_to_num: dict[SElement, str] = {}
-        num_to_elem: dict[str, SElement] = {}
-
-        # class RecLevel():
-        #    def __init__(self):
-
-        def add_number(n: SElement, the_counter: Counter):
-            if len(n.incoming) > 0:
-                if n not in elem_to_num:
-                    num = str(the_counter.now())
-
-                    elem_to_num[n] = num
-                    num_to_elem[num] = n
-
-            for child in n.children:
-                add_number(child, the_counter)
-
-            toElems = set([x.toElement for x in n.outgoing])
-
-            for o in toElems:
-                if o not in elem_to_num:
-                    num = str(counter.now())
-                    elem_to_num[o] = num
-                    num_to_elem[num] = o
-
-        add_number(rootNode, counter)
 
+        # Number the referred elements: elements with incoming associations in pre-order, and
+        # targets of outgoing associations after the children of the source have been handled.
+        number_stack: list[tuple[SElement, bool]] = [(rootNode, False)]
+        while number_stack:
+            n, children_handled = number_stack.pop()
+            if children_handled:
+                toElems = set([x.toElement for x in n.outgoing])
+                for o in toElems:
+                    if o not in elem_to_num:
+                        elem_to_num[o] = str(counter.now())
+                continue
+            if n.incoming and n not in elem_to_num:
+                elem_to_num[n] = str(counter.now())
+            if n.outgoing:
+                number_stack.append((n, True))
+            for child in reversed(n.children):
+                number_stack.append((child, False))
+
+        zfile = None
+        f: io.StringIO | TextIO | BinaryIO
         if fname is not None:
-            f = codecs.open(fname, 'w', encoding='utf-8')
+            if fname.endswith('.zip'):
+                zfile = zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED)
+                f = zfile.open(os.path.basename(fname)[:-len('.zip')], 'w')
+            else:
+                f = open(fname, 'wb')
         elif stdout:
             f = sys.stdout
         else:
             f = io.StringIO()
+        binary = fname is not None
+
+        # Output is collected to a list of strings and written in large blocks.
+        out: list[str] = []
+
+        def flush():
+            data = ''.join(out)
+            out.clear()
+            f.write(data.encode('utf-8') if binary else data)  # type: ignore
+
+        out.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+                   '<model version="2.1">\n  <elements>\n')
+        batches = self.__top_level_batches(workers)
+        if batches:
+            for part in _map_forked(SGraph._render_xml_batch, batches, workers,  # type: ignore
+                                    (self, elem_to_num, binary)):
+                out.append(part)
+                flush()
+        else:
+            SGraph.__write_xml_elements(rootNode.children, elem_to_num, binary, out, flush)
+        out.append('\n</elements>\n</model>\n')
+        flush()
+        f.flush()
+        if fname is not None:
+            f.close()
+            if zfile is not None:
+                zfile.close()
+            return None
+        elif stdout:
+            return None
+        else:
+            # We can ignore the type because out of the possible types only TextIO doesn't have
+            # getvalue and it is handled above by checking if stdout is True
+            return f.getvalue()  # type: ignore
+
+    def __top_level_batches(self, workers: int | None) -> list[tuple[int, int]]:
+        """Group the top-level elements to index ranges of about equal element counts, for
+        rendering them in worker processes. Returns an empty list if there is nothing to
+        parallelize."""
+        top_level = self.rootNode.children
+        if workers is None or workers < 2 or len(top_level) < 2 or not _FORK_AVAILABLE:
+            return []
+        sizes: list[int] = []
+        for elem in top_level:
+            size = 0
+            stack = [elem]
+            while stack:
+                size += 1
+                stack.extend(stack.pop().children)
+            sizes.append(size)
+        batch_size = sum(sizes) // (workers * _PARALLEL_BATCHES_PER_WORKER) + 1
+        batches: list[tuple[int, int]] = []
+        begin = 0
+        batch_elements = 0
+        for i, size in enumerate(sizes):
+            batch_elements += size
+            if batch_elements >= batch_size:
+                batches.append((begin, i + 1))
+                begin = i + 1
+                batch_elements = 0
+        if begin < len(sizes):
+            batches.append((begin, len(sizes)))
+        return batches if len(batches) > 1 else []
 
-        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
-                '<model version="2.1">\n  <elements>\n')
+    @staticmethod
+    def _render_xml_batch(batch: tuple[int, int]) -> str:
+        """Render a range of top-level elements of the model shared by to_xml with the worker
+        processes."""
+        graph, elem_to_num, binary = _forked_state  # type: ignore
+        out: list[str] = []
+        SGraph.__write_xml_elements(graph.rootNode.children[batch[0]:batch[1]], elem_to_num,
+                                    binary, out, None)
+        return ''.join(out)
+
+    @staticmethod
+    def __write_xml_elements(elements: list[SElement], elem_to_num: dict[SElement, str],
+                             binary: bool, out: list[str], flush: Callable[[], None] | None):
+        """Append the XML of the given top-level elements and their descendants to out,
+        calling flush when out grows large. If the output is going to be UTF-8 encoded, the
+        parts that may contain unencodable characters are checked as they are produced, in
+        order to skip just the offending element."""
 
         def enc_xml_a_n(n: str) -> str:
             if n[0].isdigit():
                 return "_" + n
             return n
 
+        escaped_chars_search = SGraph._XML_ESCAPED_CHARS_RE.search
+
         def enc_xml_a_v(v: int | float | set[str] | dict[object, object] | list[str] | str) -> str:
-            if isinstance(v, int) or isinstance(v, float):
+            if type(v) is str:
+                pass
+            elif isinstance(v, int) or isinstance(v, float):
                 v = str(v)
             elif isinstance(v, set):
                 v = ';'.join(sorted(map(lambda x: str(x), v)))
@@ -220,38 +541,45 @@ class SGraph:
             else:
                 v = str(v)
             if v:
+                if v.isascii() and not escaped_chars_search(v):
+                    return v
                 # https://www.w3.org/TR/xml/#NT-AttValue
                 # Forbidden chars are: naked ampersand, left angle bracket, double quote
                 # single quote is fine as we are using double quotes in XML for attributes
-                v = v.encode('utf-8', 'replace').decode()
+                if not v.isascii():
+                    v = v.encode('utf-8', 'replace').decode()
                 v = SGraph._XML_INVALID_CONTROL_RE.sub('', v)
                 return v.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace(
                     '\n', '&' + '#' + '10;').replace('"', '&quot;')
             return ''
 
-        def dump_node(c: SElement, elem_to_num: dict[SElement, str], reclevel: int, fail_if_nonstr_data: bool = False):
-            sorted_attrs = sorted(
-                filter(lambda x: not x[0].startswith('_tmp_attr_'), c.attrs.items()))
-            # noinspection PyUnusedLocal
-            current_indent = '  '.join(['' for _unused in range(0, reclevel)])
-            try:
-                nattrs = ' '.join([
-                    enc_xml_a_n(x[0]) + '="' + enc_xml_a_v(x[1]) + '"' for x in sorted_attrs
-                    if x[0] != 'type'
-                ])
-            except TypeError as te:
-                msg = f'Failed to encode attribute value to string: {te} {c.getPath()} {sorted_attrs}'
-                if fail_if_nonstr_data:
-                    raise Exception(msg)
-                else:
-                    sys.stderr.write(msg + '\n')
-                    nattrs = ''
+        def dump_node(c: SElement, reclevel: int, fail_if_nonstr_data: bool = False) -> bool:
+            """Write the start tag and the associations of the element. Returns False if the
+            element was written without its contents."""
+            attrs = c.attrs
+            current_indent = indents[reclevel]
+            nattrs = ''
+            if len(attrs) > ('type' in attrs):
+                sorted_attrs = sorted(
+                    [x for x in attrs.items() if not x[0].startswith('_tmp_attr_')])
+                try:
+                    nattrs = ' '.join([
+                        enc_xml_a_n(x[0]) + '="' + enc_xml_a_v(x[1]) + '"' for x in sorted_attrs
+                        if x[0] != 'type'
+                    ])
+                except TypeError as te:
+                    msg = f'Failed to encode attribute value to string: {te} {c.getPath()} {sorted_attrs}'
+                    if fail_if_nonstr_data:
+                        raise Exception(msg)
+                    else:
+                        sys.stderr.write(msg + '\n')
 
             if c.incoming and c not in elem_to_num:
                 sys.stderr.write('Error, Producing erroneous model with references to ' +
                                  c.getPath() + '\n')
-            if c.getType() != '':
-                nattrs = ' t="' + c.getType() + '"\n' + current_indent + '  ' + nattrs
+            elem_type = c.getType()
+            if elem_type != '':
+                nattrs = ' t="' + elem_type + '"\n' + current_indent + '  ' + nattrs
             else:
                 if nattrs != '':
                     nattrs = '\n' + current_indent + '  ' + nattrs
@@ -259,49 +587,63 @@ class SGraph:
             x = ''
             if c in elem_to_num:
                 x = ' i="' + elem_to_num[c] + '" '
-            f.write(current_indent)
+            out.append(current_indent)
             written_elem_tag = False
             written_attrs = False
             try:
-                f.write('<e ' + x + ' n="' + enc_xml_a_v(c.name) + '" ')
+                elem_tag = '<e ' + x + ' n="' + enc_xml_a_v(c.name) + '" '
+                if binary and not elem_tag.isascii():
+                    elem_tag.encode('utf-8')
+                out.append(elem_tag)
                 written_elem_tag = True
-                f.write(nattrs)
+                if binary and not nattrs.isascii():
+                    nattrs.encode('utf-8')
+                out.append(nattrs)
                 written_attrs = True
-                f.write('>\n')
-                groups = SGraph.groupea(c.outgoing)
+                out.append('>\n')
+                if not c.outgoing:
+                    return True
+                outgoing = c.outgoing
+                if len(outgoing) == 1:
+                    groups = [(outgoing, outgoing[0].deptype, outgoing[0].attrs)]
+                else:
+                    groups = SGraph.groupea(outgoing)
                 for ealist, deptype, ea_attrs in groups:
-                    elem_numbers: list[str] = []
-                    for association in ealist:
-                        if association.toElement in elem_to_num:
-                            elem_numbers.append(elem_to_num[association.toElement])
-                        else:
-                            sys.stderr.write(f'No numeric id for '
-                                             f'{association.toElement.getPath()} dep '
-                                             f'from {association.fromElement.name}\n')
-                    idrefs = ','.join(sorted(set(elem_numbers)))
+                    elem_numbers = [elem_to_num.get(a.toElement) for a in ealist]
+                    if None in elem_numbers:
+                        for association in ealist:
+                            if association.toElement not in elem_to_num:
+                                sys.stderr.write(f'No numeric id for '
+                                                 f'{association.toElement.getPath()} dep '
+                                                 f'from {association.fromElement.name}\n')
+                        elem_numbers = [num for num in elem_numbers if num is not None]
+                    if len(elem_numbers) == 1:
+                        idrefs = elem_numbers[0]
+                    else:
+                        idrefs = ','.join(sorted(set(elem_numbers)))  # type: ignore
                     if idrefs:
-                        # idrefs = ','.join(map(lambda x: str(x.toElement.num), g))
-                        sorted_attrs = sorted(ea_attrs.items())
-                        try:
-                            ea_attrs_str = ' '.join([
-                                enc_xml_a_n(x[0]) + '="' + enc_xml_a_v(x[1]) + '"' for x in sorted_attrs
-                            ])
-                        except TypeError as te:
-                            msg = f'Failed to encode assoc attribute value to string: {deptype} {te} {c.getPath()} {sorted_attrs}'
-                            if fail_if_nonstr_data:
-                                raise Exception(msg)
-                            else:
-                                sys.stderr.write(msg + '\n')
-                                ea_attrs_str = ''
-
-                        f.write('  <r r="' + idrefs + '" t="' + deptype + '" ' + ea_attrs_str +
-                                '/>\n')
-
-                for cc in sorted(c.children, key=lambda x: x.name):
-                    dump_node(cc, elem_to_num, reclevel + 1)
-
-                f.write(current_indent)
-                f.write('</e>\n')
+                        ea_attrs_str = ''
+                        if ea_attrs:
+                            sorted_attrs = sorted(ea_attrs.items())
+                            try:
+                                ea_attrs_str = ' '.join([
+                                    enc_xml_a_n(x[0]) + '="' + enc_xml_a_v(x[1]) + '"'
+                                    for x in sorted_attrs
+                                ])
+                            except TypeError as te:
+                                msg = f'Failed to encode assoc attribute value to string: {deptype} {te} {c.getPath()} {sorted_attrs}'
+                                if fail_if_nonstr_data:
+                                    raise Exception(msg)
+                                else:
+                                    sys.stderr.write(msg + '\n')
+                                    ea_attrs_str = ''
+
+                        line = '  <r r="' + idrefs + '" t="' + deptype + '" ' + ea_attrs_str + \
+                            '/>\n'
+                        if binary and not line.isascii():
+                            line.encode('utf-8')
+                        out.append(line)
+                return True
 
             except UnicodeEncodeError:
                 if not written_elem_tag:
@@ -309,117 +651,63 @@ class SGraph:
                         f'UnicodeEncodeError when writing elem name for some child of '
                         f'{c.parent.getPath() if c.parent else "unknown"}, skipping element\n')
                     variable_part = str(uuid.uuid4())[:8]
-                    f.write(f'<e {x} n="MALFORMED_NAME__{variable_part}"/>\n')
+                    out.append(f'<e {x} n="MALFORMED_NAME__{variable_part}"/>\n')
                 elif not written_attrs:
                     sys.stderr.write(
                         f'UnicodeEncodeError when writing attributes of '
                         f'{c.parent.getPath() if c.parent else "unknown"}, skipping attributes and contents\n'
                     )
-                    f.write(' />\n')
+                    out.append(' />\n')
                 else:
                     raise Exception(
                         f'UnicodeEncodeError with {c.parent.getPath() if c.parent else "unknown"}, had to abort.'
                     )
+                return False
 
-        for c in rootNode.children:
-            dump_node(c, elem_to_num, 2)
-        f.write('\n</elements>\n</model>\n')
-        f.flush()
-        if fname is not None:
-            f.close()
-            return None
-        elif stdout:
-            return None
-        else:
-            # We can ignore the type because out of the possible types only TextIO doesn't have
-            # getvalue and it is handled above by checking if stdout is True
-            return f.getvalue()  # type: ignore
+        # Iterative pre-order traversal, so that deep models do not hit the recursion limit.
+        # Strings in the stack are end tags, written after the children of the element.
+        indents = ['', '']
+        stack: list[tuple[SElement, int] | str] = [(c, 2) for c in reversed(elements)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                out.append(item)
+                continue
+            c, reclevel = item
+            while len(indents) <= reclevel + 1:
+                indents.append(indents[-1] + '  ')
+            if dump_node(c, reclevel):
+                stack.append(indents[reclevel] + '</e>\n')
+                if c.children:
+                    for cc in reversed(sorted(c.children, key=_name_of)):
+                        stack.append((cc, reclevel + 1))
+            if flush is not None and len(out) >= _XML_WRITE_BUFFER_PARTS:
+                flush()
+
+    def to_deps(self, fname: str | None, workers: int | None = None):
+        """
+        Write the model in deps format to fname, or to stdout if fname is None.
 
-    def to_deps(self, fname: str | None):
+        If workers is greater than 1, the lines of the top-level subtrees are produced in this
+        many forked worker processes. The output is identical to the serial one.
+        """
         if fname is not None:
             f = open(fname, 'w', encoding='utf-8')
         else:
             f = sys.stdout
-        withDependencies = True
-        withDepDetails = True
-        withAttributes = True
-        printedNodes: dict[SElement, int] = {}
-
-        autogeneratedAttributeNames = ['user_count', 'used_count', 'coupling', 'childcount']
-
-        def encodeForDeps(s: str | int | list[str]):
-            if isinstance(s, str):
-                return s.replace('\r\n', '<NEWLINE>').replace('\r', '<NEWLINE>').replace(
-                    '\n', '<NEWLINE>')
-            return str(s)
-
-        if withAttributes:
 
-            def handleElem(x: SElement):
-                if self.totalModel is not None and self.totalModel != self:
-                    tme = self.totalModel.getElement(x)
-                    if tme is not None:
-                        x = tme
-                m = x.attrs
-                p = None
-
-                sorted_attrs = sorted(list(m.items()))
-
-                did_something = False
-                for attrname, attrval in sorted_attrs:
-                    if attrname == 'type':
-                        continue
-                    if attrname in autogeneratedAttributeNames:
-                        continue
-                    if p is None:
-                        p = x.getPath()
-                    f.write('@' + p + ':' + attrname + ':' + encodeForDeps(attrval) + '\n')
-                    did_something = True
-                if did_something:
-                    printedNodes[x] = 1
-                if x.getType() != '':
-                    if p is None:
-                        p = x.getPath()
-                    if len(p) > 1:
-                        f.write('@' + p + ':type:' + encodeForDeps(x.getType()) + '\n')
-                    printedNodes[x] = 1
-
-            self.rootNode.traverseElements(handleElem)
-
-        if withDependencies:
-
-            def handleDeps(elem: SElement):
-                for x in elem.outgoing:
-                    from_ = x.getFromPath()
-                    to = x.getToPath()
-                    f.write(from_)
-                    printedNodes[x.fromElement] = 1
-                    f.write(':' + to)
-                    printedNodes[x.toElement] = 1
-
-                    if withDepDetails:
-                        t = x.getType()
-                        if t != '':
-                            f.write(':' + t + '\n')
-                        else:
-                            f.write(':\n')
-                        m = x.getAttributes()
-
-                        for depattr, depattrval in list(m.items()):
-                            if not depattr == 'type':
-                                f.write('@@' + depattr + ':' + str(depattrval) + '\n')
-                    else:
-                        f.write('\n')
-
-            self.rootNode.traverseElements(handleDeps)
-
-        def handleRemaining(elem: SElement):
-            if elem not in printedNodes:
-                path = elem.getPath()
-                if path != '':
-                    f.write(elem.getPath() + '\n')
-
-        self.rootNode.traverseElements(handleRemaining)
+        batches = self.__top_level_batches(workers)
+        if batches:
+            parts = [self.__deps_parts([self.rootNode])]
+            parts.extend(_map_forked(SGraph._render_deps_batch, batches, workers,  # type: ignore
+                                     (self, )))
+        else:
+            parts = [self.__deps_parts(_preorder([self.rootNode]))]
+        # Attributes of all elements come first, then the dependencies and then the elements
+        # that were not mentioned on either.
+        for section in range(3):
+            for part in parts:
+                f.write(part[section])
 
         for k, v in list(self.metaAttrs.items()):
             f.write(f"@@@@{k}:{v}\n")
@@ -433,6 +721,71 @@ class SGraph:
         if f != sys.stdout:
             f.close()
 
+    @staticmethod
+    def _render_deps_batch(batch: tuple[int, int]) -> tuple[str, str, str]:
+        """Produce the deps lines of a range of top-level elements of the model shared by
+        to_deps with the worker processes."""
+        graph: SGraph = _forked_state[0]  # type: ignore
+        return graph.__deps_parts(_preorder(graph.rootNode.children[batch[0]:batch[1]]))
+
+    def __deps_parts(self, elements: Iterable[SElement]) -> tuple[str, str, str]:
+        """Return the attribute lines, the dependency lines and the lines of otherwise unmentioned
+        elements for the given elements."""
+        attr_lines: list[str] = []
+        dep_lines: list[str] = []
+        remaining_lines: list[str] = []
+        autogeneratedAttributeNames = ['user_count', 'used_count', 'coupling', 'childcount']
+
+        def encodeForDeps(s: str | int | list[str]):
+            if isinstance(s, str):
+                return s.replace('\r\n', '<NEWLINE>').replace('\r', '<NEWLINE>').replace(
+                    '\n', '<NEWLINE>')
+            return str(s)
+
+        for elem in elements:
+            x = elem
+            if self.totalModel is not None and self.totalModel != self:
+                tme = self.totalModel.getElement(x)
+                if tme is not None:
+                    x = tme
+            p = None
+            printed = False
+            for attrname, attrval in sorted(list(x.attrs.items())):
+                if attrname == 'type':
+                    continue
+                if attrname in autogeneratedAttributeNames:
+                    continue
+                if p is None:
+                    p = x.getPath()
+                attr_lines.append('@' + p + ':' + attrname + ':' + encodeForDeps(attrval) + '\n')
+                printed = True
+            if x.getType() != '':
+                if p is None:
+                    p = x.getPath()
+                if len(p) > 1:
+                    attr_lines.append('@' + p + ':type:' + encodeForDeps(x.getType()) + '\n')
+                printed = True
+            # Attributes of the element of the total model do not count as mentioning elem.
+            printed = printed and x is elem
+
+            if elem.outgoing:
+                from_ = elem.getPath()
+                for association in elem.outgoing:
+                    t = association.getType()
+                    dep_lines.append(from_ + ':' + association.getToPath() + ':' + t + '\n')
+                    for depattr, depattrval in list(association.getAttributes().items()):
+                        if not depattr == 'type':
+                            dep_lines.append('@@' + depattr + ':' + str(depattrval) + '\n')
+                printed = True
+            if elem.incoming:
+                printed = True
+
+            if not printed:
+                path = elem.getPath()
+                if path != '':
+                    remaining_lines.append(path + '\n')
+        return ''.join(attr_lines), ''.join(dep_lines), ''.join(remaining_lines)
+
     def produce_deps_tuples(self):
         withDependencies = True
         withAttributes = True
@@ -597,39 +950,64 @@ class SGraph:
         elem_attribute_filters: list[str] | None = None,
         only_root: bool = False,
         parse_string: bool = False,
-        assoc_attribute_filters: list[str] | None = None
+        assoc_attribute_filters: list[str] | None = None,
+        backend: str = 'sax',
+        include_paths: list[str] | None = None,
+        exclude_paths: list[str] | None = None,
+        stub_skipped_targets: bool = False,
+        max_level: int | None = None,
+        have_element_attrs: bool = True,
+        have_assoc_attrs: bool = False,
+        workers: int | None = None,
+        drop_unknown_references: bool = False,
+        partial: bool = False,
+        intern: bool = False,
     ):
         class SGraphXMLParser(xml.sax.handler.ContentHandler):
             node: int
             property: int
             link: int
-            idstack: list[str]
             elemStack: list[SElement]
-            currentElementPath: str | None
             currentElement: SElement | None
             id_to_elem_map: dict[str, SElement]
             rootNode: SElement
             currentRelation: dict[str, str | int | list[str]] | None
             currentElementOutgoingDeps: list[SElementAssociation] | None
+            pendingAssociations: list[SElementAssociation]
+            pendingTargetIds: list[str]
             buffer: str
             acceptableAssocTypes: set[str] | None
             ignoreAssocTypes: set[str] | None
             ignored_attributes: list[str]
             only_root: bool
+            pathFilter: PathFilter | None
+            pathFilterStack: list[tuple[dict | None, dict | None]]
+            skipDepth: int
+            skippedNames: list[str]
+            skippedIds: dict[str, tuple[SElement, tuple[str, ...]]]
+            stubSkippedTargets: bool
+            dropUnknownReferences: bool
+            maxLevel: int | None
+            foldDepth: int
+            haveElementAttrs: bool
+            haveAssocAttrs: bool
+            strings: StringTable | None
 
             def __init__(self):
                 super().__init__()
                 self.node = 0
                 self.property = 0
                 self.link = 0
-                self.idstack = []
                 self.elemStack = []
-                self.currentElementPath = None
                 self.currentElement = None
                 self.id_to_elem_map = {}  # int to elem
                 self.rootNode = SElement(None, '')
                 self.currentRelation = None  # map string string
                 self.currentElementOutgoingDeps = []  # elem assoc objs
+                # Associations whose toElement is resolved after parsing, and the referred ids
+                # in the same order.
+                self.pendingAssociations = []
+                self.pendingTargetIds = []
                 self.buffer = ''
 
                 self.acceptableAssocTypes = None
@@ -646,6 +1024,46 @@ class SGraph:
                 self.blacklisted_assoc_attributes: set[str] = set()
                 self.ignore_all_assoc_attributes = False
 
+                self.pathFilter = None
+                self.pathFilterStack = []  # filter states of elemStack elements
+                # While skipDepth > 0, the parser is inside a subtree rejected by pathFilter.
+                self.skipDepth = 0
+                self.skippedNames = []
+                # Skipped element ids, mapped to their closest parsed ancestor and the names
+                # leading from it to the skipped element.
+                self.skippedIds = {}
+                self.stubSkippedTargets = False
+                # References to ids that are not in the input are dropped instead of raising,
+                # when parsing a part of a model.
+                self.dropUnknownReferences = False
+
+                self.maxLevel = None
+                # While foldDepth > 0, the parser is inside an element deeper than maxLevel,
+                # which is folded into its ancestor on level maxLevel.
+                self.foldDepth = 0
+                self.haveElementAttrs = True
+                self.haveAssocAttrs = True
+                self.strings = None
+
+            def set_path_filter(self, include_paths: Optional[list[str]],
+                                exclude_paths: Optional[list[str]],
+                                stub_skipped_targets: bool):
+                if include_paths or exclude_paths:
+                    self.pathFilter = PathFilter(include_paths, exclude_paths)
+                self.stubSkippedTargets = stub_skipped_targets
+
+            def set_generalization(self, max_level: Optional[int], have_element_attrs: bool,
+                                   have_assoc_attrs: bool):
+                if max_level is None:
+                    return
+                if max_level < 1:
+                    raise ValueError(f'Invalid max_level {max_level}, expected 1 or more')
+                self.maxLevel = max_level
+                self.haveElementAttrs = have_element_attrs
+                self.haveAssocAttrs = have_assoc_attrs
+                if not have_element_attrs:
+                    self.ignore_all_elem_attributes = True
+
             def set_type_rules(self, the_type_rules: Optional[list[str]]):
                 if the_type_rules is None:
                     self.acceptableAssocTypes = None
@@ -700,6 +1118,11 @@ class SGraph:
                 # print(('parsing.. currently '+str(self.node)))
                 #    self.buffer = ''
 
+                if self.skipDepth:
+                    if tag_name == 'e':
+                        self.skipElement(attrs)
+                    return
+
                 if tag_name == 'a':
                     if self.ignore_all_elem_attributes and self.ignore_all_assoc_attributes:
                         return
@@ -713,9 +1136,14 @@ class SGraph:
                                 return
 
                         value = attrs.get('v')
+                        if self.strings is not None:
+                            name = self.strings.intern(name)  # type: ignore
+                            value = self.strings.value(name, value)  # type: ignore
                         self.currentRelation[name] = value  # type: ignore
+                    elif self.foldDepth:
+                        return  # attributes of folded elements are discarded
                     else:
-                        if self.currentElement is not None and len(self.currentElementPath) > 0:
+                        if self.currentElement is not None:
                             if name in self.blacklisted_elem_attributes:
                                 return
                             if self.whitelisted_elem_attributes:
@@ -724,6 +1152,9 @@ class SGraph:
 
                             self.property += 1
                             value = attrs.get('v')
+                            if self.strings is not None:
+                                name = self.strings.intern(name)  # type: ignore
+                                value = self.strings.value(name, value)  # type: ignore
                             self.currentElement.addAttribute(name, value)  # type: ignore
                         else:
                             val = attrs.get('v')
@@ -732,18 +1163,45 @@ class SGraph:
                 elif tag_name == 'e':
                     element_name: str = attrs.get('n')  # type: ignore
 
-                    if len(self.idstack) == 0:
+                    if self.pathFilter is not None:
+                        if self.elemStack:
+                            parent_state = self.pathFilterStack[-1]
+                        else:
+                            parent_state = self.pathFilter.root_state()
+                        state = self.pathFilter.child_state(
+                            parent_state, element_name.replace('/', '__slash__'))
+                        if state is None:
+                            self.skipElement(attrs)
+                            return
+                        self.pathFilterStack.append(state)
+
+                    if self.maxLevel is not None and len(self.elemStack) >= self.maxLevel:
+                        # Fold the element into its ancestor on level maxLevel: references
+                        # from and to the element are attributed to the ancestor.
+                        self.foldDepth += 1
+                        ancestor = self.elemStack[-1]
+                        self.elemStack.append(ancestor)
+                        i = attrs.get('i')
+                        if i is not None:
+                            self.id_to_elem_map[i] = ancestor
+                        return
+
+                    strings = self.strings
+                    if strings is not None:
+                        element_name = strings.intern(element_name)
+                    if not self.elemStack:
                         e = SElement(self.rootNode, element_name)
                     else:
                         parent = self.elemStack[-1]
                         e = SElement(parent, element_name)
                     self.currentElement = e
-                    self.idstack.append(element_name)
-                    self.currentElementPath = '/' + '/'.join(self.idstack)
                     self.node += 1
                     self.elemStack.append(self.currentElement)
 
-                    for aname, avalue in list(attrs.items()):
+                    for aname, avalue in attrs.items():
+                        if strings is not None and aname != 'i' and aname != 'n':
+                            aname = strings.intern(aname)
+                            avalue = strings.value('type' if aname == 't' else aname, avalue)
                         if aname == 't' or aname == 'type':
                             e.setType(avalue)
                             self.property += 1
@@ -779,16 +1237,38 @@ class SGraph:
 
                     for aname, avalue in list(attrs.items()):
                         if len(aname) > 1:
+                            if self.strings is not None:
+                                aname = self.strings.intern(aname)
+                                avalue = self.strings.value(aname, avalue)
                             self.currentRelation[aname] = avalue
 
+            def skipElement(self, attrs: AttributesImpl):
+                self.skipDepth += 1
+                self.skippedNames.append(attrs.get('n'))  # type: ignore
+                i = attrs.get('i')
+                if i is not None:
+                    ancestor = self.elemStack[-1] if self.elemStack else self.rootNode
+                    names = tuple(self.skippedNames)
+                    if self.maxLevel is not None:
+                        # Stubs are not created deeper than maxLevel either.
+                        names = names[:max(0, self.maxLevel - len(self.elemStack))]
+                    self.skippedIds[i] = (ancestor, names)
+
             def endElement(self, name: str):
+                if self.skipDepth:
+                    if name == 'e':
+                        self.skipDepth -= 1
+                        self.skippedNames.pop()
+                    return
+
                 if name == 'e':
-                    self.idstack.pop()
+                    if self.foldDepth:
+                        self.foldDepth -= 1
                     self.elemStack.pop()
+                    if self.pathFilter is not None:
+                        self.pathFilterStack.pop()
                     if self.elemStack:
                         self.currentElement = self.elemStack[-1]
-                        path = '/' + '/'.join(self.idstack)
-                        self.currentElementPath = path
 
                 elif name == 'r':
                     if self.currentElementOutgoingDeps is not None:
@@ -824,80 +1304,394 @@ class SGraph:
                 if self.currentElement is None:
                     raise Exception('Current element is None')
 
-                # HACK: This is probably not the best way to handle this
-                to = SElement(None, i)
-                to.addAttribute("translate", "1")
-                ea = SElementAssociation(self.currentElement, to, t or '')
+                # The target may appear later in the document, so the association is created
+                # without it and fixed up in translateReferences.
+                ea = SElementAssociation(self.currentElement, None, t or '')  # type: ignore
                 self.currentElementOutgoingDeps.append(ea)
+                self.pendingAssociations.append(ea)
+                self.pendingTargetIds.append(i)
 
             def translateReferences(self):
-                stack = [self.rootNode]
+                id_to_elem_map = self.id_to_elem_map
+                dropped: list[SElementAssociation] = []
+                for association, element_id in zip(self.pendingAssociations,
+                                                   self.pendingTargetIds):
+                    target = id_to_elem_map.get(element_id)
+                    if target is None:
+                        if element_id not in self.skippedIds:
+                            if self.dropUnknownReferences:
+                                dropped.append(association)
+                                continue
+                            sys.stderr.write(f'Error: unknown id {element_id} '
+                                             f'n={association.fromElement.name}\n')
+                            raise Exception(f'Error: unknown id in input data: {element_id}')
+                        if not self.stubSkippedTargets:
+                            dropped.append(association)
+                            continue
+                        target = self.createStubElement(element_id)
+                    if self.maxLevel is not None and target is association.fromElement:
+                        # Dependencies inside a folded subtree.
+                        dropped.append(association)
+                        continue
+                    association.toElement = target
+                    target.incoming.append(association)
+                self.pendingAssociations = []
+                self.pendingTargetIds = []
+
+                if dropped:
+                    dropped_set = set(dropped)
+                    for elem in set(a.fromElement for a in dropped):
+                        elem.outgoing = [a for a in elem.outgoing if a not in dropped_set]
+
+            def createStubElement(self, element_id: str) -> SElement:
+                """Create a skipped element without its attributes and contents, so that
+                associations to it can be kept."""
+                elem, names = self.skippedIds[element_id]
+                for name in names:
+                    name = name.replace('/', '__slash__')
+                    child = elem.getChildByName(name)
+                    elem = child if child is not None else SElement(elem, name)
+                self.id_to_elem_map[element_id] = elem
+                return elem
+
+            def partialResult(self) -> tuple:
+                """Encode the parsed elements and their unresolved references to flat lists,
+                which are cheap to send from a worker process to addPartialResult."""
+                elem_to_index: dict[SElement, int] = {}
+                names: list[str] = []
+                parents = array('i')
+                elem_attrs: list[dict | None] = []
+                stack = [(child, -1) for child in reversed(self.rootNode.children)]
                 while stack:
-                    elem = stack.pop(0)
-                    for association in elem.outgoing:
-                        if association.toElement.attrs.get("translate") == "1":
-                            element_id = association.toElement.name
-                            if element_id in self.id_to_elem_map:
-                                association.toElement = self.id_to_elem_map[element_id]
-                                association.toElement.incoming.append(association)
-                            else:
-                                sys.stderr.write(f'Error: unknown id {element_id} n={elem.name}\n')
-                                raise Exception(f'Error: unknown id in input data: {element_id}')
-
-                    for child in elem.children:
-                        stack.append(child)
+                    elem, parent_index = stack.pop()
+                    index = len(names)
+                    elem_to_index[elem] = index
+                    names.append(elem.name)
+                    parents.append(parent_index)
+                    elem_attrs.append(elem.attrs or None)
+                    for child in reversed(elem.children):
+                        stack.append((child, index))
+                ids = {i: elem_to_index[e] for i, e in self.id_to_elem_map.items()}
+                skipped_ids = {i: (elem_to_index.get(ancestor, -1), skipped_names)
+                               for i, (ancestor, skipped_names) in self.skippedIds.items()}
+                pending = self.pendingAssociations
+                sources = array('i', [elem_to_index[a.fromElement] for a in pending])
+                # Interned, so that pickle sends each deptype once.
+                deptypes = [sys.intern(a.deptype) for a in pending]
+                assoc_attrs = [a.attrs or None for a in pending]
+                return (names, parents, elem_attrs, ids, skipped_ids, sources,
+                        self.pendingTargetIds, deptypes, assoc_attrs)
+
+            def addPartialResult(self, result: tuple):
+                """Add the elements and references parsed by a worker process under rootNode.
+                References are resolved by translateReferences once every part is added."""
+                (names, parents, elem_attrs, ids, skipped_ids, sources, target_ids, deptypes,
+                 assoc_attrs) = result
+                root = self.rootNode
+                strings = self.strings
+                elements: list[SElement] = []
+                for name, parent_index, attrs in zip(names, parents, elem_attrs):
+                    if strings is not None:
+                        name = strings.intern(name)
+                    e = SElement(elements[parent_index] if parent_index >= 0 else root, name)
+                    if attrs is not None:
+                        e.attrs = attrs if strings is None else strings.attrs(attrs)
+                    elements.append(e)
+                id_to_elem_map = self.id_to_elem_map
+                for i, index in ids.items():
+                    id_to_elem_map[i] = elements[index]
+                for i, (ancestor_index, skipped_names) in skipped_ids.items():
+                    ancestor = elements[ancestor_index] if ancestor_index >= 0 else root
+                    self.skippedIds[i] = (ancestor, skipped_names)
+                pending = self.pendingAssociations
+                for source, deptype, attrs in zip(sources, deptypes, assoc_attrs):
+                    if attrs is not None and strings is not None:
+                        attrs = strings.attrs(attrs)
+                    e = elements[source]
+                    ea = SElementAssociation(e, None, deptype, attrs)  # type: ignore
+                    e.outgoing.append(ea)
+                    pending.append(ea)
+                self.pendingTargetIds.extend(target_ids)
+                self.node += len(elements)
+
+            def generalizeAssociations(self):
+                """Merge the associations of the folded model like generalize_model does."""
+                from .algorithms.generalizer import merge_parallel_associations
+                elements = [self.rootNode]
+                i = 0
+                while i < len(elements):
+                    elements.extend(elements[i].children)
+                    i += 1
+                for elem in elements:
+                    if not self.haveElementAttrs:
+                        elem.attrs = {}
+                    if not self.haveAssocAttrs:
+                        for association in elem.outgoing:
+                            association.attrs = {}
+                merge_parallel_associations(elements)
 
-        parser = xml.sax.make_parser()
         a = SGraphXMLParser()
         a.set_type_rules(type_rules)
         a.set_attribute_rules(elem_attribute_filters, assoc_attribute_filters)
-        parser.setContentHandler(a)
+        a.set_path_filter(include_paths, exclude_paths, stub_skipped_targets)
+        a.set_generalization(max_level, have_element_attrs, have_assoc_attrs)
+        a.dropUnknownReferences = drop_unknown_references
+        if intern:
+            a.strings = StringTable()
         if isinstance(filename_or_stream, str) and not parse_string:
-            filepath: str = filename_or_stream
-            if os.path.exists(filepath):
-                try:
-                    parser.parse(filepath)  # type: ignore
-                except ParsingIntentionallyAborted:
-                    pass
+            if not os.path.exists(filename_or_stream):
+                raise Exception('Cannot find file {}'.format(filename_or_stream))
+        if backend not in XML_PARSER_BACKENDS:
+            raise ValueError(f'Unknown XML parser backend {backend}, expected one of '
+                             f'{", ".join(XML_PARSER_BACKENDS)}')
+
+        if partial:
+            with gc_paused():
+                SGraph.__run_parser(a, filename_or_stream, parse_string, backend)
+                return a.partialResult()
+
+        with gc_paused():
+            if workers is not None and workers > 1 and not only_root:
+                options = (type_rules, elem_attribute_filters, assoc_attribute_filters, backend,
+                           include_paths, exclude_paths, stub_skipped_targets, max_level,
+                           have_element_attrs, have_assoc_attrs, drop_unknown_references)
+                SGraph.__run_parallel_parser(a, filename_or_stream, parse_string, workers,
+                                             options)
             else:
-                raise Exception('Cannot find file {}'.format(filepath))
-        elif isinstance(filename_or_stream, str) and parse_string:
-            parseString(filename_or_stream, a)
-        else:
-            try:
-                parser.parse(filename_or_stream)  # type: ignore
-            except ParsingIntentionallyAborted:
-                pass
-
-        a.translateReferences()
+                SGraph.__run_parser(a, filename_or_stream, parse_string, backend)
+            a.translateReferences()
+            if max_level is not None:
+                a.generalizeAssociations()
         graph = SGraph(a.rootNode)
+        graph.stringTable = a.strings
         if len(graph.rootNode.children) == 0:
             sys.stderr.write('Warning: Parsing the model file did not yield any elements.')
 
         return graph
 
+    @staticmethod
+    def __run_parser(handler: xml.sax.handler.ContentHandler,
+                     filename_or_stream: str | io.TextIOWrapper, parse_string: bool,
+                     backend: str):
+        if backend == 'sax':
+            SGraph.__run_sax_parser(handler, filename_or_stream, parse_string)
+        elif backend == 'expat':
+            SGraph.__run_expat_parser(handler, filename_or_stream, parse_string)
+        else:
+            SGraph.__run_lxml_parser(handler, filename_or_stream, parse_string)
+
+    @staticmethod
+    def __run_parallel_parser(handler: xml.sax.handler.ContentHandler,
+                              filename_or_stream: str | io.TextIOWrapper, parse_string: bool,
+                              workers: int, options: tuple):
+        """Parse batches of top-level elements in worker processes and add their results to
+        the handler in document order. The model is expected to be UTF-8 encoded."""
+        if isinstance(filename_or_stream, str) and parse_string:
+            data = filename_or_stream.encode('utf-8')
+        elif isinstance(filename_or_stream, str):
+            with open(filename_or_stream, 'rb') as f:
+                data = f.read()
+        else:
+            data = filename_or_stream.read()
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+
+        batches = SGraph.__split_top_level_elements(data, workers * _PARALLEL_BATCHES_PER_WORKER)
+        if len(batches) < 2:
+            for batch in batches:
+                handler.addPartialResult(SGraph._parse_xml_chunk(batch, options))
+            return
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            for result in executor.map(SGraph._parse_xml_chunk, batches, repeat(options)):
+                handler.addPartialResult(result)
+
+    @staticmethod
+    def __split_top_level_elements(data: bytes, batch_count: int) -> list[bytes]:
+        """Split the contents of the <elements> tag to at most about batch_count parts, each
+        holding one or more complete top-level <e> subtrees."""
+        m = _XML_ELEMENTS_START_RE.search(data)
+        if m is None or m.group().endswith(b'/>'):
+            return []
+        spans: list[tuple[int, int]] = []
+        depth = 0
+        begin = 0
+        for m in _XML_E_TAG_RE.finditer(data, m.end()):
+            tag = m.group()
+            if tag[1] == 0x2f:  # </e>
+                depth -= 1
+                if depth == 0:
+                    spans.append((begin, m.end()))
+                elif depth < 0:
+                    break  # malformed, leave it for the parser to report
+            elif tag.endswith(b'/>'):
+                if depth == 0:
+                    spans.append((m.start(), m.end()))
+            else:
+                if depth == 0:
+                    begin = m.start()
+                depth += 1
+
+        batch_size = len(data) // max(batch_count, 1) + 1
+        batches: list[bytes] = []
+        batch_begin = None
+        for begin, end in spans:
+            if batch_begin is None:
+                batch_begin = begin
+            if end - batch_begin >= batch_size:
+                batches.append(data[batch_begin:end])
+                batch_begin = None
+        if batch_begin is not None:
+            batches.append(data[batch_begin:spans[-1][1]])
+        return batches
+
+    @staticmethod
+    def _parse_xml_chunk(chunk: bytes, options: tuple) -> tuple:
+        """Parse a batch of top-level elements in a worker process of a parallel parse."""
+        (type_rules, elem_attribute_filters, assoc_attribute_filters, backend, include_paths,
+         exclude_paths, stub_skipped_targets, max_level, have_element_attrs,
+         have_assoc_attrs, drop_unknown_references) = options
+        xml_string = '<model><elements>' + chunk.decode('utf-8') + '</elements></model>'
+        return SGraph.__parse_xml(xml_string, type_rules, elem_attribute_filters, False, True,
+                                  assoc_attribute_filters, backend, include_paths,
+                                  exclude_paths, stub_skipped_targets, max_level,
+                                  have_element_attrs, have_assoc_attrs,
+                                  drop_unknown_references=drop_unknown_references,
+                                  partial=True)
+
+    @staticmethod
+    def __run_sax_parser(handler: xml.sax.handler.ContentHandler,
+                         filename_or_stream: str | io.TextIOWrapper, parse_string: bool):
+        try:
+            if isinstance(filename_or_stream, str) and parse_string:
+                parseString(filename_or_stream, handler)
+            else:
+                parser = xml.sax.make_parser()
+                parser.setContentHandler(handler)
+                parser.parse(filename_or_stream)  # type: ignore
+        except ParsingIntentionallyAborted:
+            pass
+
+    @staticmethod
+    def __run_expat_parser(handler: xml.sax.handler.ContentHandler,
+                           filename_or_stream: str | io.TextIOWrapper, parse_string: bool):
+        """Drive the SAX content handler directly from pyexpat callbacks, skipping the
+        xml.sax reader layer and its AttributesImpl wrapping."""
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = handler.startElement
+        parser.EndElementHandler = handler.endElement
+        try:
+            if isinstance(filename_or_stream, str) and parse_string:
+                parser.Parse(filename_or_stream, True)
+            elif isinstance(filename_or_stream, str):
+                with open(filename_or_stream, 'rb') as f:
+                    parser.ParseFile(f)
+            else:
+                while True:
+                    chunk = filename_or_stream.read(_XML_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    parser.Parse(chunk, False)
+                parser.Parse(b'', True)
+        except ParsingIntentionallyAborted:
+            pass
+
+    @staticmethod
+    def __run_lxml_parser(handler: xml.sax.handler.ContentHandler,
+                          filename_or_stream: str | io.TextIOWrapper, parse_string: bool):
+        """Drive the SAX content handler from lxml.etree.iterparse events. Parsed elements are
+        discarded as soon as they end to keep the lxml tree from growing."""
+        from lxml import etree
+        encoding = None
+        if isinstance(filename_or_stream, str) and parse_string:
+            source = io.BytesIO(filename_or_stream.encode('utf-8'))
+            encoding = 'utf-8'
+        elif isinstance(filename_or_stream, str):
+            source = filename_or_stream
+        else:
+            # iterparse needs bytes. Text streams have already been decoded, so they are
+            # re-encoded and the declared document encoding is overridden like expat does.
+            source = _Utf8Reader(filename_or_stream)
+            encoding = 'utf-8'
+        start_element = handler.startElement
+        end_element = handler.endElement
+        try:
+            for event, elem in etree.iterparse(source, events=('start', 'end'),
+                                               encoding=encoding, huge_tree=True):
+                if event == 'start':
+                    start_element(elem.tag, elem.attrib)
+                else:
+                    end_element(elem.tag)
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+        except ParsingIntentionallyAborted:
+            pass
+
     @staticmethod
     def parse_xml_or_zipped_xml(
                 model_file_path: str | TextIO,
                 type_rules: Optional[list[str]]=None,
                 elem_attribute_filters: Optional[list[str]]=None,
                 only_root: bool=False,
-                assoc_attribute_filters: Optional[list[str]]=None
+                assoc_attribute_filters: Optional[list[str]]=None,
+                backend: str = 'sax',
+                include_paths: Optional[list[str]]=None,
+                exclude_paths: Optional[list[str]]=None,
+                stub_skipped_targets: bool=False,
+                max_level: Optional[int]=None,
+                have_element_attrs: bool=True,
+                have_assoc_attrs: bool=False,
+                workers: Optional[int]=None,
+                intern: bool=False,
     ):
+        """
+        Parse a model from a .xml or .xml.zip file path, or from a text stream.
+
+        :param backend: XML parser backend, one of XML_PARSER_BACKENDS. 'sax' (default) uses
+          xml.sax, 'expat' drives pyexpat directly and 'lxml' uses lxml.etree.iterparse.
+        :param include_paths: if given, only these subtrees (and their ancestors) are parsed,
+          e.g. ['/org/repo/src']
+        :param exclude_paths: subtrees that are not parsed, e.g. ['/org/repo/External']
+        :param stub_skipped_targets: associations pointing to skipped elements are dropped by
+          default. If True, they are kept and their targets are created as plain elements
+          without attributes or children.
+        :param max_level: if given, elements deeper than this level are folded into their
+          ancestor on this level while parsing, giving the same model as
+          algorithms.generalizer.generalize_model(model, max_level, have_element_attrs,
+          have_assoc_attrs) without building the full model first. Level 1 is the top level.
+        :param have_element_attrs: with max_level, keep the attributes of the elements
+        :param have_assoc_attrs: with max_level, keep the attributes of the associations
+        :param workers: if greater than 1, the top-level elements are parsed in this many
+          processes and the results are combined. This pays off for large models with several
+          top-level elements, e.g. one per repository. The model must be UTF-8 encoded.
+        :param intern: share equal element names, attribute names and attribute values of
+          low-cardinality attributes through the string table of the model (see
+          SGraph.get_string_table), which saves memory on large models
+        """
         if isinstance(model_file_path, str) and '.xml.zip' in model_file_path:
             with open(model_file_path, 'rb') as filehandle:
                 zfile = zipfile.ZipFile(filehandle)
                 data = zfile.open(zfile.namelist()[0], 'r')
-                data = io.TextIOWrapper(data)
+                if workers is None or workers < 2 or only_root:
+                    # The parallel parser reads the bytes as they are.
+                    data = io.TextIOWrapper(data)
                 zfile.close()
                 m = SGraph.parse_xml_file_or_stream(data, type_rules,
                                        elem_attribute_filters, only_root,
-                                       assoc_attribute_filters)
+                                       assoc_attribute_filters, backend,
+                                       include_paths, exclude_paths, stub_skipped_targets,
+                                       max_level, have_element_attrs, have_assoc_attrs,
+                                       workers, intern=intern)
                 m.set_model_path(model_file_path)
         else:
             m = SGraph.__parse_xml(model_file_path,
                                                 type_rules,  elem_attribute_filters,
-                                                only_root,  False, assoc_attribute_filters)
+                                                only_root,  False, assoc_attribute_filters,
+                                                backend, include_paths, exclude_paths,
+                                                stub_skipped_targets, max_level,
+                                                have_element_attrs, have_assoc_attrs, workers,
+                                                intern=intern)
             m.set_model_path(model_file_path)
         return m
 
@@ -906,36 +1700,73 @@ class SGraph:
                                  type_rules: Optional[list[str]]=None,
                                  elem_attribute_filters: Optional[list[str]]=None,
                                  only_root: bool=False,
-                                 assoc_attribute_filters: Optional[list[str]]=None):
+                                 assoc_attribute_filters: Optional[list[str]]=None,
+                                 backend: str = 'sax',
+                                 include_paths: Optional[list[str]]=None,
+                                 exclude_paths: Optional[list[str]]=None,
+                                 stub_skipped_targets: bool=False,
+                                 max_level: Optional[int]=None,
+                                 have_element_attrs: bool=True,
+                                 have_assoc_attrs: bool=False,
+                                 workers: Optional[int]=None,
+                                 drop_unknown_references: bool=False,
+                                 intern: bool=False):
             return SGraph.__parse_xml(filename_or_stream, type_rules,
                              elem_attribute_filters, only_root, False,
-                             assoc_attribute_filters)
+                             assoc_attribute_filters, backend,
+                             include_paths, exclude_paths, stub_skipped_targets,
+                             max_level, have_element_attrs, have_assoc_attrs, workers,
+                             drop_unknown_references, intern=intern)
 
     @staticmethod
     def parse_xml_string(xml_string: str,
                          type_rules: list[str] | None = None,
                          elem_attribute_filters: list[str] | None = None,
                          only_root: bool = False,
-                         assoc_attribute_filters: list[str] | None=None):
+                         assoc_attribute_filters: list[str] | None=None,
+                         backend: str = 'sax',
+                         include_paths: list[str] | None = None,
+                         exclude_paths: list[str] | None = None,
+                         stub_skipped_targets: bool = False,
+                         max_level: int | None = None,
+                         have_element_attrs: bool = True,
+                         have_assoc_attrs: bool = False,
+                         workers: int | None = None,
+                         drop_unknown_references: bool = False,
+                         intern: bool = False):
+        """
+        Parse a model from an XML string. See parse_xml_or_zipped_xml for the options.
+
+        :param drop_unknown_references: drop references to ids that are not in the string,
+          e.g. when parsing a part of a model, instead of raising an exception
+        """
         return SGraph.__parse_xml(xml_string, type_rules,
                                 elem_attribute_filters,
                                 only_root, True,
-                                assoc_attribute_filters)
+                                assoc_attribute_filters, backend,
+                                include_paths, exclude_paths, stub_skipped_targets,
+                                max_level, have_element_attrs, have_assoc_attrs, workers,
+                                drop_unknown_references, intern=intern)
 
 
     @staticmethod
     def parse_deps(filename: str):
+        """Parse a deps file, or stdin if filename is '-'. The file is read line by line."""
+        if filename == '-':
+            return SGraph.parse_deps_lines(sys.stdin)
         with open(filename, errors='ignore') as f:
-            return SGraph.parse_deps_lines(f.read().splitlines())
+            return SGraph.parse_deps_lines(f)
 
     @staticmethod
-    def parse_deps_lines(content: Sequence[str]):
+    def parse_deps_lines(content: Iterable[str]):
+        """Parse deps lines from any iterable of lines, e.g. a list or an open file."""
         TAGLEN = len('<NEWLINE>')
         modelAttrs: dict[str, str | dict[str, str]] = {}
         metaAttrs: dict[str, dict[str, str]] = {}
         lastEA: SElementAssociation | None = None
         rootNode: SElement = SElement(None, '')
         egm: SGraph = SGraph(rootNode)
+        path_cache = ElementPathCache(egm)
         ignore: list[str] = []
         lines: int = 0
 
@@ -946,97 +1777,97 @@ class SGraph:
                 return None
             return i
 
-        for line in content:
-            if line.endswith('\r'):
-                line = line[:-1]
-            line = line.strip()
-            lines += 1
-            if len(line) > 3 and line[0:4] == '@@@@':
-                splitted = line.split(':')
-                if len(splitted) >= 2 and len(splitted[0]) > 3:
-                    attr = splitted[0][4:]
-                    modelAttrs[attr] = splitted[1]
-            elif len(line) > 2 and line[0:3] == '@@@':
-                firstPos = line.find(':', 3)
-                if firstPos != -1:
-                    secondPos = line.find(':', firstPos + 1)
-                    if secondPos != -1:
-                        attribute = line[3:firstPos]
-                        metaattrname = line[firstPos + 1:secondPos]
-                        value = line[secondPos + 1:]
-                        p = value.find('<NEWLINE>')
-                        while p != -1:
-                            value = value[0:p] + '\n' + value[p + TAGLEN:]
+        with gc_paused():
+            for line in content:
+                if line.endswith('\r'):
+                    line = line[:-1]
+                line = line.strip()
+                lines += 1
+                if len(line) > 3 and line[0:4] == '@@@@':
+                    splitted = line.split(':')
+                    if len(splitted) >= 2 and len(splitted[0]) > 3:
+                        attr = splitted[0][4:]
+                        modelAttrs[attr] = splitted[1]
+                elif len(line) > 2 and line[0:3] == '@@@':
+                    firstPos = line.find(':', 3)
+                    if firstPos != -1:
+                        secondPos = line.find(':', firstPos + 1)
+                        if secondPos != -1:
+                            attribute = line[3:firstPos]
+                            metaattrname = line[firstPos + 1:secondPos]
+                            value = line[secondPos + 1:]
                             p = value.find('<NEWLINE>')
-                        if attribute not in metaAttrs:
-                            metaAttrs[attribute] = {}
-                        metaAttrs[attribute][metaattrname] = value
-            elif len(line) > 1 and line[0:2] == '@@':
-                r = line[2:]
-                if ':' in r:
-                    pos = r.find(':')
-                    key = r[0:pos]
-                    if len(r) > pos + 1:
-                        rest = r[pos + 1:]
-                        if lastEA is not None:
-                            lastEA.attrs[key] = rest
-                        else:
-                            sys.stderr.write(
-                                'Data format handling error: dep attr not handled properly. line=' +
-                                line + '\n')
-
-            elif len(line) > 0 and line[0] == '@':
-                firstPos = line.find(':', 1)
-                if firstPos != -1:
-                    secondPos = line.find(':', firstPos + 1)
-                    if secondPos != -1:
-                        i = line[1:firstPos]
-                        attrName = line[firstPos + 1:secondPos]
-                        value = line[secondPos + 1:]
-                        # TODO p = value.find('<NEWLINE">')
-                        if i == '/':
-                            sys.stderr.write('ID /\n')
-                            continue
-                        elif i == '/ATTRIBUTE_PROPAGATE_FOR_MODEL':
-                            egm.addPropagateAction(attrName, value)
-                            continue
-                        e = egm.createOrGetElementFromPath(i)
-                        if attrName == 'type':
-                            e.setType(value)
-                        else:
-                            if len(value) > 0:
-                                e.addAttribute(attrName, value)
+                            while p != -1:
+                                value = value[0:p] + '\n' + value[p + TAGLEN:]
+                                p = value.find('<NEWLINE>')
+                            if attribute not in metaAttrs:
+                                metaAttrs[attribute] = {}
+                            metaAttrs[attribute][metaattrname] = value
+                elif len(line) > 1 and line[0:2] == '@@':
+                    r = line[2:]
+                    if ':' in r:
+                        pos = r.find(':')
+                        key = r[0:pos]
+                        if len(r) > pos + 1:
+                            rest = r[pos + 1:]
+                            if lastEA is not None:
+                                lastEA.attrs[key] = rest
+                            else:
+                                sys.stderr.write('Data format handling error: dep attr not '
+                                                 'handled properly. line=' + line + '\n')
+
+                elif len(line) > 0 and line[0] == '@':
+                    firstPos = line.find(':', 1)
+                    if firstPos != -1:
+                        secondPos = line.find(':', firstPos + 1)
+                        if secondPos != -1:
+                            i = line[1:firstPos]
+                            attrName = line[firstPos + 1:secondPos]
+                            value = line[secondPos + 1:]
+                            # TODO p = value.find('<NEWLINE">')
+                            if i == '/':
+                                sys.stderr.write('ID /\n')
+                                continue
+                            elif i == '/ATTRIBUTE_PROPAGATE_FOR_MODEL':
+                                egm.addPropagateAction(attrName, value)
+                                continue
+                            e = path_cache.get_or_create(i)
+                            if attrName == 'type':
+                                e.setType(value)
+                            else:
+                                if len(value) > 0:
+                                    e.addAttribute(attrName, value)
+                                else:
+                                    ignore.append(attrName)
+                elif ':' in line:
+                    firstPos = line.find(':')
+                    t = None
+                    info = None
+                    if firstPos != -1:
+                        secondPos = line.find(':', firstPos + 1)
+                        if secondPos != -1:
+                            id2 = line[firstPos + 1:secondPos]
+                            thirdPos = line.find(':', secondPos + 1)
+                            if thirdPos != -1:
+                                t = line[secondPos + 1:thirdPos]
+                                info = line[thirdPos + 1:]
                             else:
-                                ignore.append(attrName)
-            elif ':' in line:
-                firstPos = line.find(':')
-                t = None
-                info = None
-                if firstPos != -1:
-                    secondPos = line.find(':', firstPos + 1)
-                    if secondPos != -1:
-                        id2 = line[firstPos + 1:secondPos]
-                        thirdPos = line.find(':', secondPos + 1)
-                        if thirdPos != -1:
-                            t = line[secondPos + 1:thirdPos]
-                            info = line[thirdPos + 1:]
+                                t = line[secondPos + 1:]
                         else:
-                            t = line[secondPos + 1:]
-                    else:
-                        id2 = line[firstPos + 1:]
-                    id1 = correctId(line[0:firstPos])
-                    if id1 is None:
-                        continue
+                            id2 = line[firstPos + 1:]
+                        id1 = correctId(line[0:firstPos])
+                        if id1 is None:
+                            continue
 
-                    if '//' in id2:
-                        id2 = id2.replace('//', '/')
-                    if t is None:
-                        t = ''
-                    ea = add_ea(t, info, id1, id2, egm)
-                    lastEA = ea
-            else:
-                if line.strip() != '':
-                    egm.createOrGetElementFromPath(line)
+                        if '//' in id2:
+                            id2 = id2.replace('//', '/')
+                        if t is None:
+                            t = ''
+                        ea = add_ea(t, info, id1, id2, egm, path_cache)
+                        lastEA = ea
+                else:
+                    if line.strip() != '':
+                        path_cache.get_or_create(line)
 
         sys.stderr.write('Processed: ' + str(lines) + ' lines.\n')
         egm.setModelAttrs(modelAttrs)
@@ -1045,20 +1876,28 @@ class SGraph:
 
     @staticmethod
     def groupea(eas: list[SElementAssociation]):
-        tuples: list[tuple[list[SElementAssociation], str, dict[str,
-                                                                str | int | list[str]], ], ] = []
-        easmap: dict[str, list[SElementAssociation]] = {}
+        """Group associations by deptype and equal attributes, in the order of first
+        occurrence. Returns (associations, deptype, attrs) tuples."""
+        easmap: dict[tuple[str, str], list[SElementAssociation]] = {}
+        # Associations often share their attrs dict, so its str() is computed once per dict.
+        attrs_keys: dict[int, str] = {}
         for association in eas:
-            k = str(association.attrs) + association.deptype
-            if k in easmap:
-                easmap[k].append(association)
+            attrs = association.attrs
+            if attrs:
+                attrs_key = attrs_keys.get(id(attrs))
+                if attrs_key is None:
+                    attrs_key = str(attrs)
+                    attrs_keys[id(attrs)] = attrs_key
             else:
+                attrs_key = ''
+            k = (attrs_key, association.deptype)
+            group = easmap.get(k)
+            if group is None:
                 easmap[k] = [association]
+            else:
+                group.append(association)
 
-        for k, v in list(easmap.items()):
-            tuples.append((v, v[0].deptype, v[0].attrs))
-
-        return tuples
+        return [(v, v[0].deptype, v[0].attrs) for v in easmap.values()]
 
     def to_plantuml(self, fname: str | None):
         if fname is not None:
@@ -1177,6 +2016,71 @@ class SGraph:
     def set_model_path(self, filepath: str):
         self.modelAttrs['model_path'] = filepath
 
+    def clone(self) -> "SGraph":
+        """
+        Return an independent copy of the model for what-if changes, faster than deepcopy.
+
+        The element tree, the associations and their attribute dicts are copied, the names and
+        attribute values are shared. The order of the children, outgoing and incoming lists is
+        kept, and the duplicate association lookup of the copy is ready to use. See cow_clone
+        for a copy that only copies the parts that are used.
+        """
+        root = self.rootNode
+        result = SGraph(SElement(None, root.name))
+        result.metaAttrs = copy(self.metaAttrs)
+        result.modelAttrs = copy(self.modelAttrs)
+        result.propagateActions = copy(self.propagateActions)
+        result.stringTable = self.stringTable
+        if self.totalModel:
+            result.totalModel = result if self.totalModel is self else self.totalModel.clone()
+
+        with gc_paused():
+            new_root = result.rootNode
+            new_root.attrs = root.attrs.copy()
+            new_root.human_readable_name = root.human_readable_name
+            old_to_new: dict[SElement, SElement] = {root: new_root}
+            elements = [root]
+            stack = [root]
+            while stack:
+                elem = stack.pop()
+                new_elem = old_to_new[elem]
+                for child in elem.children:
+                    new_child = SElement(new_elem, child.name)
+                    new_child.attrs = child.attrs.copy()
+                    new_child.human_readable_name = child.human_readable_name
+                    old_to_new[child] = new_child
+                    elements.append(child)
+                    stack.append(child)
+
+            old_to_new_association: dict[SElementAssociation, SElementAssociation] = {}
+            for elem in elements:
+                new_elem = old_to_new[elem]
+                for association in elem.outgoing:
+                    new_association = SElementAssociation(new_elem,
+                                                          old_to_new[association.toElement],
+                                                          association.deptype,
+                                                          association.attrs.copy())
+                    new_elem.outgoing.append(new_association)
+                    old_to_new_association[association] = new_association
+            for elem in elements:
+                if elem.incoming:
+                    new_elem = old_to_new[elem]
+                    incoming = [old_to_new_association[x] for x in elem.incoming]
+                    new_elem.incoming = incoming
+                    new_elem._incoming_index = {(id(x.fromElement), x.deptype): x
+                                                for x in incoming}
+        return result
+
+    def cow_clone(self) -> "SGraph":
+        """
+        Return a copy-on-write copy of the model in constant time. Its elements copy their
+        children, attributes and associations from this model on first access, so parts of the
+        copy that are not used are never copied, see sgraph_cow. This model must not be
+        modified while the copy is in use.
+        """
+        from .sgraph_cow import cow_clone
+        return cow_clone(self)
+
     def __deepcopy__(self, memo):  # type: ignore # TODO: Add proper typing
         result = SGraph(SElement(None, ''))
         result.metaAttrs = copy(self.metaAttrs)
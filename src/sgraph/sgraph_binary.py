@@ -0,0 +1,337 @@
+"""
+Compact binary model format (.sgb).
+
+The file stores the model as a handful of flat arrays so that loading is a few bulk reads
+followed by object construction, without any text parsing:
+
+ - a string table holding element names, attribute keys, deptypes and string values
+ - element names and parent indices, elements in pre-order with the root at index 0
+ - outgoing associations in CSR form: per-element offsets, target indices and deptypes
+ - association attribute sets, shared by associations that share the same attrs dict
+ - element attribute columns, one per attribute key
+ - a JSON blob with modelAttrs, metaAttrs and propagateActions
+
+All integers are little-endian. Attribute values keep their Python type when they are str,
+int, float, bool, list or set; other values are stored like to_xml would write them.
+
+ from sgraph import SGraph
+ graph.save('model.sgb')
+ graph = SGraph.load('model.sgb')
+"""
+from __future__ import annotations
+
+import json
+import struct
+import sys
+from array import array
+
+from .selement import SElement
+from .selementassociation import SElementAssociation
+from .sgraph import SGraph
+from .sgraph_utils import gc_paused
+
+MAGIC = b'SGRAPHB\x00'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_COUNT = struct.Struct('<Q')
+
+# Attribute value tags
+_STR = 0
+_INT = 1
+_FLOAT = 2
+_BOOL = 3
+_LIST = 4
+_SET = 5
+_BIGINT = 6
+
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+_FLOAT_BITS = struct.Struct('<d')
+_INT_BITS = struct.Struct('<q')
+
+_SWAP_BYTES = sys.byteorder != 'little'
+
+
+class SGraphBinaryFormatError(Exception):
+    pass
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings: dict[str, int] = {}
+        self.list_offsets = array('q', [0])
+        self.list_tags = array('B')
+        self.list_payloads = array('q')
+
+    def string(self, s: str) -> int:
+        idx = self.strings.get(s)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings[s] = idx
+        return idx
+
+    def value(self, v: object, in_list: bool = False) -> tuple[int, int]:
+        if isinstance(v, str):
+            return _STR, self.string(v)
+        if isinstance(v, bool):
+            return _BOOL, int(v)
+        if isinstance(v, int):
+            if _INT64_MIN <= v <= _INT64_MAX:
+                return _INT, v
+            return _BIGINT, self.string(str(v))
+        if isinstance(v, float):
+            return _FLOAT, _INT_BITS.unpack(_FLOAT_BITS.pack(v))[0]
+        if not in_list and isinstance(v, (list, set)):
+            items = sorted(v, key=str) if isinstance(v, set) else v
+            for item in items:
+                tag, payload = self.value(item, True)
+                self.list_tags.append(tag)
+                self.list_payloads.append(payload)
+            self.list_offsets.append(len(self.list_tags))
+            return (_SET if isinstance(v, set) else _LIST), len(self.list_offsets) - 2
+        if isinstance(v, dict):
+            # Dictionaries are analysis-time data that to_xml does not write either.
+            return _STR, self.string('')
+        return _STR, self.string(str(v))
+
+
+def dumps(graph: SGraph) -> bytes:
+    """Serialize the model to the binary format."""
+    encoder = _Encoder()
+
+    elements: list[SElement] = []
+    elem_to_index: dict[SElement, int] = {}
+    parents = array('i')
+    stack: list[tuple[SElement, int]] = [(graph.rootNode, -1)]
+    while stack:
+        elem, parent_index = stack.pop()
+        elem_to_index[elem] = len(elements)
+        elements.append(elem)
+        parents.append(parent_index)
+        index = len(elements) - 1
+        for child in reversed(elem.children):
+            stack.append((child, index))
+
+    names = array('i', [encoder.string(e.name) for e in elements])
+
+    out_offsets = array('q', [0])
+    targets = array('i')
+    deptypes = array('i')
+    assoc_attr_sets = array('i')
+    attr_set_ids: dict[int, int] = {}
+    attr_set_dicts: list[dict[str, str | int | list[str]]] = []
+    for elem in elements:
+        for association in elem.outgoing:
+            target_index = elem_to_index.get(association.toElement)
+            if target_index is None:
+                sys.stderr.write(f'No element index for {association.toElement.getPath()} dep '
+                                 f'from {association.fromElement.name}\n')
+                continue
+            targets.append(target_index)
+            deptypes.append(encoder.string(association.deptype))
+            if association.attrs:
+                set_id = attr_set_ids.get(id(association.attrs))
+                if set_id is None:
+                    set_id = len(attr_set_dicts)
+                    attr_set_ids[id(association.attrs)] = set_id
+                    attr_set_dicts.append(association.attrs)
+                assoc_attr_sets.append(set_id)
+            else:
+                assoc_attr_sets.append(-1)
+        out_offsets.append(len(targets))
+
+    set_offsets = array('q', [0])
+    set_keys = array('i')
+    set_tags = array('B')
+    set_payloads = array('q')
+    for attrs in attr_set_dicts:
+        for k, v in attrs.items():
+            tag, payload = encoder.value(v)
+            set_keys.append(encoder.string(k))
+            set_tags.append(tag)
+            set_payloads.append(payload)
+        set_offsets.append(len(set_keys))
+
+    columns: dict[str, tuple[array, array, array]] = {}
+    for index, elem in enumerate(elements):
+        for k, v in elem.attrs.items():
+            if k.startswith('_tmp_attr_'):
+                continue
+            column = columns.get(k)
+            if column is None:
+                column = (array('i'), array('B'), array('q'))
+                columns[k] = column
+            tag, payload = encoder.value(v)
+            column[0].append(index)
+            column[1].append(tag)
+            column[2].append(payload)
+    column_keys = array('i', [encoder.string(k) for k in columns])
+
+    meta = json.dumps({
+        'modelAttrs': graph.modelAttrs,
+        'metaAttrs': graph.metaAttrs,
+        'propagateActions': graph.propagateActions,
+    }, default=str).encode('utf-8')
+
+    encoded_strings = [s.encode('utf-8', 'surrogatepass') for s in encoder.strings]
+    string_lengths = array('q', [len(s) for s in encoded_strings])
+
+    chunks: list[bytes] = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0)]
+    _put_bytes(chunks, meta)
+    _put_array(chunks, string_lengths)
+    _put_bytes(chunks, b''.join(encoded_strings))
+    for arr in (names, parents, out_offsets, targets, deptypes, assoc_attr_sets,
+                set_offsets, set_keys, set_tags, set_payloads,
+                encoder.list_offsets, encoder.list_tags, encoder.list_payloads, column_keys):
+        _put_array(chunks, arr)
+    for column in columns.values():
+        for arr in column:
+            _put_array(chunks, arr)
+    return b''.join(chunks)
+
+
+def loads(data: bytes) -> SGraph:
+    """Deserialize a model produced by dumps."""
+    reader = _Reader(data)
+    magic, version, _flags = reader.header()
+    if magic != MAGIC:
+        raise SGraphBinaryFormatError('Not an sgraph binary model file')
+    if version != FORMAT_VERSION:
+        raise SGraphBinaryFormatError(f'Unsupported sgraph binary format version {version}')
+
+    meta = json.loads(reader.bytes().decode('utf-8'))
+    string_lengths = reader.array('q')
+    blob = reader.bytes()
+    strings: list[str] = []
+    pos = 0
+    for length in string_lengths:
+        strings.append(blob[pos:pos + length].decode('utf-8', 'surrogatepass'))
+        pos += length
+
+    names = reader.array('i')
+    parents = reader.array('i')
+    out_offsets = reader.array('q')
+    targets = reader.array('i')
+    deptypes = reader.array('i')
+    assoc_attr_sets = reader.array('i')
+    set_offsets = reader.array('q')
+    set_keys = reader.array('i')
+    set_tags = reader.array('B')
+    set_payloads = reader.array('q')
+    list_offsets = reader.array('q')
+    list_tags = reader.array('B')
+    list_payloads = reader.array('q')
+    column_keys = reader.array('i')
+
+    def decode_scalar(tag: int, payload: int) -> str | int | float | bool:
+        if tag == _STR:
+            return strings[payload]
+        elif tag == _INT:
+            return payload
+        elif tag == _FLOAT:
+            return _FLOAT_BITS.unpack(_INT_BITS.pack(payload))[0]
+        elif tag == _BOOL:
+            return bool(payload)
+        elif tag == _BIGINT:
+            return int(strings[payload])
+        raise SGraphBinaryFormatError(f'Invalid attribute value tag {tag}')
+
+    def decode_value(tag: int, payload: int):  # type: ignore # values of any supported type
+        if tag == _STR:
+            return strings[payload]
+        if tag == _LIST or tag == _SET:
+            items = [
+                decode_scalar(list_tags[i], list_payloads[i])
+                for i in range(list_offsets[payload], list_offsets[payload + 1])
+            ]
+            return items if tag == _LIST else set(items)
+        return decode_scalar(tag, payload)
+
+    with gc_paused():
+        root = SElement(None, strings[names[0]])
+        elements: list[SElement] = [root]
+        for i in range(1, len(names)):
+            elements.append(SElement(elements[parents[i]], strings[names[i]]))
+
+        for key_index in column_keys:
+            key = strings[key_index]
+            indices = reader.array('i')
+            tags = reader.array('B')
+            payloads = reader.array('q')
+            for index, tag, payload in zip(indices, tags, payloads):
+                elements[index].attrs[key] = decode_value(tag, payload)
+
+        attr_sets: list[dict[str, str | int | list[str]]] = []
+        for set_id in range(len(set_offsets) - 1):
+            attr_sets.append({
+                strings[set_keys[i]]: decode_value(set_tags[i], set_payloads[i])
+                for i in range(set_offsets[set_id], set_offsets[set_id + 1])
+            })
+
+        for index, elem in enumerate(elements):
+            for j in range(out_offsets[index], out_offsets[index + 1]):
+                set_id = assoc_attr_sets[j]
+                attrs = attr_sets[set_id] if set_id >= 0 else None
+                association = SElementAssociation(elem, elements[targets[j]],
+                                                  strings[deptypes[j]], attrs)
+                association.initElems()
+
+    graph = SGraph(root)
+    graph.modelAttrs = meta['modelAttrs']
+    graph.metaAttrs = meta['metaAttrs']
+    graph.propagateActions = [tuple(x) for x in meta['propagateActions']]  # type: ignore
+    return graph
+
+
+def save_binary(graph: SGraph, filename: str):
+    with open(filename, 'wb') as f:
+        f.write(dumps(graph))
+
+
+def load_binary(filename: str) -> SGraph:
+    with open(filename, 'rb') as f:
+        return loads(f.read())
+
+
+def _put_bytes(chunks: list[bytes], data: bytes):
+    chunks.append(_COUNT.pack(len(data)))
+    chunks.append(data)
+
+
+def _put_array(chunks: list[bytes], arr: array):
+    if _SWAP_BYTES:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    chunks.append(_COUNT.pack(len(arr)))
+    chunks.append(arr.tobytes())
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def _take(self, size: int) -> memoryview:
+        if self.pos + size > len(self.data):
+            raise SGraphBinaryFormatError('Truncated sgraph binary model file')
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def header(self) -> tuple[bytes, int, int]:
+        return _HEADER.unpack(self._take(_HEADER.size))
+
+    def count(self) -> int:
+        return _COUNT.unpack(self._take(_COUNT.size))[0]
+
+    def bytes(self) -> bytes:
+        return self._take(self.count()).tobytes()
+
+    def array(self, typecode: str) -> array:
+        arr = array(typecode)
+        arr.frombytes(self._take(self.count() * arr.itemsize))
+        if _SWAP_BYTES:
+            arr.byteswap()
+        return arr
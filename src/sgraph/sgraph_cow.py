@@ -0,0 +1,178 @@
+"""
+Copy-on-write clone of a model (SGraph.cow_clone()).
+
+The clone starts as a lazy copy of the root element only, so cloning takes constant time
+regardless of the model size. Elements of the clone copy their parts from the original element
+on first access, in two groups:
+
+ - children, childrenDict and attrs: the children become lazy copies of the original children
+   and the attribute dict is copied
+ - outgoing, incoming and _incoming_index: the associations are copied once and shared by both
+   of their clone elements, creating the clone elements of the other ends as needed
+
+Lazy elements are SElement subclasses with the same slots, and become plain SElements when
+both groups have been copied, so the parts of the model that are used cost the same as in any
+other model. Parts that are never accessed are never copied.
+
+ what_if = graph.cow_clone()
+ what_if.findElementFromPath('/org/repo/src/legacy').remove()
+
+The untouched parts of the clone are read from the original on first access, so the original
+must not be modified while the clone is in use. Use SGraph.clone() for an eager, independent
+copy, which is also faster when most of the model is going to be used.
+"""
+from __future__ import annotations
+
+from copy import copy
+
+from .selement import SElement
+from .selementassociation import SElementAssociation
+from .sgraph import SGraph
+
+# The slots of SElement, for reading and writing them below the properties of lazy elements.
+_CHILDREN = SElement.__dict__['children']
+_CHILDREN_DICT = SElement.__dict__['childrenDict']
+_ATTRS = SElement.__dict__['attrs']
+_OUTGOING = SElement.__dict__['outgoing']
+_INCOMING = SElement.__dict__['incoming']
+_INCOMING_INDEX = SElement.__dict__['_incoming_index']
+
+
+class _CowContext:
+    """The clones of the original elements and associations that have been created."""
+
+    def __init__(self):
+        self.elements: dict[SElement, SElement] = {}
+        self.associations: dict[SElementAssociation, SElementAssociation] = {}
+
+    def element(self, original: SElement) -> SElement:
+        clone = self.elements.get(original)
+        if clone is not None:
+            return clone
+        # Find the closest ancestor with a clone, then copy the children down from it.
+        path = [original]
+        ancestor = original.parent
+        while ancestor is not None and ancestor not in self.elements:
+            path.append(ancestor)
+            ancestor = ancestor.parent
+        if ancestor is None:
+            # Outside of the cloned tree, e.g. a detached element.
+            top = path.pop()
+            self.elements[top] = _new_lazy_element(self, top, None)
+        for elem in reversed(path):
+            # Copying the children of the parent creates the clone of elem.
+            _ = self.elements[elem.parent].children  # type: ignore
+        return self.elements[original]
+
+    def association(self, original: SElementAssociation) -> SElementAssociation:
+        clone = self.associations.get(original)
+        if clone is None:
+            elements = self.elements
+            from_element = elements.get(original.fromElement) or self.element(
+                original.fromElement)
+            to_element = elements.get(original.toElement) or self.element(original.toElement)
+            clone = SElementAssociation(from_element, to_element, original.deptype,
+                                        original.attrs.copy())
+            self.associations[original] = clone
+        return clone
+
+
+def _new_lazy_element(context: _CowContext, original: SElement,
+                      parent: SElement | None) -> SElement:
+    elem = _LazyElement.__new__(_LazyElement)
+    elem.name = original.name
+    elem.parent = parent
+    elem.human_readable_name = original.human_readable_name
+    elem._path_index = None
+    elem._hierarchy_index = None
+    # Until the children are copied, their slot holds the state of the lazy element.
+    _CHILDREN.__set__(elem, (context, original))
+    context.elements[original] = elem
+    return elem
+
+
+def _copy_tree(elem: SElement):
+    """Copy children, childrenDict and attrs of a _LazyElement or _LazyTree."""
+    context, original = _CHILDREN.__get__(elem)
+    children = [_new_lazy_element(context, child, elem) for child in original.children]
+    children_dict = {name: context.elements[child]
+                     for name, child in original.childrenDict.items()
+                     if child in context.elements}
+    _CHILDREN.__set__(elem, children)
+    _CHILDREN_DICT.__set__(elem, children_dict)
+    _ATTRS.__set__(elem, original.attrs.copy())
+    if type(elem) is _LazyElement:
+        # The associations are still to be copied, their slot holds the state from now on.
+        _OUTGOING.__set__(elem, (context, original))
+        elem.__class__ = _LazyAssociations
+    else:
+        elem.__class__ = SElement
+
+
+def _copy_associations(elem: SElement):
+    """Copy outgoing, incoming and _incoming_index of a _LazyElement or _LazyAssociations."""
+    if type(elem) is _LazyElement:
+        context, original = _CHILDREN.__get__(elem)
+    else:
+        context, original = _OUTGOING.__get__(elem)
+    # Copying the associations can copy the children of this element, when a child is at the
+    # other end of an association, so the class is checked again below.
+    associations = context.associations
+    outgoing = [associations.get(x) or context.association(x) for x in original.outgoing]
+    incoming = [associations.get(x) or context.association(x) for x in original.incoming]
+    _OUTGOING.__set__(elem, outgoing)
+    _INCOMING.__set__(elem, incoming)
+    _INCOMING_INDEX.__set__(elem, {(id(x.fromElement), x.deptype): x for x in incoming})
+    elem.__class__ = _LazyTree if type(elem) is _LazyElement else SElement
+
+
+def _property(slot, copy_part) -> property:
+
+    def get(elem):
+        copy_part(elem)
+        return slot.__get__(elem)
+
+    def set(elem, value):
+        copy_part(elem)
+        slot.__set__(elem, value)
+
+    return property(get, set)
+
+
+class _LazyElement(SElement):
+    """An element of which nothing has been copied yet."""
+    __slots__ = ()
+    children = _property(_CHILDREN, _copy_tree)  # type: ignore
+    childrenDict = _property(_CHILDREN_DICT, _copy_tree)  # type: ignore
+    attrs = _property(_ATTRS, _copy_tree)  # type: ignore
+    outgoing = _property(_OUTGOING, _copy_associations)  # type: ignore
+    incoming = _property(_INCOMING, _copy_associations)  # type: ignore
+    _incoming_index = _property(_INCOMING_INDEX, _copy_associations)  # type: ignore
+
+
+class _LazyTree(SElement):
+    """An element of which the associations have been copied."""
+    __slots__ = ()
+    children = _property(_CHILDREN, _copy_tree)  # type: ignore
+    childrenDict = _property(_CHILDREN_DICT, _copy_tree)  # type: ignore
+    attrs = _property(_ATTRS, _copy_tree)  # type: ignore
+
+
+class _LazyAssociations(SElement):
+    """An element of which the children and attributes have been copied."""
+    __slots__ = ()
+    outgoing = _property(_OUTGOING, _copy_associations)  # type: ignore
+    incoming = _property(_INCOMING, _copy_associations)  # type: ignore
+    _incoming_index = _property(_INCOMING_INDEX, _copy_associations)  # type: ignore
+
+
+def cow_clone(graph: SGraph) -> SGraph:
+    context = _CowContext()
+    result = SGraph(context.element(graph.rootNode))
+    result.metaAttrs = copy(graph.metaAttrs)
+    result.modelAttrs = copy(graph.modelAttrs)
+    result.propagateActions = copy(graph.propagateActions)
+    result.stringTable = graph.stringTable
+    if graph.totalModel:
+        result.totalModel = result if graph.totalModel is graph else cow_clone(graph.totalModel)
+    return result
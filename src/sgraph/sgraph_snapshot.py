@@ -0,0 +1,140 @@
+"""
+Read-only, array-backed snapshot of a model for analyses (SGraph.freeze()).
+
+Elements get dense integer ids in pre-order, with the root at id 0, so that the descendants of
+element i are the ids from i + 1 to subtree_ends[i] - 1. Associations are stored in CSR form
+both ways: the outgoing associations of element i are at out_offsets[i]:out_offsets[i + 1] in
+out_targets and out_deptypes, and the incoming ones at in_offsets[i]:in_offsets[i + 1] in
+in_sources and in_deptypes. Names and deptypes are codes to the names and deptypes tables.
+
+The arrays support the buffer protocol, so they can be wrapped without copying, e.g. with
+numpy.frombuffer(snapshot.out_targets, dtype=numpy.int32).
+
+ snapshot = graph.freeze()
+ for i in snapshot.descendants(snapshot.id_of(elem)):
+     ...
+
+The snapshot does not follow later changes to the model.
+
+Of the analyses in the package, only calculate_page_rank can use a snapshot, when it is given
+one. The query evaluator, SGraphMetrics and the Cypher index still walk the element objects.
+"""
+from __future__ import annotations
+
+import sys
+from array import array
+from collections.abc import Iterator
+
+from .selement import SElement
+from .sgraph import SGraph
+
+
+class SGraphSnapshot:
+    __slots__ = ('elements', 'parents', 'subtree_ends', 'names', 'name_codes', 'deptypes',
+                 'out_offsets', 'out_targets', 'out_deptypes', 'in_offsets', 'in_sources',
+                 'in_deptypes', '_ids')
+
+    def __init__(self, graph: SGraph):
+        elements: list[SElement] = []
+        ids: dict[SElement, int] = {}
+        parents = array('i')
+        subtree_ends = array('i')
+        # Pre-order walk; negative entries close the subtree of element -entry - 1.
+        stack: list[tuple[SElement, int] | int] = [(graph.rootNode, -1)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, int):
+                subtree_ends[-item - 1] = len(elements)
+                continue
+            elem, parent_id = item
+            index = len(elements)
+            ids[elem] = index
+            elements.append(elem)
+            parents.append(parent_id)
+            subtree_ends.append(0)
+            stack.append(-index - 1)
+            for child in reversed(elem.children):
+                stack.append((child, index))
+
+        name_table: dict[str, int] = {}
+        name_codes = array('i', [name_table.setdefault(e.name, len(name_table))
+                                 for e in elements])
+
+        deptype_table: dict[str, int] = {}
+        out_offsets = array('i', [0])
+        out_targets = array('i')
+        out_deptypes = array('i')
+        for elem in elements:
+            for association in elem.outgoing:
+                target = ids.get(association.toElement)
+                if target is None:
+                    sys.stderr.write(f'Association target {association.toElement.getPath()} of '
+                                     f'{elem.getPath()} is not in the model, skipping\n')
+                    continue
+                out_targets.append(target)
+                out_deptypes.append(deptype_table.setdefault(association.deptype,
+                                                             len(deptype_table)))
+            out_offsets.append(len(out_targets))
+
+        # Incoming CSR by counting sort of the outgoing one, sources in ascending id order.
+        count = len(elements)
+        in_counts = [0] * (count + 1)
+        for target in out_targets:
+            in_counts[target + 1] += 1
+        for i in range(count):
+            in_counts[i + 1] += in_counts[i]
+        in_offsets = array('i', in_counts)
+        in_sources = array('i', bytes(4 * len(out_targets)))
+        in_deptypes = array('i', bytes(4 * len(out_targets)))
+        for source in range(count):
+            for j in range(out_offsets[source], out_offsets[source + 1]):
+                target = out_targets[j]
+                pos = in_counts[target]
+                in_counts[target] = pos + 1
+                in_sources[pos] = source
+                in_deptypes[pos] = out_deptypes[j]
+
+        self.elements = elements
+        self.parents = parents
+        self.subtree_ends = subtree_ends
+        self.names = list(name_table)
+        self.name_codes = name_codes
+        self.deptypes = list(deptype_table)
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.out_deptypes = out_deptypes
+        self.in_offsets = in_offsets
+        self.in_sources = in_sources
+        self.in_deptypes = in_deptypes
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def id_of(self, elem: SElement) -> int:
+        """Return the id of the element, raising KeyError if it is not in the snapshot."""
+        return self._ids[elem]
+
+    def element(self, i: int) -> SElement:
+        return self.elements[i]
+
+    def name(self, i: int) -> str:
+        return self.names[self.name_codes[i]]
+
+    def outgoing(self, i: int) -> Iterator[tuple[int, str]]:
+        """Yield (target id, deptype) of the outgoing associations of element i."""
+        deptypes = self.deptypes
+        for j in range(self.out_offsets[i], self.out_offsets[i + 1]):
+            yield self.out_targets[j], deptypes[self.out_deptypes[j]]
+
+    def incoming(self, i: int) -> Iterator[tuple[int, str]]:
+        """Yield (source id, deptype) of the incoming associations of element i."""
+        deptypes = self.deptypes
+        for j in range(self.in_offsets[i], self.in_offsets[i + 1]):
+            yield self.in_sources[j], deptypes[self.in_deptypes[j]]
+
+    def descendants(self, i: int) -> range:
+        return range(i + 1, self.subtree_ends[i])
+
+    def is_descendant(self, i: int, ancestor: int) -> bool:
+        return ancestor < i < self.subtree_ends[ancestor]
@@ -1,3 +1,6 @@
+import gc
+from contextlib import contextmanager
+
 from .selement import SElement
 from .sgraph import SElementAssociation
 
@@ -5,13 +8,16 @@ from .sgraph import SElementAssociation
 # This file cannot have much type annotations because of circular deps.
 
 
-def add_ea(deptype: str, info: str | None, id1: str, id2: str, model) -> SElementAssociation:
+def add_ea(deptype: str, info: str | None, id1: str, id2: str, model,
+           path_cache=None) -> SElementAssociation:
+    get_or_create = model.createOrGetElementFromPath if path_cache is None else \
+        path_cache.get_or_create
     e1 = None
     if not id1.startswith('generate dependency'):
-        e1: SElement = model.createOrGetElementFromPath(id1)
+        e1: SElement = get_or_create(id1)
     e2 = None
     if not id2.startswith('generate dependency'):
-        e2: SElement = model.createOrGetElementFromPath(id2)
+        e2: SElement = get_or_create(id2)
 
     if e1 is None or e2 is None:
         raise ValueError(
@@ -47,3 +53,310 @@ def find_assocs_between(e_orig: SElement, e: SElement, elems: list[SElement]) ->
 
 class ParsingIntentionallyAborted(Exception):
     pass
+
+
+@contextmanager
+def gc_paused():
+    """Pause cyclic garbage collection, e.g. while building a large model.
+
+    Model construction only allocates objects that stay alive, so collection passes over the
+    growing object graph are pure overhead.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+class PathFilter:
+    """Path prefix include/exclude rules that can be evaluated one path component at a time.
+
+    An element is accepted when it is on or under one of the include paths (or when there are
+    no include paths) and it is not on or under any of the exclude paths. Ancestors of the
+    include paths are accepted too, so the included subtrees keep their place in the hierarchy.
+
+    Walking down the hierarchy, child_state(state, name) returns the state for the child or
+    None when the child and its whole subtree are rejected. Start with root_state().
+    """
+    _END = None  # trie key marking the end of a path, never an element name
+
+    def __init__(self, include_paths: list[str] | None, exclude_paths: list[str] | None):
+        self.include_trie = PathFilter._build_trie(include_paths) if include_paths else None
+        self.exclude_trie = PathFilter._build_trie(exclude_paths) if exclude_paths else None
+
+    @staticmethod
+    def _build_trie(paths: list[str]) -> dict:
+        trie: dict = {}
+        for path in paths:
+            node = trie
+            for name in path.strip('/').split('/'):
+                node = node.setdefault(name, {})
+            node[PathFilter._END] = True
+        return trie
+
+    def root_state(self) -> tuple[dict | None, dict | None]:
+        return self.include_trie, self.exclude_trie
+
+    def child_state(self, state: tuple[dict | None, dict | None],
+                    name: str) -> tuple[dict | None, dict | None] | None:
+        include_node, exclude_node = state
+        if include_node is not None:
+            include_node = include_node.get(name)
+            if include_node is None:
+                return None
+            if PathFilter._END in include_node:
+                include_node = None
+        if exclude_node is not None:
+            exclude_node = exclude_node.get(name)
+            if exclude_node is not None and PathFilter._END in exclude_node:
+                return None
+        return include_node, exclude_node
+
+    def accepts(self, path: str) -> bool:
+        state = self.root_state()
+        for name in path.strip('/').split('/'):
+            state = self.child_state(state, name)
+            if state is None:
+                return False
+        return True
+
+
+class StringTable:
+    """Model-scoped string interning for element names, attribute names and attribute values.
+
+    Equal strings returned by the table are the same object, so they are stored once and
+    compared by identity first. Attribute values are interned per attribute name until the
+    attribute has max_values distinct values, after which only those values are shared: the
+    attributes with high cardinality, e.g. hashes or descriptions, do not fill the table.
+    """
+
+    def __init__(self, max_values: int = 4096):
+        self.max_values = max_values
+        self.strings: dict[str, str] = {}
+        self.values: dict[str, dict[str, str]] = {}
+
+    def __len__(self):
+        return len(self.strings) + sum(len(x) for x in self.values.values())
+
+    def intern(self, s: str) -> str:
+        """Return the table's string equal to s, adding s if there is none. For names and
+        attribute names."""
+        return self.strings.setdefault(s, s)
+
+    def value(self, name: str, v):
+        """Return the table's value of attribute name that is equal to v, if v is a string of
+        a low-cardinality attribute. Other values are returned as they are."""
+        if type(v) is not str:
+            return v
+        values = self.values.get(name)
+        if values is None:
+            values = self.values[name] = {}
+        interned = values.get(v)
+        if interned is not None:
+            return interned
+        if len(values) < self.max_values:
+            values[v] = v
+        return v
+
+    def attrs(self, attrs: dict) -> dict:
+        """Return a copy of the attribute dict with the names and values interned."""
+        return {self.intern(k): self.value(k, v) for k, v in attrs.items()}
+
+
+class ElementPathCache:
+    """Creates or gets elements of a model by path like model.createOrGetElementFromPath, but
+    remembers the recently resolved paths and their prefixes. Consecutive lines of model files
+    tend to share long path prefixes, so most lookups only walk the last path component.
+
+    The cache holds at most max_size paths in two generations: when the current generation is
+    full, it replaces the previous one, and paths found in the previous generation are moved to
+    the current one. The cache must not be used after elements have been removed from the model.
+    """
+
+    def __init__(self, model, max_size: int = 131072):
+        self.model = model
+        self.generation_size = max(max_size // 2, 1)
+        self.elements: dict[str, SElement] = {}
+        self.previous: dict[str, SElement] = {}
+
+    def _get(self, path: str) -> SElement | None:
+        elem = self.elements.get(path)
+        if elem is None:
+            elem = self.previous.get(path)
+            if elem is not None:
+                self._put(path, elem)
+        return elem
+
+    def _put(self, path: str, elem: SElement):
+        if len(self.elements) >= self.generation_size:
+            self.previous = self.elements
+            self.elements = {}
+        self.elements[path] = elem
+
+    def get_or_create(self, path: str) -> SElement:
+        if path.startswith('/'):
+            path = path[1:]
+        elem = self.elements.get(path)
+        if elem is not None:
+            return elem
+        elem = self._get(path)
+        if elem is not None:
+            return elem
+        if not path or path[0] == '/' or path[-1] == '/' or '//' in path:
+            # Empty path components have special handling, leave those to the model.
+            return self.model.createOrGetElementFromPath(path)
+
+        # Find the longest cached prefix, then walk down from it.
+        parent = None
+        end = len(path)
+        while parent is None:
+            end = path.rfind('/', 0, end)
+            if end == -1:
+                parent = self.model.rootNode
+            else:
+                parent = self._get(path[:end])
+        pos = end + 1
+        while True:
+            next_pos = path.find('/', pos)
+            name = path[pos:] if next_pos == -1 else path[pos:next_pos]
+            elem = parent.childrenDict.get(name)
+            if elem is None:
+                elem = SElement(parent, name)
+            if next_pos == -1:
+                self._put(path, elem)
+                return elem
+            self._put(path[:next_pos], elem)
+            parent = elem
+            pos = next_pos + 1
+
+
+class PathCursor:
+    """Creates or gets elements of a model by path like model.createOrGetElementFromPath,
+    starting from the deepest element shared with the previous path. When the paths come in
+    sorted order, as in attribute files, consecutive paths are mostly siblings or children of
+    the previous one, so most lookups are a single child lookup, and no index of the model is
+    needed.
+
+    The cursor must not be used after elements on the previous path have been removed from the
+    model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        # The previous path, without the leading slash, and its parent path
+        self.path = ''
+        self.parent_path = ''
+        # The names of the previous path, and elements[i] is the element of the first i names.
+        self.names: list[str] = []
+        self.elements: list[SElement] = [model.rootNode]
+
+    def get_or_create(self, path: str) -> SElement:
+        if path.startswith('/'):
+            path = path[1:]
+        cut = path.rfind('/')
+        name = path[cut + 1:]
+        if name and cut != 0 and self.names:
+            parent_path = path[:cut] if cut != -1 else ''
+            if parent_path == self.parent_path:
+                # A sibling of the previous element
+                parent = self.elements[-2]
+                elem = parent.childrenDict.get(name) or SElement(parent, name)
+                self.names[-1] = name
+                self.elements[-1] = elem
+                self.path = path
+                return elem
+            if parent_path == self.path:
+                # A child of the previous element
+                parent = self.elements[-1]
+                elem = parent.childrenDict.get(name) or SElement(parent, name)
+                self.names.append(name)
+                self.elements.append(elem)
+                self.parent_path = parent_path
+                self.path = path
+                return elem
+        return self.__walk(path)
+
+    def __walk(self, path: str) -> SElement:
+        if not path or path[0] == '/' or path[-1] == '/' or '//' in path:
+            # Empty path components have special handling, leave those to the model.
+            return self.model.createOrGetElementFromPath(path)
+        names = path.split('/')
+        previous = self.names
+        elements = self.elements
+        common = 0
+        limit = min(len(names), len(previous))
+        while common < limit and names[common] == previous[common]:
+            common += 1
+        del elements[common + 1:]
+        elem = elements[common]
+        for name in names[common:]:
+            elem = elem.childrenDict.get(name) or SElement(elem, name)
+            elements.append(elem)
+        self.names = names
+        self.path = path
+        cut = path.rfind('/')
+        self.parent_path = path[:cut] if cut != -1 else ''
+        return elem
+
+
+class PathIndex:
+    """Path to element index of a model, see SGraph.enable_path_index.
+
+    Paths are like SElement.getPath() but ignore the name of the root, e.g. '/a/b'. The index
+    is attached to every indexed element and SElement keeps it current when elements are
+    created, added, detached, removed or renamed through its methods. Changes made by editing
+    name, children or childrenDict directly are not seen.
+    """
+
+    def __init__(self, root: SElement):
+        self.root = root
+        self.elements: dict[str, SElement] = {}
+        self.paths: dict[SElement, str] = {}
+        self.paths[root] = ''
+        root._path_index = self
+        for child in root.children:
+            self.add_subtree(child)
+
+    def add_subtree(self, elem: SElement):
+        elements = self.elements
+        paths = self.paths
+        stack = [(elem, paths[elem.parent] + '/' + elem.name)]
+        while stack:
+            elem, path = stack.pop()
+            elem._path_index = self
+            elements[path] = elem
+            paths[elem] = path
+            for child in elem.children:
+                stack.append((child, path + '/' + child.name))
+
+    def discard_subtree(self, elem: SElement):
+        elements = self.elements
+        paths = self.paths
+        stack = [elem]
+        while stack:
+            elem = stack.pop()
+            elem._path_index = None
+            path = paths.pop(elem, None)
+            if path is not None and elements.get(path) is elem:
+                del elements[path]
+            stack.extend(elem.children)
+
+    def close(self):
+        """Detach the index from the elements, after which it is no longer kept current."""
+        for elem in self.paths:
+            elem._path_index = None
+        self.elements.clear()
+        self.paths.clear()
+
+    @staticmethod
+    def key(path: str) -> str | None:
+        """Return the index key of the path as given to findElementFromPath, or None if the path
+        has empty components, which the path walk handles in its own way."""
+        if not path.startswith('/'):
+            path = '/' + path
+        if path.endswith('/') or '//' in path:
+            return None
+        return path
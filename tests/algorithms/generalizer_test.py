@@ -1,3 +1,4 @@
+import os
 from typing import Optional
 
 from sgraph import SGraph
@@ -43,3 +44,42 @@ def test_basic_2():
         assert ['/Servers/Linux', '/Servers/Solaris'] == sorted(paths)
 
 
+
+
+def _generalized_signature(model: SGraph):
+    signature = []
+
+    def visit(elem: SElement):
+        signature.append((elem.getPath(), sorted(elem.attrs.items(), key=str),
+                          sorted((ea.toElement.getPath(), ea.deptype,
+                                  sorted(ea.attrs.items(), key=str)) for ea in elem.outgoing),
+                          sorted((ea.fromElement.getPath(), ea.deptype) for ea in elem.incoming)))
+
+    model.rootNode.traverseElements(visit)
+    return signature
+
+
+def test_parse_with_max_level_matches_generalize_model():
+    filename = os.path.join(os.path.dirname(__file__), '..', 'modelfile.xml')
+    for level in (1, 2, 3):
+        for have_element_attrs, have_assoc_attrs in ((True, False), (False, True)):
+            expected = generalize_model(SGraph.parse_xml_or_zipped_xml(filename), level,
+                                        have_element_attrs, have_assoc_attrs)
+            model = SGraph.parse_xml_or_zipped_xml(filename, max_level=level,
+                                                   have_element_attrs=have_element_attrs,
+                                                   have_assoc_attrs=have_assoc_attrs)
+            assert _generalized_signature(model) == _generalized_signature(expected)
+
+
+def test_parse_with_max_level_merges_dependencies():
+    xml = ('<model version="2.1"><elements>'
+           '<e n="a"><e n="x"><r r="3" t="inc" /></e><e n="y"><r r="3,4" t="call" /></e></e>'
+           '<e n="b" i="2"><e n="z" i="3" /><e n="w" i="4"><r r="2" t="use" /></e></e>'
+           '</elements></model>')
+    model = SGraph.parse_xml_string(xml, max_level=1)
+    a = model.findElementFromPath('/a')
+    assert a.children == []
+    assert [(ea.toElement.name, ea.deptype, ea.attrs['dep_count']) for ea in a.outgoing] == [
+        ('b', 'mixed', 3)
+    ]
+    assert model.findElementFromPath('/b').outgoing == []
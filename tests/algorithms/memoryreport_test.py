@@ -0,0 +1,37 @@
+import json
+import os
+
+from sgraph import SElementAssociation, SGraph
+from sgraph.algorithms.memoryreport import CATEGORIES, MemoryReport
+
+MODELFILE = os.path.join(os.path.dirname(__file__), '..', 'modelfile.xml')
+
+
+def test_memory_report():
+    graph = SGraph()
+    a = graph.createOrGetElementFromPath('/repo/a.py')
+    b = graph.createOrGetElementFromPath('/repo/b.py')
+    graph.createOrGetElementFromPath('/other')
+    a.addAttribute('license', ''.join(['M', 'IT']))
+    b.addAttribute('license', ''.join(['M', 'IT']))
+    a.setType('file')
+    SElementAssociation(a, b, 'import').initElems()
+
+    report = MemoryReport(graph)
+    assert report.element_count == 4
+    assert report.association_count == 1
+    assert set(report.bytes) == set(CATEGORIES) and all(report.bytes.values())
+    assert report.attribute_keys == {'license': 2, 'type': 1}
+    assert report.attribute_values['license'] == {'MIT'}
+    assert report.duplicate_strings == 1
+    assert set(report.subtree_bytes) == {'repo', 'other'}
+    assert report.subtree_bytes['repo'] > report.subtree_bytes['other']
+    assert sum(report.subtree_bytes.values()) < report.total_bytes
+
+
+def test_memory_report_output():
+    report = MemoryReport(SGraph.parse_xml_or_zipped_xml(MODELFILE))
+    assert 'MODEL MEMORY' in report.format()
+    data = json.loads(json.dumps(report.as_dict(top=2)))
+    assert data['total_bytes'] == sum(data['bytes'].values())
+    assert len(data['attributes']) == 2 and len(data['subtrees']) == 2
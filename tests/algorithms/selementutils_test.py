@@ -0,0 +1,56 @@
+import os
+import random
+
+from sgraph import SElement, SGraph
+from sgraph.algorithms.selementutils import lowest_common_ancestor
+
+MODELFILE = os.path.join(os.path.dirname(__file__), '..', 'modelfile.xml')
+
+
+def _all_elements(graph):
+    elements = []
+    stack = [graph.rootNode]
+    while stack:
+        elements.append(stack.pop())
+        stack.extend(elements[-1].children)
+    return elements
+
+
+def test_hierarchy_index_matches_parent_walks():
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    elements = _all_elements(graph)
+    rng = random.Random(1)
+    pairs = [(rng.choice(elements), rng.choice(elements)) for _ in range(500)]
+    pairs += [(e, e.parent) for e in elements if e.parent is not None]
+    pairs += [(e, e) for e in elements]
+    levels = range(-1, 8)
+
+    def results():
+        return ([a.isDescendantOf(b) for a, b in pairs],
+                [lowest_common_ancestor(a, b) for a, b in pairs],
+                [e.getAncestorOfLevel(level) for e in elements for level in levels])
+
+    expected = results()
+    index = graph.build_hierarchy_index()
+    try:
+        assert results() == expected
+    finally:
+        index.invalidate()
+
+
+def test_hierarchy_index_is_invalidated_by_changes():
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    index = graph.build_hierarchy_index()
+    nginx_c = graph.findElementFromPath('/nginx/src/core/nginx.c')
+    core = nginx_c.parent
+    assert index.valid and nginx_c._hierarchy_index is index
+
+    new = SElement(core, 'new.c')
+    assert not index.valid
+    assert new.isDescendantOf(core)
+    assert lowest_common_ancestor(new, nginx_c) is core
+
+    index = graph.build_hierarchy_index()
+    core.parent.detachChild(core)
+    assert not index.valid
+    assert not nginx_c.isDescendantOf(graph.rootNode)
@@ -0,0 +1,76 @@
+import os
+import zipfile
+
+from sgraph import SElementAssociation, SGraph, graphdataservice
+from sgraph.graphdataservice import LoadedModelCache
+
+MODELFILE = os.path.join(os.path.dirname(__file__), 'modelfile.xml')
+
+
+def _add_model(output_dir, timestamp):
+    os.makedirs(output_dir / 'nginx' / timestamp)
+    with zipfile.ZipFile(output_dir / 'nginx' / timestamp / 'model.xml.zip', 'w') as zfile:
+        zfile.write(MODELFILE, 'modelfile.xml')
+
+
+def test_extract_and_load_caches_latest_model(tmp_path, monkeypatch):
+    cache = LoadedModelCache()
+    monkeypatch.setattr(graphdataservice, 'model_cache', cache)
+    _add_model(tmp_path, '20260101000000')
+    graph = graphdataservice.extract_and_load('nginx', str(tmp_path))
+    assert graphdataservice.extract_and_load('nginx', str(tmp_path)) is graph
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # Subgraphs of missing elements do not add them to the cached model.
+    subgraph = graphdataservice.extract_filtered_subgraph('nginx', str(tmp_path), '/nginx/x')
+    assert subgraph.findElementFromPath('/nginx/x') is not None
+    assert graph.findElementFromPath('/nginx/x') is None
+
+    _add_model(tmp_path, '20260102000000')
+    newer = graphdataservice.extract_and_load('nginx', str(tmp_path))
+    assert newer is not graph
+    assert cache.stats()['models'] == 1 and cache.stats()['invalidations'] == 1
+    assert graphdataservice.extract_and_load('nginx', str(tmp_path), use_cache=False) is not newer
+
+
+def test_subgraphs_do_not_change_cached_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(graphdataservice, 'model_cache', LoadedModelCache())
+    graph = SGraph()
+    a = graph.createOrGetElementFromPath('/nginx/src/a.c')
+    b = graph.createOrGetElementFromPath('/nginx/src/b.c')
+    c = graph.createOrGetElementFromPath('/other/c.c')
+    SElementAssociation.create_unique_element_association(a, b, 'inc', {'line': '1'})
+    SElementAssociation.create_unique_element_association(c, a, 'call', {'line': '2'})
+    os.makedirs(tmp_path / 'nginx' / '20260101000000')
+    graph.save(str(tmp_path / 'nginx' / '20260101000000' / 'model.xml.zip'))
+
+    def association_attrs(model):
+        return sorted((x.fromElement.getPath(), x.toElement.getPath(), dict(x.attrs))
+                      for e in model.rootNode.iter_preorder() for x in e.outgoing)
+
+    cached = graphdataservice.extract_and_load('nginx', str(tmp_path))
+    expected = association_attrs(cached)
+    for _ in range(2):
+        subgraph = graphdataservice.extract_filtered_subgraph('nginx', str(tmp_path), '/nginx')
+        assert association_attrs(subgraph) == expected
+        for elem in subgraph.rootNode.iter_preorder():
+            for association in elem.outgoing:
+                association.attrs['line'] = 'changed'
+        assert association_attrs(cached) == expected
+    assert graphdataservice.extract_and_load('nginx', str(tmp_path)) is cached
+
+
+def test_loaded_model_cache_eviction():
+    cache = LoadedModelCache(max_models=2)
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    for target in ('a', 'b', 'c'):
+        cache.put(('out', target, 'model.xml.zip', 1), graph)
+    assert cache.get(('out', 'a', 'model.xml.zip', 1)) is None
+    assert cache.get(('out', 'c', 'model.xml.zip', 1)) is graph
+    assert cache.stats()['evictions'] == 1
+
+    cache.max_bytes = 1
+    cache.put(('out', 'd', 'model.xml.zip', 1), graph)
+    # The latest model is kept even though it does not fit.
+    assert list(cache.models) == [('out', 'd', 'model.xml.zip', 1)]
+    assert cache.stats()['bytes'] == LoadedModelCache.estimate_bytes(graph)
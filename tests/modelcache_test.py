@@ -0,0 +1,81 @@
+import os
+import shutil
+
+from sgraph.loader import ModelCache, ModelLoader
+
+MODELFILE = os.path.join(os.path.dirname(__file__), 'modelfile.xml')
+
+
+def _model_root(tmp_path):
+    os.makedirs(tmp_path / 'model' / 'dependency')
+    filepath = str(tmp_path / 'model' / 'dependency' / 'modelfile.xml')
+    shutil.copy(MODELFILE, filepath)
+    with open(tmp_path / 'model' / 'attr_temporary.csv', 'w') as f:
+        f.write('id\tteam\n/nginx/src\tcore\n')
+    return filepath
+
+
+def test_load_model_from_cache(tmp_path):
+    filepath = _model_root(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    loaded = ModelLoader().load_model(filepath, cache_dir=cache_dir)
+    entries = os.listdir(cache_dir)
+    assert len(entries) == 1 and entries[0].endswith('.sgb')
+
+    cached = ModelLoader().load_model(filepath, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == entries
+    assert cached.produce_deps_tuples() == loaded.produce_deps_tuples()
+    assert cached.findElementFromPath('/nginx/src').attrs['team'] == 'core'
+
+    # Different options and changed attribute files are different entries.
+    ModelLoader().load_model(filepath, dep_types=[], cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    for _ in range(2):
+        interned = ModelLoader().load_model(filepath, intern=True, cache_dir=cache_dir)
+        assert interned.stringTable is not None
+    assert len(os.listdir(cache_dir)) == 3
+    with open(tmp_path / 'model' / 'attr_temporary.csv', 'w') as f:
+        f.write('id\tteam\n/nginx/src\tplatform\n')
+    reloaded = ModelLoader().load_model(filepath, cache_dir=cache_dir)
+    assert reloaded.findElementFromPath('/nginx/src').attrs['team'] == 'platform'
+    assert len(os.listdir(cache_dir)) == 4
+
+
+def test_model_cache_eviction_and_corrupt_entries(tmp_path):
+    model = ModelLoader().load_model(MODELFILE)
+    cache = ModelCache(str(tmp_path), max_bytes=1)
+    cache.put(ModelCache.key('a'), model)
+    # An entry larger than the limit is evicted right away.
+    assert cache.get(ModelCache.key('a')) is None
+
+    cache.max_bytes = 1 << 30
+    cache.put(ModelCache.key('b'), model)
+    assert cache.get(ModelCache.key('b')) is not None
+    with open(cache.entry_path(ModelCache.key('b')), 'rb') as f:
+        data = f.read()
+    # Truncated entries fail in different places of decoding, all are removed as unreadable.
+    for size in (0, 7, 20, len(data) // 2, len(data) - 1):
+        with open(cache.entry_path(ModelCache.key('b')), 'wb') as f:
+            f.write(data[:size])
+        assert cache.get(ModelCache.key('b')) is None
+        assert os.listdir(tmp_path) == []
+
+
+def test_model_cache_counts_and_removes_temporary_files(tmp_path):
+    model = ModelLoader().load_model(MODELFILE)
+    cache = ModelCache(str(tmp_path))
+    cache.put(ModelCache.key('a'), model)
+    entry_size = os.path.getsize(cache.entry_path(ModelCache.key('a')))
+    old = tmp_path / 'old.tmp'
+    old.write_bytes(b'x' * entry_size)
+    os.utime(old, (0, 0))
+    writing = tmp_path / 'writing.tmp'
+    writing.write_bytes(b'x' * entry_size)
+
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == sorted([ModelCache.key('a') + '.sgb', 'writing.tmp'])
+    # A temporary file being written counts toward the limit.
+    cache.max_bytes = 2 * entry_size - 1
+    cache.evict()
+    assert os.listdir(tmp_path) == ['writing.tmp']
@@ -0,0 +1,88 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from sgraph import ModelApi, SGraph
+from sgraph.loader.modelindex import ModelIndex, StaleModelIndexError
+
+MODELFILE = os.path.join(os.path.dirname(__file__), 'modelfile.xml')
+
+
+def _signature(graph):
+    signature = []
+
+    def visit(elem):
+        signature.append((elem.getPath(), sorted(elem.attrs.items()),
+                          sorted((a.toElement.getPath(), a.deptype) for a in elem.outgoing),
+                          sorted((a.fromElement.getPath(), a.deptype) for a in elem.incoming)))
+
+    graph.rootNode.traverseElements(visit)
+    return signature
+
+
+@pytest.mark.parametrize('zipped', [False, True])
+@pytest.mark.parametrize('depth', [1, 2, 10])
+def test_load_subgraph_matches_full_model(tmp_path, zipped, depth):
+    model_path = str(tmp_path / 'modelfile.xml')
+    shutil.copy(MODELFILE, model_path)
+    if zipped:
+        with zipfile.ZipFile(model_path + '.zip', 'w') as zfile:
+            zfile.write(model_path, 'modelfile.xml')
+        model_path += '.zip'
+    ModelIndex.build(model_path, depth).save()
+    index = ModelIndex.for_model(model_path, build=False)
+    assert index is not None
+
+    paths = []
+    SGraph.parse_xml_or_zipped_xml(model_path).rootNode.traverseElements(
+        lambda e: paths.append(e.getPath()))
+    for path in paths[1:] + ['/nginx/not-there']:
+        full = SGraph.parse_xml_or_zipped_xml(model_path)
+        expected = ModelApi.filter_model(full.createOrGetElementFromPath(path), full)
+        part = index.load_subgraph(path)
+        subgraph = ModelApi.filter_model(part.createOrGetElementFromPath(path), part)
+        assert _signature(subgraph) == _signature(expected), path
+
+
+def test_outdated_index(tmp_path):
+    model_path = str(tmp_path / 'modelfile.xml')
+    shutil.copy(MODELFILE, model_path)
+    ModelIndex.build(model_path).save()
+    with open(model_path, 'a') as f:
+        f.write('\n')
+    with pytest.raises(StaleModelIndexError):
+        ModelIndex.load(ModelIndex.index_path_for(model_path))
+    assert ModelIndex.for_model(model_path, build=False) is None
+    assert ModelIndex.for_model(model_path) is not None
+    assert ModelIndex.load(ModelIndex.index_path_for(model_path)) is not None
+
+
+def test_load_subgraph_reads_model_forward(tmp_path, monkeypatch):
+    from sgraph.loader import modelindex
+
+    model_path = str(tmp_path / 'modelfile.xml')
+    shutil.copy(MODELFILE, model_path)
+    with zipfile.ZipFile(model_path + '.zip', 'w') as zfile:
+        zfile.write(model_path, 'modelfile.xml')
+    model_path += '.zip'
+    index = ModelIndex.build(model_path, 3)
+
+    seeks = []
+    open_model = modelindex._open_model
+
+    def recording_open_model(path):
+        f = open_model(path)
+        seek = f.seek
+        f.seek = lambda offset, *args: seeks.append(offset) or seek(offset, *args)
+        return f
+
+    monkeypatch.setattr(modelindex, '_open_model', recording_open_model)
+    paths = []
+    SGraph.parse_xml_or_zipped_xml(model_path).rootNode.traverseElements(
+        lambda e: paths.append(e.getPath()))
+    for path in paths[1:]:
+        seeks.clear()
+        index.load_subgraph(path)
+        assert seeks and seeks == sorted(seeks), path
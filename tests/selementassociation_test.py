@@ -26,3 +26,44 @@ def test_attributes_are_combined():
         element1, element2, '',  {'attribute2': 'value2'})
     assert element1.outgoing[0].attrs == {'attribute1': 'value1',
                                           'attribute2': 'value2'}
+
+
+def test_deptypes_are_interned():
+    graph = SGraph.parse_xml_string(
+        '<model version="2.1"><elements>'
+        '<e n="a"><r r="2" t="' + 'im' + 'port" /><r r="3" t="import" /></e>'
+        '<e n="b" i="2" /><e n="c" i="3" /></elements></model>')
+    first, second = graph.findElementFromPath('/a').outgoing
+    assert first.deptype == 'import'
+    assert first.deptype is second.deptype
+    assert not hasattr(first, '__dict__')
+
+    element1 = graph.findElementFromPath('/b')
+    element2 = graph.findElementFromPath('/c')
+    association, _ = SElementAssociation.create_unique_element_association(
+        element1, element2, ''.join(['im', 'port']), {})
+    assert association.deptype is first.deptype
+
+
+def test_remove_associations_keeps_order_of_the_rest():
+    graph = SGraph()
+    hub = graph.createOrGetElementFromPath('/test/hub')
+    others = [graph.createOrGetElementFromPath(f'/test/e{i}') for i in range(10)]
+    outgoing = [SElementAssociation.create_unique_element_association(hub, e, 'call', {})[0]
+                for e in others]
+    incoming = [SElementAssociation.create_unique_element_association(e, hub, 'call', {})[0]
+                for e in others]
+
+    SElementAssociation.remove_associations(outgoing[::2] + incoming[1::2])
+    assert hub.outgoing == outgoing[1::2]
+    assert hub.incoming == incoming[::2]
+    assert not others[0].incoming and others[1].incoming == [outgoing[1]]
+    # The removed associations can be created again.
+    again, created = SElementAssociation.create_unique_element_association(
+        hub, others[0], 'call', {})
+    assert created and hub.outgoing[-1] is again
+
+    removed = graph.findElementFromPath('/test')
+    removed.removeDescendantsIf(lambda e: e.name in ('hub', 'e3'))
+    assert [c.name for c in removed.children] == [f'e{i}' for i in range(10) if i != 3]
+    assert all(not e.outgoing and not e.incoming for e in removed.children)
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from sgraph import SElement, SElementAssociation, SGraph
+from sgraph.sgraph_binary import SGraphBinaryFormatError, dumps, loads
+
+MODELFILE = os.path.join(os.path.dirname(__file__), 'modelfile.xml')
+
+
+def _model_signature(graph):
+    signature = []
+
+    def visit(elem):
+        signature.append((elem.getPath(), sorted(elem.attrs.items(), key=str),
+                          [(a.toElement.getPath(), a.deptype, sorted(a.attrs.items(), key=str))
+                           for a in elem.outgoing],
+                          [(a.fromElement.getPath(), a.deptype) for a in elem.incoming]))
+
+    graph.rootNode.traverseElements(visit)
+    return signature
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    filename = str(tmp_path / 'model.sgb')
+    graph.save(filename)
+    loaded = SGraph.load(filename)
+    assert _model_signature(loaded) == _model_signature(graph)
+    assert loaded.modelAttrs == graph.modelAttrs
+    assert loaded.produce_deps_tuples() == graph.produce_deps_tuples()
+
+
+@pytest.mark.parametrize('suffix', ['.xml', '.xml.zip'])
+def test_save_and_load_xml(tmp_path, suffix):
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    filename = str(tmp_path / ('model' + suffix))
+    graph.save(filename)
+    loaded = SGraph.load(filename)
+    # XML lists associations in another order, so the deps are compared as sorted lists.
+    for part, expected in zip(loaded.produce_deps_tuples(), graph.produce_deps_tuples()):
+        assert sorted(part, key=str) == sorted(expected, key=str)
+
+
+def test_attribute_value_types_are_kept():
+    graph = SGraph()
+    a = graph.createOrGetElementFromPath('/repo/a.py')
+    b = graph.createOrGetElementFromPath('/repo/b.py')
+    SElement(graph.rootNode, 'empty')
+    a.attrs.update({'loc': 10, 'ratio': 0.25, 'flag': True, 'langs': ['py', 3],
+                    'owners': {'x', 'y'}, 'huge': 2**70, 'name': 'ä\ud800',
+                    '_tmp_attr_x': 'dropped'})
+    shared = {'detail': 'line 1'}
+    SElementAssociation(a, b, 'import', shared).initElems()
+    SElementAssociation(b, a, 'call', shared).initElems()
+    graph.metaAttrs = {'loc': {'unit': 'lines'}}
+    graph.propagateActions = [('loc', 'sum')]
+
+    loaded = loads(dumps(graph))
+    loaded_a = loaded.findElementFromPath('/repo/a.py')
+    loaded_b = loaded.findElementFromPath('/repo/b.py')
+    assert loaded_a.attrs == {'loc': 10, 'ratio': 0.25, 'flag': True, 'langs': ['py', 3],
+                              'owners': {'x', 'y'}, 'huge': 2**70, 'name': 'ä\ud800'}
+    assert loaded.findElementFromPath('/empty') is not None
+    assert loaded_a.outgoing[0].attrs is loaded_b.outgoing[0].attrs
+    assert loaded_b.incoming[0].fromElement is loaded_a
+    assert loaded.metaAttrs == graph.metaAttrs
+    assert loaded.propagateActions == [('loc', 'sum')]
+
+
+def test_invalid_data():
+    with pytest.raises(SGraphBinaryFormatError):
+        loads(b'<model version="2.1"></model>')
+    with pytest.raises(SGraphBinaryFormatError):
+        loads(dumps(SGraph())[:-3])
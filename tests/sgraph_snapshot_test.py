@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from sgraph import SGraph
+from sgraph.algorithms.pagerank import calculate_page_rank
+
+MODELFILE = os.path.join(os.path.dirname(__file__), 'modelfile.xml')
+
+
+def test_freeze_matches_model():
+    graph = SGraph.parse_xml_or_zipped_xml(MODELFILE)
+    snapshot = graph.freeze()
+
+    assert snapshot.element(0) is graph.rootNode
+    assert snapshot.parents[0] == -1
+    for i, elem in enumerate(snapshot.elements):
+        assert snapshot.id_of(elem) == i
+        assert snapshot.name(i) == elem.name
+        if i:
+            assert snapshot.element(snapshot.parents[i]) is elem.parent
+        descendants = []
+        stack = list(elem.children)
+        while stack:
+            descendants.append(stack.pop())
+            stack.extend(descendants[-1].children)
+        assert sorted(snapshot.id_of(e) for e in descendants) == list(snapshot.descendants(i))
+        assert [(snapshot.element(t), deptype) for t, deptype in snapshot.outgoing(i)] == \
+            [(a.toElement, a.deptype) for a in elem.outgoing]
+        assert sorted((snapshot.element(s).getPath(), deptype)
+                      for s, deptype in snapshot.incoming(i)) == \
+            sorted((a.fromElement.getPath(), a.deptype) for a in elem.incoming)
+
+    nginx = snapshot.id_of(graph.findElementFromPath('/nginx'))
+    nginx_c = snapshot.id_of(graph.findElementFromPath('/nginx/src/core/nginx.c'))
+    assert snapshot.is_descendant(nginx_c, nginx)
+    assert not snapshot.is_descendant(nginx, nginx_c)
+    assert not snapshot.is_descendant(nginx, nginx)
+
+
+def test_page_rank_on_snapshot():
+    lines = ['/A:/B:', '/A:/C:', '/B:/C:', '/C:/A:', '/D/E:/A:']
+    expected = SGraph.parse_deps_lines(lines)
+    calculate_page_rank(expected)
+    graph = SGraph.parse_deps_lines(lines)
+    calculate_page_rank(graph, snapshot=graph.freeze())
+
+    for path in ['/A', '/B', '/C', '/D', '/D/E']:
+        assert graph.findElementFromPath(path).attrs['page_rank'] == \
+            pytest.approx(expected.findElementFromPath(path).attrs['page_rank'])
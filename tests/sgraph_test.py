@@ -3,6 +3,8 @@ import io
 import os
 from typing import Any
 
+import pytest
+
 from sgraph import SGraph
 from sgraph.loader import ModelLoader
 
@@ -29,6 +31,77 @@ def test_deepcopy():
     assert graph1.calculate_model_stats() == graph2.calculate_model_stats()
 
 
+def test_clone():
+    from sgraph import SElementAssociation
+
+    graph1 = get_model(MODELFILE)
+    graph2 = graph1.clone()
+    assert graph1.produce_deps_tuples() == graph2.produce_deps_tuples()
+    assert graph1.calculate_model_stats() == graph2.calculate_model_stats()
+    for elem1, elem2 in zip(graph1.rootNode.iter_preorder(), graph2.rootNode.iter_preorder()):
+        assert elem1 is not elem2 and elem1.getPath() == elem2.getPath()
+        assert elem1.attrs == elem2.attrs and elem1.attrs is not elem2.attrs
+        assert [x.fromElement.getPath() for x in elem1.incoming] == \
+            [x.fromElement.getPath() for x in elem2.incoming]
+
+    association = next(e for e in graph2.rootNode.iter_preorder() if e.outgoing).outgoing[0]
+    same, created = SElementAssociation.create_unique_element_association(
+        association.fromElement, association.toElement, association.deptype, {'x': 'y'})
+    assert same is association and not created
+    association.fromElement.setType('changed')
+    association.remove()
+    assert graph1.calculate_model_stats() != graph2.calculate_model_stats()
+    assert 'changed' not in [e.getType() for e in graph1.rootNode.iter_preorder()]
+
+
+def test_cow_clone():
+    from sgraph import SElement, SElementAssociation
+
+    graph1 = get_model(MODELFILE)
+    expected = graph1.clone()
+    graph2 = graph1.cow_clone()
+    assert type(graph2.rootNode) is not SElement
+    # Associations copy the elements at their other ends without copying the whole model.
+    elem2 = graph2.findElementFromPath('/nginx/src/core/nginx.c')
+    assert [x.toElement.getPath() for x in elem2.outgoing] == \
+        [x.toElement.getPath() for x in graph1.findElementFromPath(elem2.getPath()).outgoing]
+    assert type(graph2.findElementFromPath('/nginx/src/event')) is not SElement
+
+    assert graph1.produce_deps_tuples() == graph2.produce_deps_tuples()
+    assert graph1.calculate_model_stats() == graph2.calculate_model_stats()
+    for elem1, elem2 in zip(graph1.rootNode.iter_preorder(), graph2.rootNode.iter_preorder()):
+        assert elem1 is not elem2 and elem1.getPath() == elem2.getPath()
+        assert elem1.attrs == elem2.attrs and elem1.attrs is not elem2.attrs
+        assert [x.fromElement.getPath() for x in elem1.incoming] == \
+            [x.fromElement.getPath() for x in elem2.incoming]
+        for x in elem2.outgoing + elem2.incoming:
+            assert x in x.toElement.incoming and x in x.fromElement.outgoing
+
+    graph3 = graph1.cow_clone()
+    association = next(e for e in graph3.rootNode.iter_preorder() if e.outgoing).outgoing[0]
+    same, created = SElementAssociation.create_unique_element_association(
+        association.fromElement, association.toElement, association.deptype, {'x': 'y'})
+    assert same is association and not created
+    association.fromElement.setType('changed')
+    association.remove()
+    graph3.findElementFromPath('/nginx/src/core').remove()
+    SElement(graph3.findElementFromPath('/nginx/src'), 'new')
+    assert graph1.calculate_model_stats() == expected.calculate_model_stats()
+    assert graph1.produce_deps_tuples() == expected.produce_deps_tuples()
+    assert 'changed' not in [e.getType() for e in graph1.rootNode.iter_preorder()]
+    assert graph3.findElementFromPath('/nginx/src/new') is not None
+    assert graph3.findElementFromPath('/nginx/src/core') is None
+    assert graph1.findElementFromPath('/nginx/src/new') is None
+
+    # The clones of deep association targets are created without recursion.
+    deep = SGraph()
+    leaf = deep.createOrGetElementFromPath('/'.join(['d'] * 3000))
+    SElementAssociation.create_unique_element_association(leaf, deep.rootNode.children[0],
+                                                          'uses', {})
+    top = deep.cow_clone().rootNode.children[0]
+    assert top.incoming[0].fromElement.getLevel() == leaf.getLevel()
+
+
 def test_repr_empty_model():
     """Empty SGraph should produce a useful repr, not the default <object at 0x...>."""
     graph = SGraph()
@@ -151,3 +224,435 @@ def test_to_xml_strips_invalid_control_chars_and_roundtrips():
     # The visible content must survive intact.
     assert got.startswith('before')
     assert 'after<&"\'>' in got
+
+
+def test_parse_xml_resolves_forward_references():
+    xml = ('<model version="2.1"><elements>'
+           '<e n="a"><r r="2,3" t="inc" /></e>'
+           '<e n="b" i="2"><e n="c" i="3" /></e>'
+           '</elements></model>')
+    graph = SGraph.parse_xml_string(xml)
+    a = graph.findElementFromPath('/a')
+    b = graph.findElementFromPath('/b')
+    c = graph.findElementFromPath('/b/c')
+    assert [x.toElement for x in a.outgoing] == [b, c]
+    assert [x.fromElement for x in b.incoming] == [a]
+    assert [x.fromElement for x in c.incoming] == [a]
+
+
+def test_parse_xml_unknown_id_raises():
+    xml = ('<model version="2.1"><elements>'
+           '<e n="a"><r r="7" t="inc" /></e>'
+           '</elements></model>')
+    with pytest.raises(Exception, match='unknown id in input data: 7'):
+        SGraph.parse_xml_string(xml)
+
+
+def _model_signature(graph):
+    signature = []
+
+    def visit(elem):
+        signature.append((elem.getPath(), sorted(elem.attrs.items()),
+                          [(a.toElement.getPath(), a.deptype, sorted(a.attrs.items()))
+                           for a in elem.outgoing],
+                          [(a.fromElement.getPath(), a.deptype) for a in elem.incoming]))
+
+    graph.rootNode.traverseElements(visit)
+    return signature
+
+
+def test_xml_parser_backends_produce_identical_models(tmp_path):
+    import zipfile
+    filename = os.path.join(os.path.dirname(__file__), MODELFILE)
+    with open(filename) as f:
+        xml = f.read()
+    zipped = str(tmp_path / 'modelfile.xml.zip')
+    with zipfile.ZipFile(zipped, 'w') as zfile:
+        zfile.writestr('modelfile.xml', xml)
+
+    def parse_all(backend):
+        return [
+            SGraph.parse_xml_or_zipped_xml(filename, backend=backend),
+            SGraph.parse_xml_or_zipped_xml(zipped, backend=backend),
+            SGraph.parse_xml_file_or_stream(io.StringIO(xml), backend=backend),
+            SGraph.parse_xml_string(xml, ['IGNORE inc'], ['IGNORE someattribute'],
+                                    backend=backend),
+            SGraph.parse_xml_string(xml, only_root=True, backend=backend),
+        ]
+
+    expected = [_model_signature(g) for g in parse_all('sax')]
+    for backend in ('expat', 'lxml'):
+        assert [_model_signature(g) for g in parse_all(backend)] == expected
+
+
+def test_unknown_xml_parser_backend():
+    with pytest.raises(ValueError):
+        SGraph.parse_xml_string('<model><elements/></model>', backend='nope')
+
+
+FILTER_XML = ('<model version="2.1"><elements>'
+              '<e n="org"><e n="repo">'
+              '<e n="src" i="1"><e n="main.c" i="2"><r r="3,4,5" t="inc" /></e></e>'
+              '<e n="External" i="3"><e n="lib.h" i="4" /></e>'
+              '<e n="test" i="5" />'
+              '</e></e>'
+              '<e n="other" i="6"><r r="2" t="use" /></e>'
+              '</elements></model>')
+
+
+@pytest.mark.parametrize('backend', ['sax', 'expat', 'lxml'])
+def test_parse_xml_include_and_exclude_paths(backend):
+    graph = SGraph.parse_xml_string(FILTER_XML, backend=backend, include_paths=['/org/repo'],
+                                    exclude_paths=['/org/repo/External'])
+    assert graph.findElementFromPath('/org/repo/src/main.c') is not None
+    assert graph.findElementFromPath('/org/repo/test') is not None
+    assert graph.findElementFromPath('/org/repo/External') is None
+    assert graph.findElementFromPath('/other') is None
+    main_c = graph.findElementFromPath('/org/repo/src/main.c')
+    assert [a.toElement.getPath() for a in main_c.outgoing] == ['/org/repo/test']
+    assert main_c.incoming == []
+
+
+def test_parse_xml_stub_skipped_targets():
+    graph = SGraph.parse_xml_string(FILTER_XML, exclude_paths=['/org/repo/External'],
+                                    stub_skipped_targets=True)
+    main_c = graph.findElementFromPath('/org/repo/src/main.c')
+    assert [a.toElement.getPath() for a in main_c.outgoing] == [
+        '/org/repo/External', '/org/repo/External/lib.h', '/org/repo/test'
+    ]
+    assert [a.fromElement.getPath() for a in main_c.incoming] == ['/other']
+    assert graph.findElementFromPath('/org/repo/External/lib.h').incoming[0].fromElement \
+        is main_c
+
+
+def test_parse_xml_with_workers(tmp_path):
+    import zipfile
+    filename = os.path.join(os.path.dirname(__file__), MODELFILE)
+    zipped = str(tmp_path / 'modelfile.xml.zip')
+    with zipfile.ZipFile(zipped, 'w') as zfile:
+        zfile.write(filename, 'modelfile.xml')
+
+    for path in (filename, zipped):
+        expected = SGraph.parse_xml_or_zipped_xml(path)
+        assert len(expected.rootNode.children) > 2
+        graph = SGraph.parse_xml_or_zipped_xml(path, workers=2)
+        assert _model_signature(graph) == _model_signature(expected)
+
+    expected = SGraph.parse_xml_or_zipped_xml(filename, ['IGNORE inc'], max_level=2,
+                                              exclude_paths=['/foo'])
+    graph = SGraph.parse_xml_or_zipped_xml(filename, ['IGNORE inc'], max_level=2,
+                                           exclude_paths=['/foo'], workers=2, backend='expat')
+    assert _model_signature(graph) == _model_signature(expected)
+
+
+def test_to_xml_file_zip_and_deep_models(tmp_path):
+    from sgraph.selement import SElement
+
+    graph = SGraph.parse_xml_or_zipped_xml(os.path.join(os.path.dirname(__file__), MODELFILE))
+    xml = graph.to_xml(None, stdout=False)
+    assert xml is not None
+    plain = str(tmp_path / 'model.xml')
+    zipped = str(tmp_path / 'model.xml.zip')
+    graph.to_xml(plain)
+    graph.to_xml(zipped)
+    with open(plain, encoding='utf-8') as f:
+        assert f.read() == xml
+    expected = _model_signature(SGraph.parse_xml_string(xml))
+    for path in (plain, zipped):
+        assert _model_signature(SGraph.parse_xml_or_zipped_xml(path)) == expected
+
+    deep = SGraph()
+    elem = deep.rootNode
+    for i in range(3000):
+        elem = SElement(elem, f'level{i}')
+    deep.to_xml(plain)
+    parsed = SGraph.parse_xml_or_zipped_xml(plain)
+    elem = parsed.rootNode
+    for i in range(3000):
+        elem = elem.children[0]
+    assert elem.name == 'level2999' and not elem.children
+
+
+def test_to_xml_and_to_deps_with_workers(tmp_path):
+    graph = SGraph.parse_xml_or_zipped_xml(os.path.join(os.path.dirname(__file__), MODELFILE))
+    assert len(graph.rootNode.children) > 2
+
+    assert graph.to_xml(None, stdout=False, workers=2) == graph.to_xml(None, stdout=False)
+
+    serial = str(tmp_path / 'serial.txt')
+    parallel = str(tmp_path / 'parallel.txt')
+    graph.to_deps(serial)
+    graph.to_deps(parallel, workers=2)
+    with open(serial, encoding='utf-8') as f1, open(parallel, encoding='utf-8') as f2:
+        assert f1.read() == f2.read()
+
+
+def test_parse_deps_lines_from_iterator_with_path_cache():
+    from sgraph.sgraph_utils import ElementPathCache
+
+    lines = ['@/repo/src/a.py:type:file', '/repo/src/a.py:/repo/src/b.py:import',
+             '@@detail:x', '/repo/src/b.py:/repo/lib/c.py:call', '/repo/doc//readme',
+             '/repo/other/']
+    graph = SGraph.parse_deps_lines(iter(lines))
+    a = graph.findElementFromPath('/repo/src/a.py')
+    assert a.getType() == 'file'
+    assert [(x.toElement.getPath(), x.deptype, x.attrs) for x in a.outgoing] == \
+        [('/repo/src/b.py', 'import', {'detail': 'x'})]
+    assert graph.findElementFromPath('/repo/src/b.py').outgoing[0].toElement is \
+        graph.findElementFromPath('/repo/lib/c.py')
+
+    cache = ElementPathCache(graph, max_size=2)
+    for path in ['/repo/src/a.py', 'repo/src/b.py', '/repo/lib/c.py', '/repo/src/a.py']:
+        assert cache.get_or_create(path) is graph.findElementFromPath(path)
+    assert len(cache.elements) + len(cache.previous) <= 2
+    new = cache.get_or_create('/repo/new/d.py')
+    assert new.getPath() == '/repo/new/d.py'
+    assert graph.findElementFromPath('/repo/new/d.py') is new
+
+
+def test_path_cursor_matches_create_or_get_element_from_path():
+    from sgraph.sgraph_utils import PathCursor
+
+    paths = ['/a/b', '/a/b/c', '/a/d', 'x', '/a/b/c/e', '/a', '/z/y/x', '/z/y/w', '/a/b/q',
+             '/a/b/', 'a//b', '/']
+    expected = SGraph()
+    graph = SGraph()
+    cursor = PathCursor(graph)
+    for path in paths + sorted(paths) + paths[::-1]:
+        assert cursor.get_or_create(path).getPath() == \
+            expected.createOrGetElementFromPath(path).getPath()
+    assert graph.rootNode.getNodeCount() == expected.rootNode.getNodeCount()
+    assert cursor.get_or_create('/a/b/c') is graph.findElementFromPath('/a/b/c')
+
+
+def test_path_index_follows_model_changes():
+    from sgraph.selement import SElement
+
+    graph = SGraph.parse_xml_or_zipped_xml(os.path.join(os.path.dirname(__file__), MODELFILE))
+    graph.enable_path_index()
+    nginx_c = graph.findElementFromPath('/nginx/src/core/nginx.c')
+    assert nginx_c is not None and nginx_c.getPath() == '/nginx/src/core/nginx.c'
+    assert graph.findElementFromPath('nginx/src/core') is nginx_c.parent
+    assert graph.findElementFromPath('/nginx/missing') is None
+
+    new = SElement(nginx_c.parent, 'new.c')
+    assert graph.findElementFromPath('/nginx/src/core/new.c') is new
+    assert graph.createOrGetElementFromPath('/nginx/src/core/new.c') is new
+    created = graph.createOrGetElementFromPath('/nginx/src/other/x.c')
+    assert graph.findElementFromPath('/nginx/src/other/x.c') is created
+
+    core = nginx_c.parent
+    core.rename('kernel')
+    assert graph.findElementFromPath('/nginx/src/core/nginx.c') is None
+    assert graph.findElementFromPath('/nginx/src/kernel/nginx.c') is nginx_c
+
+    core.parent.detachChild(core)
+    assert graph.findElementFromPath('/nginx/src/kernel/nginx.c') is None
+    graph.rootNode.addChild(core)
+    assert graph.findElementFromPath('/kernel/nginx.c') is nginx_c
+
+    core.remove()
+    assert graph.findElementFromPath('/kernel') is None
+    assert graph.findElementFromPath('/kernel/nginx.c') is None
+
+    graph.enable_path_index(False)
+    assert nginx_c._path_index is None and graph.rootNode._path_index is None
+    assert graph.findElementFromPath('/nginx/src/other/x.c') is created
+
+
+def test_iterative_traversals():
+    from sgraph.selement import ElementIterator, SElement
+
+    graph = SGraph()
+    a = graph.createOrGetElementFromPath('/a')
+    b = graph.createOrGetElementFromPath('/a/b')
+    c = graph.createOrGetElementFromPath('/a/b/c')
+    d = graph.createOrGetElementFromPath('/a/d')
+    e = graph.createOrGetElementFromPath('/e')
+    c.setType('file')
+    e.setType('file')
+    root = graph.rootNode
+
+    assert list(root.iter_preorder()) == [root, a, b, c, d, e]
+    assert list(root.iter_postorder()) == [c, b, d, a, e, root]
+    assert list(root.iter_bfs()) == [root, a, e, b, d, c]
+    assert list(a.iter_preorder(max_depth=1)) == [a, b, d]
+    assert list(a.iter_postorder(max_depth=1)) == [b, d, a]
+    assert list(root.iter_of_type('file')) == [c, e]
+    assert list(graph.iter_elements()) == [a, b, c, d, e]
+    assert list(graph.iter_elements('bfs', max_depth=1)) == [a, e]
+    assert list(graph.iter_elements('postorder', element_type='file')) == [c, e]
+    with pytest.raises(ValueError):
+        list(graph.iter_elements('inorder'))
+
+    iterator = ElementIterator(b)
+    following = []
+    while iterator.hasNext():
+        following.append(next(iterator))
+    assert following == [c, d, e]
+
+    # Deeper than the recursion limit.
+    deep = e
+    for i in range(3000):
+        deep = SElement(deep, f'x{i}')
+    assert root.getNodeCount() == 3006
+    assert root.getMaxDepth(0) == 3001
+    descendants: list[SElement] = []
+    e.getDescendants(descendants)
+    assert len(descendants) == 3000 and descendants[-1] is deep
+    root.removeDescendantsIf(lambda x: x.name == 'x10')
+    assert root.getNodeCount() == 16
+
+
+def test_bulk_load():
+    from sgraph import SElementAssociation
+
+    graph = SGraph()
+    existing = graph.createOrGetElementFromPath('/repo/src/a.py')
+    elements = graph.bulk_load(
+        ['/repo/src/a.py', ('/repo/src/b.py', {'type': 'file'}), (-1, 'lib'), (2, 'c.py'),
+         (2, 'c.py', {'loc': '10'}), (3, 'x/y')],
+        [(0, 1, 'import'), (0, 1, 'import', {'line': '3'}), (1, 3, 'call', {'line': '7'}),
+         (3, 0, 'call', None)])
+    assert elements[0] is existing
+    assert elements[1].getPath() == '/repo/src/b.py' and elements[1].getType() == 'file'
+    assert elements[3] is elements[4] and elements[3].getPath() == '/lib/c.py'
+    assert elements[3].attrs == {'loc': '10'}
+    assert elements[5].name == 'x__slash__y'
+    assert graph.rootNode.getEACount() == 3
+    assert existing.outgoing[0].attrs == {'line': '3'}
+    association, created = SElementAssociation.create_unique_element_association(
+        elements[1], elements[3], 'call', {'col': '1'})
+    assert not created and association.attrs == {'line': '7', 'col': '1'}
+
+
+def test_parse_and_load_attributes_with_interning(tmp_path):
+    from sgraph.loader.attributeloader import AttributeLoader
+
+    xml = ('<model version="2.1"><elements>'
+           '<e n="a" t="dir"><e n="src" t="dir"><e n="x.py" t="file" lang="py" />'
+           '<e n="y.py" t="file" lang="py"><r r="2" t="import" kind="static" /></e></e></e>'
+           '<e n="b" t="dir"><e n="src" t="dir" i="2" /></e>'
+           '</elements></model>')
+    graph = SGraph.parse_xml_string(xml, intern=True)
+    x = graph.findElementFromPath('/a/src/x.py')
+    y = graph.findElementFromPath('/a/src/y.py')
+    other_src = graph.findElementFromPath('/b/src')
+    assert x.parent.name is other_src.name
+    assert x.attrs['type'] is y.attrs['type'] and x.attrs['lang'] is y.attrs['lang']
+    assert graph.produce_deps_tuples() == SGraph.parse_xml_string(xml).produce_deps_tuples()
+
+    strings = graph.get_string_table()
+    strings.max_values = 1
+    attrfile = tmp_path / 'attr_licenses.csv'
+    attrfile.write_text('id,license,hash\n/a/src/x.py,MIT,123abc\n/a/src/y.py,MIT,456def\n')
+    AttributeLoader().load_attrfile(str(attrfile), graph, [], intern=True)
+    assert x.attrs['license'] == 'MIT' and x.attrs['license'] is y.attrs['license']
+    assert list(strings.values['hash']) == ['123abc']
+
+
+def _write_attrfile(path, text, zipped):
+    import zipfile
+
+    path.write_text(text)
+    if not zipped:
+        return str(path)
+    with zipfile.ZipFile(str(path) + '.zip', 'w') as zfile:
+        zfile.write(path, path.name)
+    os.remove(path)
+    return str(path) + '.zip'
+
+
+@pytest.mark.parametrize('zipped', [False, True])
+@pytest.mark.parametrize('separator', ['\t', ','])
+def test_iter_attrs(tmp_path, zipped, separator):
+    from sgraph.attributes.attributequeries import iter_attrs
+
+    lines = ['id,loc,license,note', '/r/src/b.py,12,MIT,', '/r/src/a.py,,NA,"x, y"',
+             '/r/src,3.5,BSD,z']
+    text = '\n'.join(line.replace(',', separator) if separator == '\t' else line
+                     for line in lines) + '\n'
+    if separator == '\t':
+        text = text.replace('"x\t y"', 'x, y')
+    path = _write_attrfile(tmp_path / 'attr_test.csv', text, zipped)
+    # Rows in file order, values as strings as in the file, attributes in name order.
+    assert list(iter_attrs(path)) == [
+        ('/r/src/b.py', {'license': 'MIT', 'loc': '12', 'note': ''}),
+        ('/r/src/a.py', {'license': 'NA', 'loc': '', 'note': 'x, y'}),
+        ('/r/src', {'license': 'BSD', 'loc': '3.5', 'note': 'z'}),
+    ]
+    if zipped:
+        # The .zip file is found also by the name of the CSV file.
+        assert len(list(iter_attrs(path[:-len('.zip')]))) == 3
+    assert [attrs for _, attrs in iter_attrs(path, ignored_attributes=['loc', 'note'])] == \
+        [{'license': 'MIT'}, {'license': 'NA'}, {'license': 'BSD'}]
+    assert [attrs for _, attrs in iter_attrs(path, whitelisted_attributes=['loc'])] == \
+        [{'loc': '12'}, {'loc': ''}, {'loc': '3.5'}]
+    # The ignored attributes win over the whitelisted ones, like in AttributeLoader.
+    assert [attrs for _, attrs in iter_attrs(path, ['loc'], ['loc'])][0] == \
+        {'license': 'MIT', 'note': ''}
+
+
+def test_iter_attrs_ragged_rows_and_missing_id(tmp_path):
+    from sgraph.attributes.attributequeries import detect_csv_separator, iter_attrs
+    from sgraph.loader.attributeloader import AttributeLoader
+
+    assert detect_csv_separator('id\tloc\n', '/a\t1\n') == '\t'
+    assert detect_csv_separator('id,loc\n', '/a,1\n') == ','
+    assert detect_csv_separator('id,a\tb\n', '/a,1\t2\n') == '\t'
+    assert detect_csv_separator('id\n', '/a\n') == ','
+
+    path = tmp_path / 'attr_ragged.csv'
+    path.write_text('id\tloc\tteam\n/a\t1\n\n/b\t2\tcore\textra\n/c\n')
+    assert list(iter_attrs(str(path))) == [('/a', {'loc': '1', 'team': ''}),
+                                           ('/b', {'loc': '2', 'team': 'core'}),
+                                           ('/c', {'loc': '', 'team': ''})]
+    path.write_text('')
+    assert list(iter_attrs(str(path))) == []
+    assert list(iter_attrs(str(tmp_path / 'missing.csv'))) == []
+
+    path.write_text('path\tloc\n/a\t1\n')
+    with pytest.raises(Exception, match='does not have id column'):
+        list(iter_attrs(str(path)))
+    path.write_text('path\tloc\n')
+    assert list(iter_attrs(str(path))) == []
+
+    path.write_text('id\tloc\tteam\n/a/b\t1\tcore\n/a\t2\tweb\n')
+    graph = SGraph()
+    AttributeLoader().load_attrfile(str(path), graph, ['IGNORE team'])
+    assert graph.findElementFromPath('/a/b').attrs == {'loc': '1'}
+    assert graph.findElementFromPath('/a').attrs == {'loc': '2'}
+    graph = SGraph()
+    AttributeLoader().load_attrfile(str(path), graph, ['team'])
+    assert graph.findElementFromPath('/a/b').attrs == {'team': 'core'}
+    graph = SGraph()
+    AttributeLoader().load_attrfile(str(path), graph, ['IGNORE *'])
+    assert graph.findElementFromPath('/a') is None
+
+
+def test_load_model_concurrently(tmp_path):
+    import shutil
+    import zipfile
+
+    os.makedirs(tmp_path / 'dependency')
+    filepath = str(tmp_path / 'dependency' / 'modelfile.xml')
+    shutil.copy(os.path.join(os.path.dirname(__file__), MODELFILE), filepath)
+    (tmp_path / 'attr_temporary.csv').write_text('id\tteam\towner\n/nginx/src\tcore\talice\n')
+    os.makedirs(tmp_path / 'content')
+    licenses = tmp_path / 'content' / 'attr_licenses.csv'
+    licenses.write_text('id,owner,license\n/nginx/src,bob,BSD\n/nginx/new,carol,MIT\n')
+    with zipfile.ZipFile(str(licenses) + '.zip', 'w') as zfile:
+        zfile.write(licenses, 'attr_licenses.csv')
+    os.remove(licenses)
+
+    for filters in ([], ['IGNORE owner'], ['IGNORE *']):
+        sequential = ModelLoader().load_model(filepath, elem_attribute_filters=filters)
+        concurrent = ModelLoader().load_model(filepath, elem_attribute_filters=filters,
+                                              concurrent=True)
+        assert concurrent.produce_deps_tuples() == sequential.produce_deps_tuples()
+        for path in ('/nginx/src', '/nginx/new'):
+            elem = sequential.findElementFromPath(path)
+            other = concurrent.findElementFromPath(path)
+            assert (other and other.attrs) == (elem and elem.attrs)
+    assert ModelLoader().load_model(filepath, concurrent=True).findElementFromPath(
+        '/nginx/src').attrs['owner'] == 'bob'